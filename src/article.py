@@ -1,4 +1,6 @@
 from model import Model
+from datetime import datetime
+from dateutil import parser
 
 
 class Article(Model):
@@ -7,7 +9,11 @@ class Article(Model):
     """
     db_table = "article"
     db_from = "article JOIN source ON article.source_id = source.id"
-    db_fields = "id, source_id, url, title, date, author, tags"
+    db_fields = "id, source_id, url, title, date, date_num, author, tags"
+    db_unique = "url"
+
+    __slots__ = ('id', 'source_id', 'source', 'url', 'title', 'date',
+                 'author', 'tags', 'watched')
     db_labels = "article.id, source.id as source_id, source.url as source, " \
                 "article.url as url, article.title, article.date, " \
                 "article.author, article.tags"
@@ -35,3 +41,32 @@ class Article(Model):
         self.id = None
         self.source_id = None
         self.source = None
+
+    @property
+    def date_num(self):
+        """(Article) -> int
+        Returns the day of the article's date as a number (see date_number),
+        which the database stores next to the date to filter by.
+        """
+        return date_number(self.date)
+
+
+def date_number(date):
+    """(str) -> int
+    Returns the day of a date as the number YYYYMMDD (for example, 20141111
+    for 2014-11-11), so that days are ordered like the numbers. Dates may
+    be in any format dateutil understands. Returns None if the date is empty
+    or isn't a date.
+    """
+    if not date:
+        return None
+
+    # Most dates are already in the format the crawlers write.
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        try:
+            day = parser.parse(date, default=datetime(1970, 1, 1))
+        except (ValueError, OverflowError, TypeError):
+            return None
+    return day.year * 10000 + day.month * 100 + day.day
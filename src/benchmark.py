@@ -0,0 +1,333 @@
+#
+# benchmark.py
+#
+# Performance benchmarks for the application. Each benchmark builds its own
+# database files (which are removed afterwards), runs a workload against
+# them, and prints a short report. Run a benchmark with:
+#
+#     python benchmark.py <name> [arguments...]
+#
+# Running the file without a name lists the benchmarks.
+#
+from database import Database
+from article import Article
+from source import Source
+from reference import Reference
+import os
+import sys
+import threading
+import time
+
+
+def percentile(values, fraction):
+    """([float], float) -> float
+    Returns the value at the given fraction (0 to 1) of the sorted values,
+    or 0 if there are no values.
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def remove_database(path):
+    """(str) -> None
+    Removes a database file, along with its journal and write-ahead log.
+    """
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def read_while_writing(pragmas, seconds=5.0, rows=5000):
+    """(dict, float, int) -> dict
+    Measures the latency of the article listing query (as made by
+    /db/get_articles) while another thread writes articles in crawl sized
+    batches, using the given pragmas. Returns the read latencies (in
+    milliseconds), the number of reads that failed because the database was
+    locked, and the number of articles written.
+    """
+    path = "bench_%s.db" % pragmas['journal_mode'].lower()
+    remove_database(path)
+
+    # Fill the database with some articles to read.
+    db = Database(path, pragmas=pragmas)
+    db.create_tables()
+    db.add_source(Source("http://reader.com"))
+    db.add_source(Source("http://writer.com"))
+    with db.batch():
+        for i in range(rows):
+            db.add_article(Article("http://reader.com/%d.html" % i,
+                                   "Title %d" % i,
+                                   "2014-11-%02d" % (i % 28 + 1),
+                                   "Author", "tags"))
+    db.close()
+
+    done = threading.Event()
+    written = [0]
+
+    def write():
+        """(None) -> None
+        Writes pages of articles and references until the benchmark ends.
+        """
+        writer = Database(path, pragmas=pragmas)
+        page = 0
+        while not done.is_set():
+            with writer.batch():
+                for i in range(50):
+                    url = "http://writer.com/%d/%d.html" % (page, i)
+                    writer.add_article(Article(url, "Crawled", "2014-11-20",
+                                               "Crawler", "tags"))
+                    article = writer.get_article_by_url(url)
+                    writer.add_reference(Reference(article.id, 1))
+                    written[0] += 1
+            page += 1
+        writer.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+
+    # Read the first page of articles for the given amount of time.
+    reader = Database(path, pragmas=pragmas, busy_retries=0)
+    latencies = []
+    errors = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        start = time.time()
+        try:
+            query = reader.get_articles()
+            query.count()
+            query.subset(0, 10, by='date', asc=False)
+            latencies.append((time.time() - start) * 1000)
+        except Exception:
+            errors += 1
+
+    done.set()
+    thread.join()
+    reader.close()
+    remove_database(path)
+
+    return {'latencies': latencies, 'errors': errors, 'written': written[0]}
+
+
+def bench_wal(seconds='5'):
+    """(str) -> None
+    Compares read latency during a write heavy crawl for SQLite's default
+    rollback journal, and for the write-ahead log profile.
+    """
+    print "Reading articles while a crawl writes (%s seconds per mode)." % \
+          seconds
+    print "%-8s %8s %8s %8s %8s %8s %8s" % (
+        "mode", "reads", "p50 ms", "p95 ms", "max ms", "locked", "written")
+
+    # SQLite's defaults, and the defaults of pool.DEFAULT_PRAGMAS.
+    profiles = [('DELETE', {'journal_mode': 'DELETE', 'synchronous': 'FULL'}),
+                ('WAL', {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})]
+
+    for mode, pragmas in profiles:
+        result = read_while_writing(pragmas, float(seconds))
+        latencies = result['latencies']
+        print "%-8s %8d %8.2f %8.2f %8.2f %8d %8d" % (
+            mode, len(latencies), percentile(latencies, 0.5),
+            percentile(latencies, 0.95), max(latencies or [0]),
+            result['errors'], result['written'])
+
+
+def bench_bulk(rows='20000'):
+    """(str) -> None
+    Compares loading articles one at a time against the bulk add functions.
+    """
+    rows = int(rows)
+    articles = [Article("http://site%d.com/%d.html" % (i % 100, i),
+                        "Title %d" % i, "2014-11-20", "Author", "tags")
+                for i in range(rows)]
+    print "Loading %d articles from 100 sources." % rows
+    print "%-12s %10s %12s" % ("method", "seconds", "rows/second")
+
+    def single(db):
+        """(Database) -> None
+        Adds the articles one at a time in a single batch.
+        """
+        with db.batch():
+            for article in articles:
+                db.add_article(article)
+
+    def bulk(db):
+        """(Database) -> None
+        Adds the articles with the bulk add function.
+        """
+        db.add_articles(articles)
+
+    for name, load in [('add_article', single), ('add_articles', bulk)]:
+        path = "bench_bulk.db"
+        remove_database(path)
+        db = Database(path)
+        db.create_tables()
+
+        start = time.time()
+        load(db)
+        elapsed = time.time() - start
+
+        db.close()
+        remove_database(path)
+        print "%-12s %10.2f %12.0f" % (name, elapsed, rows / elapsed)
+
+
+def bench_hydration(rows='50000'):
+    """(str) -> None
+    Compares reading articles through row dicts against the row mappers.
+    """
+    rows = int(rows)
+    path = "bench_hydration.db"
+    remove_database(path)
+    db = Database(path)
+    db.create_tables()
+    db.add_articles([Article("http://site%d.com/%d.html" % (i % 100, i),
+                             "Title %d" % i, "2014-11-20", "Author", "tags")
+                     for i in range(rows)])
+
+    print "Reading %d articles." % rows
+    print "%-10s %10s %12s %14s" % ("method", "seconds", "rows/second",
+                                    "bytes/object")
+
+    class DictArticle():
+        """An article that keeps its members in a dict, as models did before
+        they had slots.
+        """
+        pass
+
+    def dicts():
+        """(None) -> list
+        Reads the articles by building a dict for each row, and setting the
+        members of each object from the dict.
+        """
+        columns, result = db.select(query)
+        articles = []
+        for row in result:
+            article = DictArticle()
+            for key, value in dict(zip(columns, row)).iteritems():
+                setattr(article, key, value)
+            articles.append(article)
+        return articles
+
+    def mapped():
+        """(None) -> list
+        Reads the articles with Database.query.
+        """
+        return db.query(Article, query)
+
+    def size(object):
+        """(object) -> int
+        Returns the size of an object, and of its dict if it has one.
+        """
+        if hasattr(object, '__dict__'):
+            return sys.getsizeof(object) + sys.getsizeof(object.__dict__)
+        return sys.getsizeof(object)
+
+    query = "SELECT %s FROM %s" % (Article.db_labels, Article.db_from)
+    for name, read in [('dicts', dicts), ('mappers', mapped)]:
+        start = time.time()
+        articles = read()
+        elapsed = time.time() - start
+        print "%-10s %10.2f %12.0f %14d" % (name, elapsed, rows / elapsed,
+                                            size(articles[0]))
+
+    db.close()
+    remove_database(path)
+
+
+def bench_edges(references='1000000'):
+    """(str) -> None
+    Compares counting reference graph edges in Python against GROUP BY.
+    """
+    references = int(references)
+    path = "bench_edges.db"
+    remove_database(path)
+    db = Database(path)
+    db.create_tables()
+
+    # Each article refers to five sources besides its own, always including
+    # the first source, so the first source is referred to by a fifth of the
+    # references.
+    sources = 1000
+    articles = references / 5
+    refs = []
+    for i in range(1, articles + 1):
+        for k in range(5):
+            source_id = 1 if k == 0 else (i + k * 97) % (sources - 1) + 2
+            if source_id != i % (sources - 1) + 2:
+                refs.append((i, source_id))
+
+    print "Building %d references from %d articles of %d sources." % (
+        len(refs), articles, sources)
+    with db.batch():
+        db._run("INSERT INTO source(id, url) VALUES (?, ?)",
+                [(i, "site%d.com" % i) for i in range(1, sources + 1)],
+                many=True)
+        db._run("INSERT INTO article(id, source_id, url, title, date, "
+                "date_num, author, tags) VALUES (?, ?, ?, 'Title', "
+                "'2014-11-20', 20141120, '', '')",
+                [(i, i % (sources - 1) + 2, "http://a.com/%d.html" % i)
+                 for i in range(1, articles + 1)], many=True)
+        db._run("INSERT INTO ref(child_id, source_id) VALUES (?, ?)", refs,
+                many=True)
+
+    def to_source(s_id):
+        """(int) -> dict
+        Counts the references to a source by the source of each child
+        article, reading each reference and its article.
+        """
+        edges = {}
+        for ref in db.get_references(None, s_id, None).iter():
+            child = db.get_by_id(Article, ref.child_id).source
+            edges[child] = edges.get(child, 0) + 1
+        return edges
+
+    def from_source(s_id):
+        """(int) -> dict
+        Counts the references from the articles of a source, reading the
+        references of each article.
+        """
+        edges = {}
+        for article in db.get_articles(source_id=s_id).iter():
+            for ref in db.get_references(article.id).iter():
+                edges[ref.source_url] = edges.get(ref.source_url, 0) + 1
+        return edges
+
+    print "%-14s %12s %12s %8s" % ("graph", "python s", "group by s",
+                                   "edges")
+    cases = [('to site1', lambda: to_source(1),
+              lambda: db.get_source_edges(parent_source_id=1)),
+             ('to site500', lambda: to_source(500),
+              lambda: db.get_source_edges(parent_source_id=500)),
+             ('from site500', lambda: from_source(500),
+              lambda: db.get_source_edges(child_source_id=500))]
+    for name, python, grouped in cases:
+        start = time.time()
+        python()
+        middle = time.time()
+        edges = grouped()
+        end = time.time()
+        print "%-14s %12.3f %12.3f %8d" % (name, middle - start, end - middle,
+                                           len(edges))
+
+    db.close()
+    remove_database(path)
+
+
+# The benchmarks that can be run, by name.
+BENCHMARKS = {
+    'wal': bench_wal,
+    'bulk': bench_bulk,
+    'hydration': bench_hydration,
+    'edges': bench_edges,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print "Usage: python benchmark.py <name> [arguments...]"
+        for name in sorted(BENCHMARKS):
+            print "    %-12s %s" % (
+                name, BENCHMARKS[name].__doc__.split('\n')[1].strip())
+    else:
+        BENCHMARKS[sys.argv[1]](*sys.argv[2:])
@@ -0,0 +1,194 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+
+# The header of a filter file: a marker, and the false positive rate of the
+# filter.
+HEADER = struct.Struct('<8sd')
+MAGIC = 'NFBLOOM1'
+
+# The header of each layer of a filter file: the number of bits, capacity,
+# number of items added and number of hashes of the layer. The bits of the
+# layer follow its header.
+LAYER = struct.Struct('<QQQI')
+
+
+class BloomFilter():
+    """A scalable Bloom filter: a set of strings that answers whether a
+    string was added to it without storing the strings, using a few bits
+    for each. A string that was added is always found, but a string that
+    wasn't may be found too, with the given false positive rate.
+
+    The filter is made of layers of bits. When the newest layer is full, a
+    twice as large layer with a lower false positive rate is added, so the
+    overall rate stays below the given rate however many strings are added.
+    The layers are kept in a file, which is memory mapped, so the filter is
+    loaded without reading it and added strings are saved as they're added.
+    """
+
+    def __init__(self, path, capacity=100000, error_rate=0.001):
+        """(BloomFilter, str, int, float) -> None
+        Opens the filter kept in the file at path, or creates an empty one
+        whose first layer holds capacity strings. The file is only created
+        once a string is added.
+        """
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.file = None
+        self.map = None
+
+        # The layers, as lists of their offset in the file, number of bits,
+        # capacity, number of items and number of hashes.
+        self.layers = []
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            self._open()
+
+    def __contains__(self, string):
+        """(BloomFilter, str) -> Bool
+        Returns True if the string was (likely) added to the filter.
+        """
+        first, second = _hashes(string)
+        with self.lock:
+            for offset, bits, capacity, count, hashes in \
+                    reversed(self.layers):
+                if self._test(offset, bits, hashes, first, second):
+                    return True
+        return False
+
+    def add(self, string):
+        """(BloomFilter, str) -> Bool
+        Adds the string to the filter. Returns False if it was (likely)
+        already in the filter, and True otherwise.
+        """
+        first, second = _hashes(string)
+        with self.lock:
+            for offset, bits, capacity, count, hashes in \
+                    reversed(self.layers):
+                if self._test(offset, bits, hashes, first, second):
+                    return False
+
+            # Add a layer if the newest one is full.
+            if not self.layers or self.layers[-1][3] >= self.layers[-1][2]:
+                self._grow()
+            layer = self.layers[-1]
+            offset, bits, capacity, count, hashes = layer
+
+            start = offset + LAYER.size
+            for i in range(hashes):
+                bit = (first + i * second) % bits
+                index = start + bit / 8
+                self.map[index] = chr(ord(self.map[index]) | 1 << bit % 8)
+
+            layer[3] += 1
+            LAYER.pack_into(self.map, offset, bits, capacity, layer[3],
+                            hashes)
+            return True
+
+    def stats(self):
+        """(BloomFilter) -> dict
+        Returns the number of strings added to the filter, its number of
+        layers, and the number of bytes of the filter.
+        """
+        with self.lock:
+            return {'count': sum([layer[3] for layer in self.layers]),
+                    'layers': len(self.layers),
+                    'bytes': len(self.map) if self.map else 0}
+
+    def flush(self):
+        """(BloomFilter) -> None
+        Writes the added strings to the file.
+        """
+        with self.lock:
+            if self.map:
+                self.map.flush()
+
+    def close(self):
+        """(BloomFilter) -> None
+        Writes the added strings to the file, and closes it.
+        """
+        with self.lock:
+            if self.map:
+                self.map.flush()
+                self.map.close()
+                self.file.close()
+            self.map = None
+            self.file = None
+            self.layers = []
+
+    def _open(self):
+        """(BloomFilter) -> None
+        Private function that maps the filter file, and reads its layers.
+        """
+        self.file = open(self.path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, self.error_rate = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a Bloom filter: %s" % self.path)
+
+        self.layers = []
+        offset = HEADER.size
+        while offset + LAYER.size <= len(self.map):
+            bits, capacity, count, hashes = LAYER.unpack_from(self.map, offset)
+            self.layers.append([offset, bits, capacity, count, hashes])
+            offset += LAYER.size + bits / 8
+
+    def _grow(self):
+        """(BloomFilter) -> None
+        Private function that adds a layer to the filter, with twice the
+        capacity and half the false positive rate of the last layer.
+        """
+        number = len(self.layers)
+        capacity = self.capacity * 2 ** number
+        error_rate = self.error_rate * 0.5 ** (number + 1)
+
+        # Size the layer for its capacity and false positive rate.
+        bits = int(math.ceil(-capacity * math.log(error_rate) /
+                             math.log(2) ** 2))
+        bits += -bits % 8
+        hashes = max(int(round(float(bits) / capacity * math.log(2))), 1)
+
+        if self.map is None:
+            with open(self.path, 'wb') as new:
+                new.write(HEADER.pack(MAGIC, self.error_rate))
+            self.file = open(self.path, 'r+b')
+            offset = HEADER.size
+        else:
+            self.map.flush()
+            self.map.close()
+            offset = os.fstat(self.file.fileno()).st_size
+
+        # Extend the file with the empty layer, and map it again.
+        self.file.seek(offset)
+        self.file.write(LAYER.pack(bits, capacity, 0, hashes))
+        self.file.truncate(offset + LAYER.size + bits / 8)
+        self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.layers.append([offset, bits, capacity, 0, hashes])
+
+    def _test(self, offset, bits, hashes, first, second):
+        """(BloomFilter, int, int, int, int, int) -> Bool
+        Private function that returns True if all the bits of a string are
+        set in the layer at offset.
+        """
+        start = offset + LAYER.size
+        for i in range(hashes):
+            bit = (first + i * second) % bits
+            if not ord(self.map[start + bit / 8]) & 1 << bit % 8:
+                return False
+        return True
+
+
+def _hashes(string):
+    """(str) -> (int, int)
+    Private function that returns the two hashes of a string that the bits
+    of the string are found from.
+    """
+    if isinstance(string, unicode):
+        string = string.encode('utf-8')
+    first, second = struct.unpack('<QQ', hashlib.md5(string).digest())
+    return first, second | 1
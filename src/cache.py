@@ -0,0 +1,240 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+
+class LRUCache():
+    """A thread safe, bounded mapping that evicts the least recently used
+    entry when it is full. Keys must be hashable.
+    """
+
+    def __init__(self, size=256):
+        """(LRUCache, int) -> None
+        Creates an empty cache that holds at most size entries.
+        """
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Cache counters.
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """(LRUCache, object, object) -> object
+        Returns the value cached for the key, marking it as recently used,
+        or default if the key isn't cached.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+
+            # Move the entry to the most recently used end.
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """(LRUCache, object, object) -> None
+        Caches the value for the key, evicting the least recently used entry
+        if the cache is full.
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def remove(self, key):
+        """(LRUCache, object) -> None
+        Removes the key from the cache, if it is cached.
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """(LRUCache) -> None
+        Removes every entry from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """(LRUCache) -> dict
+        Returns the number of entries, and the hit and miss counters.
+        """
+        with self.lock:
+            return {'size': self.size,
+                    'entries': len(self.entries),
+                    'hits': self.hits,
+                    'misses': self.misses}
+
+    def __len__(self):
+        """(LRUCache) -> int
+        Returns the number of cached entries.
+        """
+        return len(self.entries)
+
+
+class RenderCache():
+    """A thread safe cache of rendered image files in a directory. Images are
+    named after a hash of the key they were rendered for, so the same key
+    always gives the same file, and different keys never share a file. The
+    cache holds at most size images, and images that haven't been used for
+    max_age seconds are removed.
+    """
+
+    def __init__(self, directory, size=256, max_age=24 * 60 * 60,
+                 extension='.png'):
+        """(RenderCache, str, int, int, str) -> None
+        Creates a cache of the images in the given directory, creating the
+        directory if it doesn't exist.
+        """
+        self.directory = directory
+        self.size = size
+        self.max_age = max_age
+        self.extension = extension
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Keys are rendered holding one of these locks (chosen by the file
+        # name), so that a key is only rendered once at a time, while most
+        # other keys render in parallel.
+        self.locks = [threading.Lock() for i in range(32)]
+
+        # Cache counters.
+        self.hits = 0
+        self.misses = 0
+
+    def filename(self, name, key):
+        """(RenderCache, str, object) -> str
+        Returns the name of the image file for the given name (describing
+        the kind of image) and key. The key must have a stable repr, such as
+        a tuple of strings and numbers.
+        """
+        return '%s-%s%s' % (name, hashlib.sha1(repr(key)).hexdigest(),
+                            self.extension)
+
+    def get(self, name, key, render):
+        """(RenderCache, str, object, function) -> str
+        Returns the name of the image file (in the directory) for the given
+        name and key. If the image isn't cached, it is rendered by calling
+        render with the path to write the image to. Errors raised by render
+        are raised, and nothing is cached for the key.
+        """
+        filename = self.filename(name, key)
+        path = os.path.join(self.directory, filename)
+
+        with self._key_lock(filename):
+            if self.find(name, key):
+                return filename
+
+            # Render into a file of its own, and only move it into place once
+            # it is complete, so the image is never read half written.
+            self.misses += 1
+            temporary = os.path.join(self.directory, '.%s-%s%s' % (
+                name, uuid.uuid4().hex, self.extension))
+            try:
+                render(temporary)
+                os.rename(temporary, path)
+            finally:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+
+        self.evict()
+        return filename
+
+    def find(self, name, key):
+        """(RenderCache, str, object) -> str
+        Returns the name of the image file for the given name and key,
+        marking it as recently used, or None if the image isn't cached.
+        """
+        filename = self.filename(name, key)
+        path = os.path.join(self.directory, filename)
+        if not self._fresh(path):
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            # Evicted meanwhile.
+            return None
+        self.hits += 1
+        return filename
+
+    def evict(self):
+        """(RenderCache) -> None
+        Removes the images that haven't been used for max_age seconds, and
+        then the least recently used images, until at most size are left.
+        """
+        images = []
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            if filename.startswith('.') or not self._cached(filename):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                used = os.path.getmtime(path)
+            except OSError:
+                # Removed by another thread.
+                continue
+            if now - used > self.max_age:
+                self._remove(path)
+            else:
+                images.append((used, path))
+
+        images.sort()
+        for used, path in images[:max(len(images) - self.size, 0)]:
+            self._remove(path)
+
+    def stats(self):
+        """(RenderCache) -> dict
+        Returns the number of cached images, and the hit and miss counters.
+        """
+        return {'size': self.size,
+                'entries': len([filename for filename in
+                                os.listdir(self.directory)
+                                if self._cached(filename)]),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def _key_lock(self, filename):
+        """(RenderCache, str) -> threading.Lock
+        Private function that returns the lock for rendering the given file.
+        """
+        return self.locks[hash(filename) % len(self.locks)]
+
+    def _fresh(self, path):
+        """(RenderCache, str) -> Bool
+        Private function that returns True if the image at the path exists,
+        and has been used within max_age seconds.
+        """
+        try:
+            return time.time() - os.path.getmtime(path) <= self.max_age
+        except OSError:
+            return False
+
+    def _cached(self, filename):
+        """(RenderCache, str) -> Bool
+        Private function that returns True if the file name is the name of
+        an image of the cache.
+        """
+        if not filename.endswith(self.extension):
+            return False
+        digest = filename[:-len(self.extension)].rsplit('-', 1)[-1]
+        return len(digest) == 40 and \
+            all([c in '0123456789abcdef' for c in digest])
+
+    def _remove(self, path):
+        """(RenderCache, str) -> None
+        Private function that removes a cached image, if it still exists.
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,10 +1,50 @@
 import sqlite3
+import threading
+import time
+import datetime
+from contextlib import contextmanager
+from pool import connect
+from model import row_mapper
+from cache import LRUCache
+from migrations import migrate
 from query import Query
 from source import Source
-from article import Article
+from article import Article, date_number
 from reference import Reference
 from keywords import Keyword
 from watch import Watch
+from tag import Tag, split_tags
+from search import ArticleMatch, match_expression
+import matcher
+from tld.exceptions import TldDomainNotFound, TldBadUrl
+
+
+# The outcomes of adding a single object with the bulk add functions.
+ADDED = 'added'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+# The states of the pages in the frontier of a crawl. A page is running
+# while it is being crawled, so a page left running stopped its crawl.
+QUEUED = 'queued'
+RUNNING = 'running'
+CRAWLED = 'crawled'
+FAILED = 'failed'
+
+# The number of rows the bulk functions write or look up with one statement.
+# SQLite limits statements to 999 parameters by default, which bounds the
+# size of IN (...) lists.
+CHUNK_SIZE = 500
+
+# Marks URLs that aren't in the URL caches, as opposed to URLs cached as not
+# being in the database.
+MISSING = object()
+
+# The number of writes this process has made to each database, by its key
+# (see Database.key). Results derived from a database (such as cached
+# counts) are valid while its write generation is unchanged.
+generations = {}
+generations_lock = threading.Lock()
 
 
 class Database():
@@ -16,131 +56,194 @@ class Database():
     For adding, modifying, and deleting data, it is sufficient to call the
     appropriate functions in the database that match the given object.
 
+    Writes are committed as soon as they are made, unless they are made
+    inside a batch (see batch), in which case they are committed together
+    when the batch ends. Statements that fail because another connection
+    holds a lock on the database are retried a few times, and raise
+    sqlite3.OperationalError if the database stays locked.
+
     For getting data from the database, get_by_id returns the object itself,
     while queries that rely on filtered data from the database will return
     a Query object - which can be used to get multiple objects from the
     database, or the count of the objects that matched the query.
     """
 
-    def __init__(self, path):
-        """(Database, str) -> None
-        Creates a connection to the database for the given path.
+    def __init__(self, path, pool=None, pragmas=None, busy_retries=3,
+                 busy_delay=0.1, cache_size=1024):
+        """(Database, str, ConnectionPool, dict, int, float, int) -> None
+        Creates a connection to the database for the given path, configured
+        with the given pragmas (see pool.pragma_profile). If a connection
+        pool is given, a connection is checked out from the pool instead, and
+        is returned to the pool when the database is closed.
+
+        Statements that find the database locked are retried busy_retries
+        times, waiting busy_delay seconds before the first retry and twice as
+        long before each retry after that. SQLite already waits for the
+        connection's busy_timeout pragma before giving up, so statements are
+        no longer retried once that much time has passed.
+
+        Articles and sources looked up by URL are cached, up to cache_size
+        of each (see get_article_by_url).
         """
-        # Create the connection, and get the SQLite3 connection cursor.
-        self.connection = sqlite3.connect(path)
+        self.path = path
+        self.pool = pool
+        self.busy_retries = busy_retries
+        self.busy_delay = busy_delay
+
+        # Get the connection, and get the SQLite3 connection cursor. Pooled
+        # connections are already configured.
+        if pool:
+            self.connection = pool.acquire()
+        else:
+            self.connection = connect(path, pragmas=pragmas)
         self.cursor = self.connection.cursor()
 
-        # Enable foreign key support, since it is not on by default in SQLite3.
-        self.cursor.execute("PRAGMA foreign_keys = ON")
+        # Seconds SQLite waits for another connection's lock.
+        self.busy_timeout = self.connection.execute(
+            "PRAGMA busy_timeout").fetchone()[0] / 1000.0
 
-        # Rows are normally returned as tuples, but by using a custom
-        # function, they can be returned as dicts.
-        self.cursor.row_factory = row_to_dict
+        # The number of batches that are currently open.
+        self.depth = 0
+
+        # The articles and sources looked up by URL, by URL, or None for
+        # URLs that aren't in the database. The caches are valid while the
+        # data version of the connection is unchanged (it changes when
+        # other connections write), and this connection's writes update
+        # them.
+        self.article_cache = LRUCache(cache_size)
+        self.source_cache = LRUCache(cache_size)
+        self.data_version = None
 
     def close(self):
         """(Database) -> None
-        Closes the connection to the current database.
+        Closes the connection to the current database, or returns it to the
+        connection pool it came from.
         """
         if self.connection:
-            self.connection.close()
+            if self.pool:
+                self.pool.release(self.connection)
+            else:
+                # An in memory database is gone once closed. Its key may be
+                # reused by a new connection, so move its generation past
+                # anything derived from this one.
+                if self.path == ':memory:':
+                    matcher.discard_matcher(self.key())
+                    bump_generation(self.key())
+                self.connection.close()
+            self.connection = None
 
     def create_tables(self):
+        """(Database) -> int
+        Creates the tables for the database, or upgrades the schema of an
+        existing database by applying the migrations it is missing. Returns
+        the schema version of the database.
+        """
+        # The file may be a new database, so forget any keywords loaded from
+        # an old one at the same path.
+        matcher.discard_matcher(self.key())
+        return migrate(self.connection)
+
+    def rebuild_search_index(self):
         """(Database) -> None
-        Creates the tables for the database. If the tables already exist,
-        then nothing is changed.
+        Rebuilds the full text search index of the articles from scratch.
+        """
+        self.execute("INSERT INTO article_fts(article_fts) VALUES "
+                     "('rebuild')")
+
+    def normalize_dates(self):
+        """(Database) -> int
+        Numbers the dates of the articles that don't have a date number,
+        such as articles added before the dates were numbered in formats
+        SQLite doesn't understand. Returns the number of articles numbered.
+        """
+        columns, rows = self.select("SELECT id, date FROM article WHERE "
+                                    "date_num IS NULL AND date != ''")
+        numbers = [(number, id) for number, id in
+                   [(date_number(date), id) for id, date in rows]
+                   if number is not None]
+        with self.batch():
+            self._run("UPDATE article SET date_num = ? WHERE id = ?",
+                      numbers, many=True)
+        return len(numbers)
+
+    def generation(self):
+        """(Database) -> int
+        Returns the write generation of the database (see
+        write_generation).
+        """
+        return write_generation(self.key())
+
+    def change_count(self):
+        """(Database) -> int
+        Returns the number of changes ever made to the sources, articles and
+        references in the database, by any process.
         """
+        columns, rows = self.select("SELECT count FROM change_count")
+        return rows[0][0]
+
+    @contextmanager
+    def batch(self):
+        """(Database) -> context manager
+        Opens a transaction that lasts until the end of the with block:
+
+            with database.batch():
+                database.add_article(...)
+                database.add_reference(...)
+
+        Writes inside the block are committed together when the outermost
+        batch ends, instead of one at a time. Batches can be nested: a nested
+        batch is a savepoint, so an exception that leaves it only rolls back
+        the writes made inside of it. An exception that leaves the outermost
+        batch rolls back the whole transaction.
+
+        Failed writes (for example, duplicates) inside a batch only undo
+        themselves, so the add functions still report them as usual.
+        """
+        # Open a transaction for the outermost batch, and a savepoint for
+        # nested batches. The transaction takes the write lock immediately,
+        # since batches are for writing.
+        savepoint = 'batch_%d' % self.depth
+        changes = self.connection.total_changes
+        if self.depth == 0:
+            self._run("BEGIN IMMEDIATE")
+        else:
+            self._run("SAVEPOINT %s" % savepoint)
+        self.depth += 1
+
         try:
-            # Create the sources table.
-            self.execute(
-                "CREATE TABLE source("
-                "id INTEGER PRIMARY KEY NOT NULL, "
-                "url TEXT UNIQUE NOT NULL)")
-
-            # Create the keywords table.
-            self.execute(
-                "CREATE TABLE keyword( "
-                "id INTEGER PRIMARY KEY, "
-                "source_id INTEGER, "
-                "name TEXT UNIQUE NOT NULL, "
-                "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
-                "CASCADE)")
-
-            # Create the articles table.
-            self.execute(
-                "CREATE TABLE article("
-                "id INTEGER PRIMARY KEY NOT NULL, "
-                "source_id INTEGER NOT NULL, "
-                "url TEXT UNIQUE NOT NULL, "
-                "title TEXT NOT NULL, "
-                "date DATE NOT NULL, "
-                "author TEXT NOT NULL, "
-                "tags TEXT NOT NULL, "
-                "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
-                "CASCADE)")
-
-            # Create the watchlist table.
-            self.execute(
-                "CREATE TABLE watch("
-                "id INTEGER PRIMARY KEY NOT NULL, "
-                "url TEXT UNIQUE NOT NULL,"
-                "domain TEXT UNIQUE NOT NULL)")
-
-            # Create the reference table.
-            self.execute(
-                "CREATE TABLE ref("
-                "id INTEGER PRIMARY KEY, "
-                "source_id INTEGER NOT NULL, "
-                "child_id INTEGER NOT NULL, "
-                "parent_id INTEGER, "
-                "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
-                "CASCADE, "
-                "FOREIGN KEY(child_id) REFERENCES article(id) ON DELETE "
-                "CASCADE, "
-                "FOREIGN KEY(parent_id) REFERENCES article(id) ON DELETE "
-                "CASCADE, "
-                "UNIQUE(child_id, parent_id), "
-                "CHECK (child_id != parent_id))")
-
-            # Create the duplicate detection trigger for references.
-            self.execute(
-                "CREATE TRIGGER ref_dup_check BEFORE INSERT ON ref "
-                "WHEN NEW.parent_id IS NULL BEGIN SELECT "
-                "RAISE(ABORT, 'Duplicated article/source reference.') "
-                "WHERE EXISTS (SELECT * FROM ref "
-                "WHERE source_id=NEW.source_id "
-                "AND child_id=NEW.child_id LIMIT 1); END;")
-
-            # Creating the auto delete trigger for deleting a reference with
-            # the same source as an added link
-            self.execute(
-                "CREATE TRIGGER ref_clean AFTER INSERT on ref "
-                "WHEN NEW.parent_id IS NOT NULL BEGIN "
-                "DELETE FROM ref WHERE "
-                "source_id=NEW.source_id AND child_id=NEW.child_id "
-                "AND parent_id IS NULL; END;")
-
-            # Create the trigger that prevents adding a reference from an
-            # article to its publisher source.
-            self.execute(
-                "CREATE TRIGGER ref_source_check BEFORE INSERT ON ref "
-                "BEGIN "
-                "SELECT RAISE(ABORT, "
-                "'Reference source and article source are the same.') "
-                "WHERE EXISTS (SELECT * FROM article WHERE "
-                "id = NEW.child_id AND source_id = NEW.source_id); "
-                "END;")
-        except sqlite3.OperationalError:
-            # Tables already exist.
-            pass
+            yield self
+        except:
+            # Undo the writes made in this batch. If there were any,
+            # anything read since they were made is now out of date. A batch
+            # that only failed to write (such as a duplicate) changed
+            # nothing.
+            self.depth -= 1
+            if self.connection.total_changes != changes:
+                bump_generation(self.key())
+                matcher.discard_matcher(self.key())
+                self._clear_caches()
+            if self.depth == 0:
+                self.cursor.execute("ROLLBACK")
+            else:
+                self.cursor.execute("ROLLBACK TO %s" % savepoint)
+                self.cursor.execute("RELEASE %s" % savepoint)
+            raise
+        else:
+            # Keep the writes made in this batch.
+            self.depth -= 1
+            if self.depth == 0:
+                self._run("COMMIT")
+            else:
+                self._run("RELEASE %s" % savepoint)
 
     def execute(self, query, params=()):
         """(Database, str, tuple) -> Bool
-        Executes the given query, and commits it to the database. Returns
-        True if the query was executed, and False otherwise.
+        Executes the given query, and commits it to the database (or leaves
+        it to be committed at the end of the current batch). Returns True if
+        the query was executed, and False otherwise.
         """
         try:
-            self.cursor.execute(query, params)
-            self.connection.commit()
+            self._run(query, params)
             return True
         except sqlite3.IntegrityError:
             return False
@@ -156,58 +259,227 @@ class Database():
         rows to return.
         """
         try:
-            # Get the list of dictionaries from the database.
-            rows = self.cursor.execute(query, params).fetchall()
-
-            # Convert those into objects with the type that model has, if
-            # conversion is specified
-            if convert:
-                for i in range(0, len(rows)):
-                    # Create the object and update its internal state.
-                    object = model()
-                    object.__dict__.update(rows[i])
-
-                    # Replace the row with the object.
-                    rows[i] = object
-
-            # Return the list of objects.
-            return rows
+            columns, rows = self.select(query, params)
         except sqlite3.IntegrityError:
             return []
 
+        # Convert the rows into objects with the type that model has, if
+        # conversion is specified, or into dictionaries otherwise.
+        if convert:
+            return map(row_mapper(model, columns), rows)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def select(self, query, params=()):
+        """(Database, str, tuple) -> (tuple of str, [tuple])
+        Executes a query on the database, and returns the names of its
+        columns and its rows, as tuples of values.
+        """
+        cursor = self._run(query, params)
+        rows = cursor.fetchall()
+        return tuple([column[0] for column in cursor.description or ()]), rows
+
+    def stream(self, model, query, params=(), batch_size=500, convert=True):
+        """(Database, Model, str, tuple, int, Bool) -> generator
+        Executes a query on the database like query, but returns a generator
+        that reads the rows batch_size at a time, so only one batch of rows
+        is held in memory at once. The query runs on its own cursor, so the
+        database can be used while the rows are being read.
+        """
+        cursor = self._run(query, params, cursor=self.connection.cursor())
+        try:
+            columns = tuple([column[0] for column in cursor.description])
+            if convert:
+                mapper = row_mapper(model, columns)
+            else:
+                mapper = lambda row: dict(zip(columns, row))
+
+            # Read the rows a batch at a time, until there are none left.
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield mapper(row)
+        finally:
+            cursor.close()
+
+    def _run(self, query, params=(), many=False, cursor=None):
+        """(Database, str, tuple, Bool, sqlite3.Cursor) -> sqlite3.Cursor
+        Private function that executes a query on the given cursor (or the
+        database cursor, if none is given), retrying the query if the
+        database is locked by another connection, until the busy timeout has
+        passed (see __init__). If many is True, params is
+        a list of parameter tuples, and the query is executed once for each
+        of them. Returns the cursor.
+        """
+        if cursor is None:
+            cursor = self.cursor
+
+        start = time.time()
+        delay = self.busy_delay
+        for attempt in range(self.busy_retries + 1):
+            try:
+                changes = self.connection.total_changes
+                if many:
+                    cursor = cursor.executemany(query, params)
+                else:
+                    cursor = cursor.execute(query, params)
+
+                # Only statements that changed rows have written.
+                if self.connection.total_changes != changes:
+                    bump_generation(self.key())
+                return cursor
+            except sqlite3.OperationalError as e:
+                # Only a lock held by another connection is worth waiting
+                # for. A locked table ("database table is locked") is held by
+                # this connection, so waiting won't release it.
+                if not str(e).startswith('database is locked'):
+                    raise
+                if attempt == self.busy_retries:
+                    raise
+
+                # SQLite waited for the busy timeout before failing, unless
+                # it gave up early, so don't wait past it again.
+                if self.busy_timeout and \
+                        time.time() - start >= self.busy_timeout:
+                    raise
+
+            time.sleep(delay)
+            delay *= 2
+
     def _add(self, object):
-        """(Model) -> Bool
-        Adds an object to the database, or modifies an existing one. Return
-        True if the object was added or modified, or False otherwise.
+        """(Model) -> int
+        Adds an object to the database, or modifies an existing one: the row
+        with the object's id if it has one, or else the row with the same
+        unique fields (see Model.db_unique). Existing rows are updated in
+        place, so they keep their id and the rows that refer to them. Sets
+        the id of the object, and returns it, or returns False if the object
+        couldn't be added or modified.
         """
-        # Get the attributes from the object matching the fields given.
-        fields = object.db_fields.split(',')
-        params = []
-        for field in fields:
-            # Get the value from the class, and add it to the parameters list
-            params.append(getattr(object, field.strip()))
+        table = object.db_table
+        fields = model_fields(object)
+        unique = [field.strip() for field in object.db_unique.split(',')
+                  if field.strip()]
+
+        # Forget the cached lookups the write may change. Modifying an
+        # object may change its URL.
+        if isinstance(object, Source):
+            self._clear_caches()
+        elif isinstance(object, Article):
+            if object.id is None:
+                self.article_cache.remove(object.url)
+            else:
+                self.article_cache.clear()
+
+        try:
+            with self.batch():
+                # Find the existing row, if there is one.
+                id = object.id
+                if id is None and unique:
+                    rows = self.query(
+                        None, 'SELECT id FROM %s WHERE %s' %
+                        (table, ' AND '.join(['%s = ?' % field
+                                              for field in unique])),
+                        tuple([getattr(object, field) for field in unique]),
+                        convert=False)
+                    if rows:
+                        id = rows[0]['id']
+
+                # Update the existing row, or insert a new one.
+                updated = False
+                if id is not None:
+                    values = [getattr(object, field) for field in fields
+                              if field != 'id']
+                    updated = self._run(update_statement(object),
+                                        tuple(values + [id])).rowcount > 0
+                if updated:
+                    object.id = id
+                else:
+                    cursor = self._run(
+                        insert_statement(object),
+                        tuple([id if field == 'id' else
+                               getattr(object, field) for field in fields]))
+                    object.id = cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return False
 
-        # Create the comma separated list of question marks, used in the
-        # query specification for sqlite.
-        sub = ('?, ' * len(fields))[:-2]
+        return object.id
 
-        # ...and convert it to a tuple so sqlite understands it.
-        params = tuple(params)
+    def _add_many(self, model, objects):
+        """(Database, Model, [Model or None]) -> [str]
+        Private function that inserts many objects of the given model in a
+        single batch, and returns the outcome for each object: ADDED,
+        DUPLICATE if it conflicted with an existing row, or REJECTED if a
+        constraint or trigger refused it. Objects given as None were already
+        rejected by the caller.
 
-        # Execute the insertion or replace for the object given
-        return self.execute(
-            'INSERT OR REPLACE INTO %s(%s) VALUES (%s)' %
-            (object.db_table, object.db_fields, sub), params)
+        Rows are inserted in chunks with executemany. If a chunk fails, it is
+        rolled back and inserted one row at a time to find the outcome of
+        each row.
+        """
+        fields = model_fields(model)
+        statement = insert_statement(model)
+        outcomes = [REJECTED] * len(objects)
+
+        # Only insert the objects that weren't already rejected.
+        indexes = [i for i in range(len(objects)) if objects[i] is not None]
+
+        with self.batch():
+            for chunk in chunks(indexes):
+                rows = [tuple([getattr(objects[i], field) for field in fields])
+                        for i in chunk]
+                try:
+                    # Insert the whole chunk in a savepoint, so a failure
+                    # only undoes the chunk.
+                    with self.batch():
+                        self._run(statement, rows, many=True)
+                    for i in chunk:
+                        outcomes[i] = ADDED
+                except sqlite3.IntegrityError:
+                    for i, row in zip(chunk, rows):
+                        try:
+                            self._run(statement, row)
+                            outcomes[i] = ADDED
+                        except sqlite3.IntegrityError as e:
+                            outcomes[i] = integrity_outcome(e)
+
+        return outcomes
+
+    def _source_ids(self, urls, add_sources=True):
+        """(Database, [str], Bool) -> dict
+        Private function that returns a dict mapping each given source URL to
+        the id of its source, looking the sources up with one query per
+        chunk of URLs. If add_sources is True, sources that don't exist are
+        added first. URLs without a source are left out of the dict.
+        """
+        urls = list(set(urls))
+
+        if add_sources and urls:
+            self._run('INSERT OR IGNORE INTO source(url) VALUES (?)',
+                      [(url, ) for url in urls], many=True)
+            for url in urls:
+                self.source_cache.remove(url)
+
+        ids = {}
+        for chunk in chunks(urls):
+            rows = self.query(
+                None, 'SELECT id, url FROM source WHERE url IN (%s)' %
+                placeholders(len(chunk)), tuple(chunk), convert=False)
+            for row in rows:
+                ids[row['url']] = row['id']
+        return ids
 
     def add_article(self, article, add_source=True):
-        """(Database, Article) -> Bool
-        Adds the article to the database. Returns True if the article was
-        added, and False otherwise. If add_source is True, then the source
+        """(Database, Article, Bool) -> int
+        Adds the article to the database, or modifies the article with the
+        same id or URL in place (keeping its references). Returns the id of
+        the article, which is also set on the article, or False if the
+        article couldn't be added. If add_source is True, then the source
         is added if the source does not already exist.
         """
         # Check if the source is in the database.
         temp_source = Source(article.url)
-        source = self.get_sources(url=temp_source.url).first()
+        source = self.get_source_by_url(temp_source.url)
         if source is None:
             if add_source:
                 # Add the source if it doesn't exist
@@ -223,20 +495,93 @@ class Database():
 
         # Add the article to the database.
         article.source_id = source.id
+        article.source = source.url
         return self._add(article)
 
+    def add_articles(self, articles, add_sources=True):
+        """(Database, iterable of Article, Bool) -> [str]
+        Adds many articles to the database in a single batch, and returns the
+        outcome for each article: ADDED, DUPLICATE if an article with the
+        same URL already exists (existing articles are not modified), or
+        REJECTED. The sources of the articles are looked up together, and if
+        add_sources is True, missing sources are added. Articles with a
+        malformed URL, or without a source, are rejected.
+        """
+        articles = list(articles)
+
+        # Find the source URL of every article.
+        urls = []
+        for article in articles:
+            try:
+                urls.append(Source(article.url).url)
+            except (TldDomainNotFound, TldBadUrl):
+                urls.append(None)
+
+        with self.batch():
+            ids = self._source_ids([url for url in urls if url], add_sources)
+
+            # Set the source of each article, or reject it.
+            for i in range(len(articles)):
+                if urls[i] in ids:
+                    articles[i].source_id = ids[urls[i]]
+                else:
+                    articles[i] = None
+
+            outcomes = self._add_many(Article, articles)
+
+        # Forget that the added articles weren't in the database.
+        for article, outcome in zip(articles, outcomes):
+            if outcome == ADDED:
+                self.article_cache.remove(article.url)
+        return outcomes
+
     def add_keyword(self, keyword):
-        """(Database, Keyword) -> Bool
-        Adds a keyword the database. Return True if the keyword was added,
-        and False if otherwise.
+        """(Database, Keyword) -> int
+        Adds a keyword the database, or modifies the keyword with the same
+        name. Returns the id of the keyword, or False if the keyword
+        couldn't be added.
         """
-        return self._add(keyword)
+        # Find the name of the keyword being modified by id, if any.
+        old = None
+        if keyword.id is not None:
+            old = self.get_by_id(Keyword, keyword.id)
+        if not self._add(keyword):
+            return False
+
+        # Keep the keyword matcher up to date, if it has been built. The
+        # matcher doesn't know which name a renamed keyword had, so it is
+        # built again.
+        if old is not None and old.name != keyword.name:
+            matcher.discard_matcher(self.key())
+        else:
+            keyword_matcher = matcher.find_matcher(self.key())
+            if keyword_matcher is not None:
+                keyword_matcher.add(keyword.name, keyword.source_id)
+        return keyword.id
+
+    def add_keywords(self, keywords):
+        """(Database, iterable of Keyword) -> [str]
+        Adds many keywords to the database in a single batch, and returns the
+        outcome for each keyword: ADDED, DUPLICATE if a keyword with the same
+        name already exists, or REJECTED.
+        """
+        keywords = list(keywords)
+        outcomes = self._add_many(Keyword, keywords)
+
+        # Keep the keyword matcher up to date, if it has been built.
+        keyword_matcher = matcher.find_matcher(self.key())
+        if keyword_matcher is not None:
+            for keyword, outcome in zip(keywords, outcomes):
+                if outcome == ADDED:
+                    keyword_matcher.add(keyword.name, keyword.source_id)
+        return outcomes
 
     def add_reference(self, reference):
-        """(Database, Reference) -> Bool
-        Adds a reference to the database. Returns True if the reference was
-        added, and False otherwise. Automatically determines the source if
-        it was a reference between a child and parent article.
+        """(Database, Reference) -> int
+        Adds a reference to the database. Returns the id of the reference,
+        or False if the reference couldn't be added. Automatically
+        determines the source if it was a reference between a child and
+        parent article.
         """
         if reference.parent_id and reference.parent_id != -1:
             # This a reference between a child and parent article, determine
@@ -246,17 +591,60 @@ class Database():
 
         return self._add(reference)
 
+    def add_references(self, references):
+        """(Database, iterable of Reference) -> [str]
+        Adds many references to the database in a single batch, and returns
+        the outcome for each reference: ADDED, DUPLICATE if the reference
+        already exists, or REJECTED (for example, by the trigger that stops
+        articles from referencing their own source). As with add_reference,
+        the source of a reference to a parent article is the parent's
+        source. The parent articles are looked up together, and references
+        to parents that don't exist are rejected.
+        """
+        references = list(references)
+
+        # Find the parent article ids.
+        parent_ids = list(set([reference.parent_id
+                               for reference in references
+                               if reference.parent_id and
+                               reference.parent_id != -1]))
+
+        with self.batch():
+            # Look up the source of every parent article.
+            sources = {}
+            for chunk in chunks(parent_ids):
+                rows = self.query(
+                    None, 'SELECT id, source_id FROM article WHERE id IN '
+                          '(%s)' % placeholders(len(chunk)),
+                    tuple(chunk), convert=False)
+                for row in rows:
+                    sources[row['id']] = row['source_id']
+
+            # Set the source of each reference to a parent article, or
+            # reject it.
+            for i in range(len(references)):
+                parent_id = references[i].parent_id
+                if parent_id and parent_id != -1:
+                    if parent_id in sources:
+                        references[i].source_id = sources[parent_id]
+                    else:
+                        references[i] = None
+
+            return self._add_many(Reference, references)
+
     def add_source(self, source):
-        """(Database, Source) -> Bool
-        Adds the source to the database. Returns True if the source was
-        added, and False otherwise.
+        """(Database, Source) -> int
+        Adds the source to the database, or modifies the source with the
+        same id or URL. Returns the id of the source, or False if the source
+        couldn't be added.
         """
         return self._add(source)
 
     def add_watch(self, watch):
-        """(Database, Watch) -> Bool
-        Adds the watch to the database. Returns True if the watch was
-        added, and False otherwise.
+        """(Database, Watch) -> int
+        Adds the watch to the database, or modifies the watch with the same
+        id or URL. Returns the id of the watch, or False if the watch
+        couldn't be added.
         """
         return self._add(watch)
 
@@ -266,9 +654,147 @@ class Database():
         Returns True if the object was deleted or didn't exist, and False if
         the query was invalid.
         """
-        return self.execute('DELETE FROM %s WHERE %s.id=?' %
+        # Find the name of a deleted keyword, to remove it from the keyword
+        # matcher.
+        keyword_matcher = matcher.find_matcher(self.key())
+        keyword = None
+        if keyword_matcher is not None and model is Keyword:
+            keyword = self.get_by_id(Keyword, id)
+
+        if not self.execute('DELETE FROM %s WHERE %s.id=?' %
                             (model.db_table, model.db_table),
-                            (id, ))
+                            (id, )):
+            return False
+
+        # Forget the cached lookups of deleted articles, and of the articles
+        # deleted along with a source.
+        if model is Article:
+            self.article_cache.clear()
+        elif model is Source:
+            self._clear_caches()
+
+        if keyword is not None:
+            keyword_matcher.remove(keyword.name)
+        elif keyword_matcher is not None and model is Source:
+            # Deleting a source deletes its keywords too.
+            matcher.discard_matcher(self.key())
+        return True
+
+    def get_article_by_url(self, url):
+        """(Database, str) -> Article
+        Returns the article with exactly the given URL, or None if there is
+        no such article. Lookups are cached, including lookups of URLs that
+        aren't in the database, so repeated lookups (as made while crawling)
+        don't query the database again.
+        """
+        if not url:
+            return None
+
+        url = url.strip()
+        self._check_caches()
+        article = self.article_cache.get(url, MISSING)
+        if article is MISSING:
+            article = Query(self, Article, ['article.url = ?'], [url]).first()
+            self.article_cache.put(url, article)
+        return article
+
+    def get_articles_by_urls(self, urls):
+        """(Database, iterable of str) -> dict of {str: Article}
+        Returns the articles with exactly the given URLs, by URL. URLs with
+        no article aren't in the dict. Like get_article_by_url, lookups are
+        cached, but the URLs that aren't cached are looked up together, with
+        a query for every CHUNK_SIZE URLs rather than one for each URL.
+        """
+        self._check_caches()
+        articles = {}
+        missing = []
+        for url in urls:
+            if not url:
+                continue
+            url = url.strip()
+            article = self.article_cache.get(url, MISSING)
+            if article is MISSING:
+                if url not in missing:
+                    missing.append(url)
+            elif article is not None:
+                articles[url] = article
+
+        # Look up the URLs that weren't cached, and cache them, including the
+        # ones that aren't in the database.
+        for chunk in chunks(missing):
+            found = Query(self, Article, ['article.url IN (%s)' %
+                                          placeholders(len(chunk))],
+                          chunk).all()
+            for article in found:
+                articles[article.url] = article
+            for url in chunk:
+                self.article_cache.put(url, articles.get(url))
+        return articles
+
+    def get_source_by_url(self, url):
+        """(Database, str) -> Source
+        Returns the source with exactly the given URL (as Source stores it,
+        for example google.com), or None if there is no such source. Lookups
+        are cached like get_article_by_url.
+        """
+        if not url:
+            return None
+
+        url = url.strip()
+        self._check_caches()
+        source = self.source_cache.get(url, MISSING)
+        if source is MISSING:
+            source = Query(self, Source, ['source.url = ?'], [url]).first()
+            self.source_cache.put(url, source)
+        return source
+
+    def cache_stats(self):
+        """(Database) -> dict
+        Returns the counters of the article and source URL caches.
+        """
+        return {'articles': self.article_cache.stats(),
+                'sources': self.source_cache.stats()}
+
+    def _check_caches(self):
+        """(Database) -> None
+        Private function that clears the URL caches if another connection
+        has written to the database since they were last checked.
+        """
+        rows = self.query(None, 'PRAGMA data_version', convert=False)
+        if rows[0]['data_version'] != self.data_version:
+            self._clear_caches()
+            self.data_version = rows[0]['data_version']
+
+    def _clear_caches(self):
+        """(Database) -> None
+        Private function that forgets every cached URL lookup.
+        """
+        self.article_cache.clear()
+        self.source_cache.clear()
+
+    def keyword_matcher(self):
+        """(Database) -> matcher.KeywordMatcher
+        Returns the keyword matcher for the keywords in the database, which
+        finds the sources referred to by a text in a single pass. The
+        matcher is loaded from the database once, shared by every connection
+        to the database in the process, and kept up to date as keywords are
+        added and deleted.
+        """
+        return matcher.get_matcher(
+            self.key(),
+            lambda: [(row['name'], row['source_id']) for row in self.query(
+                None, 'SELECT name, source_id FROM keyword', convert=False)])
+
+    def key(self):
+        """(Database) -> object
+        Returns the key of the database, which state shared between its
+        connections (such as the keyword matcher, the write generation and
+        cached counts) is kept under. Every connection to ':memory:' is a
+        different database, so those aren't shared.
+        """
+        if self.path == ':memory:':
+            return self.path, id(self.connection)
+        return self.path
 
     def get_by_id(self, model, id):
         """(Database, Model, int) -> dict
@@ -290,14 +816,22 @@ class Database():
 
     def get_articles(self, url='', title='', author='', tags='',
                      date_start='', date_end='', query='',
-                     source_id=None):
-        """(Database, str, str, str, str, str, str, Bool, str, int) -> Query
+                     source_id=None, ranked=False, all_tags=False):
+        """(Database, str, str, str, str, str, str, str, int, Bool, Bool)
+            -> Query
         Returns the query for the given combination of filters. Query is the
-        filter that checks multiple columns for matching values.
+        filter that checks multiple columns for matching values, using the
+        full text search index: it matches articles containing every word
+        in it (see search.match_expression). If ranked is True and query
+        has words, the query is for ArticleMatch objects, which can be
+        ordered by their relevance score. Tags is a comma separated list of
+        tags, matched regardless of case: articles with any of the tags
+        match, or only articles with all of them if all_tags is True.
         """
         # Add each filter and parameter if a value was given for it.
         filters = []
         params = []
+        model = Article
 
         if url:
             filters.append('article.url LIKE ?')
@@ -311,36 +845,49 @@ class Database():
             filters.append('article.author LIKE ?')
             params.append(author)
 
-        if tags:
-            # Tags are a comma separated list, so split them
-            tag_list = tags.split(',')
-
-            # Add each tag under a grouped query that checks for each one
-            # in the column
-            tag_filters = ['article.tags LIKE ? '] * len(tag_list)
-            tag_filters = "OR ".join(tag_filters)
-            filters.append('(%s)' % tag_filters)
-            params += tags
-
-        if date_start:
-            filters.append('article.date >= ?')
-            params.append(date_start)
-
-        if date_end:
-            filters.append('article.date <= ?')
-            params.append(date_end)
-
-        if query:
-            filters.append('(article.url LIKE ? OR article.title LIKE ? or '
-                           'article.date LIKE ? OR article.author LIKE ? or '
-                           'article.tags LIKE ?)')
-            params += [query, query, query, query, query]
+        # Tags are a comma separated list, so split them. Articles are found
+        # through the index on the tag table.
+        tag_list = split_tags(tags) if tags else []
+        if tag_list and all_tags:
+            # Articles must have every tag.
+            for tag in tag_list:
+                filters.append('article.id IN (SELECT article_id FROM '
+                               'article_tag WHERE tag = ?)')
+                params.append(tag)
+        elif tag_list:
+            # Articles must have any of the tags.
+            filters.append('article.id IN (SELECT article_id FROM '
+                           'article_tag WHERE tag IN (%s))' %
+                           placeholders(len(tag_list)))
+            params += tag_list
+
+        # Dates are compared by their numbers, through the index, unless they
+        # aren't dates, in which case they are compared as text.
+        for date, op in [(date_start, '>='), (date_end, '<=')]:
+            if date and date_number(date) is not None:
+                filters.append('article.date_num %s ?' % op)
+                params.append(date_number(date))
+            elif date:
+                filters.append('article.date %s ?' % op)
+                params.append(date)
+
+        # A query without any words matches every article.
+        match = match_expression(query)
+        if match and ranked:
+            # Search the index directly, so the matches can be ranked.
+            model = ArticleMatch
+            filters.append('article_fts MATCH ?')
+            params.append(match)
+        elif match:
+            filters.append('article.id IN (SELECT rowid FROM article_fts '
+                           'WHERE article_fts MATCH ?)')
+            params.append(match)
 
         if source_id:
             filters.append('article.source_id = ?')
             params.append(source_id)
 
-        return Query(self, Article, filters, params)
+        return Query(self, model, filters, params)
 
     def get_keywords(self, source_id=None, name=''):
         """(Database, str) -> Query
@@ -395,6 +942,166 @@ class Database():
 
         return Query(self, Reference, filters, params)
 
+    def get_source_edges(self, child_id=None, child_source_id=None,
+                         parent_source_id=None):
+        """(Database, int, int, int) -> [(str, str, int)]
+        Returns the edges of the graph of references between sources, as the
+        URL of the source of the child article, the URL of the source
+        referred to, and the number of such references. Only references from
+        the given child article, from articles of the given source, or to the
+        given source are counted, if given. The references are counted in
+        one query, by the database.
+        """
+        filters = []
+        params = []
+
+        if child_id:
+            filters.append('ref.child_id = ?')
+            params.append(child_id)
+
+        if child_source_id:
+            filters.append('article.source_id = ?')
+            params.append(child_source_id)
+
+        if parent_source_id:
+            filters.append('ref.source_id = ?')
+            params.append(parent_source_id)
+
+        columns, rows = self.select(
+            "SELECT child.url, parent.url, count(*) FROM ref "
+            "JOIN article ON article.id = ref.child_id "
+            "JOIN source AS child ON child.id = article.source_id "
+            "JOIN source AS parent ON parent.id = ref.source_id "
+            "%s GROUP BY article.source_id, ref.source_id" %
+            ('WHERE ' + ' AND '.join(filters) if filters else ''),
+            tuple(params))
+        return rows
+
+    def get_reference_counts(self, source_id, period='year'):
+        """(Database, int, str) -> dict of {int: int}
+        Returns the number of references to the given source, by the period
+        of the date of the article making the reference. The period is one
+        of PERIODS: periods are numbered like the days of article.date_number,
+        for example 2014 for a year, 201411 for a month, and 201446 for the
+        46th (ISO) week of 2014. Articles without a date aren't counted. The
+        counts are read from the ref_rollup table, without reading the
+        references.
+        """
+        if period not in PERIODS:
+            raise ValueError("Unknown period: %s" % period)
+
+        rows = self.query(None,
+                          "SELECT %s AS period, sum(count) AS c "
+                          "FROM ref_rollup WHERE source_id = ? "
+                          "GROUP BY period" % PERIODS[period],
+                          (source_id, ), convert=False)
+        if period != 'week':
+            return dict([(row['period'], row['c']) for row in rows])
+
+        # Weeks can't be found from the number of the day in SQL, so the
+        # days are added up into their weeks here.
+        counts = {}
+        for row in rows:
+            day = row['period']
+            year, week, _ = datetime.date(
+                day / 10000, day / 100 % 100, day % 100).isocalendar()
+            counts[year * 100 + week] = counts.get(year * 100 + week, 0) + \
+                row['c']
+        return counts
+
+    def get_validator(self, url):
+        """(Database, str) -> dict
+        Returns the HTTP validators of the last response for the given URL,
+        as a dictionary with its etag, last_modified and hash, or None if the
+        URL was never fetched.
+        """
+        rows = self.query(None, "SELECT etag, last_modified, hash FROM "
+                                "http_validator WHERE url = ?", (url, ),
+                          convert=False)
+        return rows[0] if rows else None
+
+    def set_validator(self, url, etag=None, last_modified=None, hash=None):
+        """(Database, str, str, str, str) -> Bool
+        Keeps the HTTP validators of the last response for the given URL: its
+        ETag and Last-Modified headers, and the hash of its content.
+        """
+        # Update the validators of the URL, or add them if it has none.
+        with self.batch():
+            if self._run("UPDATE http_validator SET etag = ?, "
+                         "last_modified = ?, hash = ? WHERE url = ?",
+                         (etag, last_modified, hash, url)).rowcount > 0:
+                return True
+            return self.execute("INSERT OR IGNORE INTO http_validator(url, "
+                                "etag, last_modified, hash) "
+                                "VALUES (?, ?, ?, ?)",
+                                (url, etag, last_modified, hash))
+
+    def add_frontier(self, crawl, kind, url, parent='', date='', verify=True,
+                     depth=1, priority=0):
+        """(Database, str, str, str, str, str, Bool, int, int) -> int
+        Adds a page to the frontier of the given crawl, queued to be crawled
+        as the given kind of page. Returns the id of the page in the
+        frontier, or None if the crawl already has the page for the same
+        parent and depth.
+        """
+        cursor = self._run("INSERT OR IGNORE INTO crawl_frontier(crawl, kind, "
+                           "url, parent, date, verify, depth, priority) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (crawl, kind, url, parent, date, verify, depth,
+                            priority))
+        return cursor.lastrowid if cursor.rowcount > 0 else None
+
+    def get_frontier(self, crawl):
+        """(Database, str) -> [dict]
+        Returns the pages in the frontier of the given crawl, in the order
+        they are crawled: by priority, then in the order they were found.
+        """
+        return self.query(None, "SELECT id, kind, url, parent, date, verify, "
+                                "depth, priority, state, attempts FROM "
+                                "crawl_frontier WHERE crawl = ? "
+                                "ORDER BY priority, id", (crawl, ),
+                          convert=False)
+
+    def get_frontier_crawls(self):
+        """(Database) -> [str]
+        Returns the crawls that have pages in their frontier, which are the
+        crawls that stopped before they finished.
+        """
+        columns, rows = self.select("SELECT DISTINCT crawl FROM "
+                                    "crawl_frontier")
+        return [row[0] for row in rows]
+
+    def set_frontier_state(self, id, state):
+        """(Database, int, str) -> Bool
+        Sets the state of a page in the frontier of a crawl.
+        """
+        return self.execute("UPDATE crawl_frontier SET state = ? WHERE id = ?",
+                            (state, id))
+
+    def retry_frontier(self, crawl, attempts):
+        """(Database, str, int) -> None
+        Readies a crawl that is being resumed: counts another attempt at the
+        page that was running when the crawl stopped, and queues it again,
+        or fails it if it stopped the crawl more than the given number of
+        times, so pages that stop crawls aren't retried forever. The other
+        pages of the crawl are left as they were.
+        """
+        with self.batch():
+            self._run("UPDATE crawl_frontier SET attempts = attempts + 1 "
+                      "WHERE crawl = ? AND state = ?", (crawl, RUNNING))
+            self._run("UPDATE crawl_frontier SET state = ? WHERE crawl = ? "
+                      "AND state = ? AND attempts > ?",
+                      (FAILED, crawl, RUNNING, attempts))
+            self._run("UPDATE crawl_frontier SET state = ? WHERE crawl = ? "
+                      "AND state = ?", (QUEUED, crawl, RUNNING))
+
+    def delete_frontier(self, crawl):
+        """(Database, str) -> Bool
+        Deletes the frontier of a finished crawl.
+        """
+        return self.execute("DELETE FROM crawl_frontier WHERE crawl = ?",
+                            (crawl, ))
+
     def get_sources(self, url='', urls=None):
         """(Database, str, [str]) -> Query
         Returns the query for the given combination of filters.
@@ -415,6 +1122,20 @@ class Database():
 
         return Query(self, Source, filters, params)
 
+    def get_tags(self, tag=''):
+        """(Database, str) -> Query
+        Returns the query for the tags of the articles, with the number of
+        articles that have each tag, for the given filters.
+        """
+        filters = []
+        params = []
+
+        if tag:
+            filters.append('tag.tag LIKE ?')
+            params.append(tag)
+
+        return Query(self, Tag, filters, params)
+
     def get_watches(self, url='', domain=''):
         """(Database, str, str) -> Query
         Returns the query for the given combination of filters.
@@ -433,14 +1154,100 @@ class Database():
         return Query(self, Watch, filters, params)
 
 
-def row_to_dict(cursor, row):
-    """(cursor, row) -> dict
-    Returns a dict from an sqlite3 row. From the sqlite3 docs
-    on python.org."""
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
+def write_generation(key):
+    """(object) -> int
+    Returns the write generation of the database with the given key, which
+    changes whenever this process writes to the database.
+    """
+    return generations.get(key, 0)
+
+
+def bump_generation(key):
+    """(object) -> None
+    Advances the write generation of the database with the given key.
+    """
+    with generations_lock:
+        generations[key] = generations.get(key, 0) + 1
+
+
+def chunks(items, size=CHUNK_SIZE):
+    """(list, int) -> generator of list
+    Yields consecutive slices of the list with at most size items each.
+    """
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def placeholders(count):
+    """(int) -> str
+    Returns the comma separated list of count question marks, used for
+    parameters in sqlite queries.
+    """
+    return ', '.join(['?'] * count)
+
+
+# The periods that references can be counted by, and the expression that
+# numbers the period of a day of the ref_rollup table.
+PERIODS = {
+    'year': 'day / 10000',
+    'month': 'day / 100',
+    'week': 'day',
+    'day': 'day',
+}
+
+# The insert statements for each model and insert command, built once.
+statements = {}
+
+
+def model_fields(model):
+    """(Model) -> [str]
+    Returns the list of the names of the fields the database stores for the
+    given model, or object of the model.
+    """
+    return [field.strip() for field in model.db_fields.split(',')]
+
+
+def insert_statement(model, command='INSERT'):
+    """(Model, str) -> str
+    Returns the statement that inserts a row for the given model (or object
+    of the model) with the given insert command.
+    """
+    key = (model.db_table, command)
+    if key not in statements:
+        fields = model_fields(model)
+        statements[key] = '%s INTO %s(%s) VALUES (%s)' % (
+            command, model.db_table, ', '.join(fields),
+            placeholders(len(fields)))
+    return statements[key]
+
+
+def update_statement(model):
+    """(Model) -> str
+    Returns the statement that updates every field of the row for the given
+    model (or object of the model) with a given id. The id is the last
+    parameter.
+    """
+    key = (model.db_table, 'UPDATE')
+    if key not in statements:
+        fields = [field for field in model_fields(model) if field != 'id']
+        statements[key] = 'UPDATE %s SET %s WHERE id = ?' % (
+            model.db_table, ', '.join(['%s = ?' % field
+                                       for field in fields]))
+    return statements[key]
+
+
+def integrity_outcome(error):
+    """(sqlite3.IntegrityError) -> str
+    Returns the bulk add outcome for a row that failed to insert with the
+    given error: DUPLICATE if it conflicted with an existing row, and
+    REJECTED otherwise.
+    """
+    message = str(error)
+    if message.startswith('UNIQUE') or message.endswith('not unique') or \
+            message.startswith('Duplicated'):
+        return DUPLICATE
+    return REJECTED
+
 
 if __name__ == "__main__":
     # Create the database and the tables.
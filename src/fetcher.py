@@ -0,0 +1,225 @@
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# The User-Agent the crawlers identify themselves with.
+USER_AGENT = "NewsFeed/1.0 (+https://github.com/chandni-s/NewsFeed)"
+
+# Seconds to wait for a connection to a server, and for its response.
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# The number of hosts connections are kept open to, and the number of open
+# connections kept to each host. Crawls fetch at most a few pages from a
+# host at once (see web.CRAWL_HOST_WORKERS), so a few are enough.
+POOL_HOSTS = 64
+POOL_SIZE = 4
+
+# Marks an argument that wasn't given, as opposed to None.
+MISSING = object()
+
+
+class Fetcher():
+    """Fetches web pages over a pooled, keep-alive requests session, so that
+    pages fetched from the same host reuse its connection instead of
+    connecting (and resolving the host) again. Fetchers are thread safe, and
+    count the requests they make, the connections they open, the bytes they
+    receive, and the pages they didn't have to parse again because they
+    hadn't changed.
+    """
+
+    def __init__(self, pool_hosts=POOL_HOSTS, pool_size=POOL_SIZE,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 user_agent=USER_AGENT):
+        """(Fetcher, int, int, tuple, str) -> None
+        Creates a fetcher that keeps pool_size connections open to each of
+        the last pool_hosts hosts, and gives up on requests after the
+        timeout, given as (connect, read) seconds.
+        """
+        self.timeout = timeout
+        self.lock = threading.Lock()
+
+        # Fetcher counters.
+        self.requests = 0
+        self.connections = 0
+        self.received = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        adapter = _CountingAdapter(self._connected,
+                                   pool_connections=pool_hosts,
+                                   pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, **kwargs):
+        """(Fetcher, str, ...) -> requests.Response
+        Fetches the given URL, like requests.get. Raises the exceptions of
+        requests if the URL couldn't be fetched.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(url, **kwargs)
+
+        # Count the request, and the bytes of the response. Reading the
+        # content also returns the connection to the pool.
+        received = len(response.content or '')
+        with self.lock:
+            self.requests += 1
+            self.received += received
+        return response
+
+    def get_changed(self, database, url, save=True, **kwargs):
+        """(Fetcher, Database, str, Bool, ...) -> requests.Response
+        Fetches the given URL like get, unless it hasn't changed since it was
+        last fetched with get_changed. The request sends the ETag and
+        Last-Modified date of the last response (kept in the database) for
+        the server to answer 304 Not Modified, and a response with the same
+        content as the last one is unchanged too. Returns None if the page
+        is unchanged. If save is False, the response isn't kept as the last
+        one until it is given to save_validator, so that the page isn't
+        unchanged next time if what it was fetched for fails.
+        """
+        validator = database.get_validator(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if validator is not None:
+            if validator['etag']:
+                headers['If-None-Match'] = validator['etag']
+            if validator['last_modified']:
+                headers['If-Modified-Since'] = validator['last_modified']
+
+        response = self.get(url, headers=headers, **kwargs)
+        if response.status_code == 304:
+            with self.lock:
+                self.not_modified += 1
+            return None
+        if response.status_code != 200:
+            # Only keep the validators of pages that were fetched.
+            return response
+
+        # Keep the validators of the response, if they changed.
+        if save:
+            self.save_validator(database, url, response, validator)
+
+        digest = hashlib.sha1(response.content).hexdigest()
+        if validator is not None and validator['hash'] == digest:
+            with self.lock:
+                self.unchanged += 1
+            return None
+        return response
+
+    def save_validator(self, database, url, response, validator=MISSING):
+        """(Fetcher, Database, str, requests.Response, dict) -> None
+        Keeps a response for the given URL as the last one get_changed
+        fetched, unless it is already kept. The kept validator of the URL
+        can be given if it was already looked up.
+        """
+        if validator is MISSING:
+            validator = database.get_validator(url)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        digest = hashlib.sha1(response.content).hexdigest()
+        if validator != {'etag': etag, 'last_modified': last_modified,
+                         'hash': digest}:
+            database.set_validator(url, etag, last_modified, digest)
+
+    def stats(self, since=None):
+        """(Fetcher, dict) -> dict
+        Returns the fetcher counters: the number of requests made, the number
+        of connections opened for them, the share of requests that reused
+        an open connection, the number of bytes received, and the number of
+        pages that weren't parsed again (avoided) because the server said
+        they weren't modified or their content was unchanged. If since is
+        the counters returned by an earlier call, returns the counters for
+        what happened since then.
+        """
+        with self.lock:
+            stats = {'requests': self.requests,
+                     'connections': self.connections,
+                     'bytes': self.received,
+                     'not_modified': self.not_modified,
+                     'unchanged': self.unchanged}
+        if since is not None:
+            for key in stats:
+                stats[key] -= since[key]
+
+        reused = max(stats['requests'] - stats['connections'], 0)
+        stats['reuse_ratio'] = (float(reused) / stats['requests']
+                                if stats['requests'] else 0.0)
+        stats['avoided'] = stats['not_modified'] + stats['unchanged']
+        return stats
+
+    def close(self):
+        """(Fetcher) -> None
+        Closes the open connections.
+        """
+        self.session.close()
+
+    def _connected(self):
+        """(Fetcher) -> None
+        Private function that counts a connection being opened.
+        """
+        with self.lock:
+            self.connections += 1
+
+
+class _CountingAdapter(HTTPAdapter):
+    """A transport adapter whose connection pools call a function whenever
+    they open a connection.
+    """
+
+    def __init__(self, connected, **kwargs):
+        """(_CountingAdapter, function, ...) -> None
+        Creates an adapter that calls connected for every new connection.
+        """
+        self.connected = connected
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        """(_CountingAdapter, ...) -> None
+        Creates the pool manager, with connection pools that count their
+        connections.
+        """
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        manager = self.poolmanager
+        manager.pool_classes_by_scheme = dict(
+            [(scheme, _counting_pool(pool_class, self.connected))
+             for scheme, pool_class in
+             manager.pool_classes_by_scheme.items()])
+
+
+def _counting_pool(pool_class, connected):
+    """(type, function) -> type
+    Private function that returns a subclass of a urllib3 connection pool
+    class that calls connected whenever it opens a connection.
+    """
+    def _new_conn(self):
+        connected()
+        return pool_class._new_conn(self)
+    return type(pool_class.__name__, (pool_class, ), {'_new_conn': _new_conn})
+
+
+# The fetcher shared by all the crawlers.
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def shared():
+    """(None) -> Fetcher
+    Returns the fetcher shared by all the crawlers, creating it if it doesn't
+    exist.
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher()
+        return _fetcher
+
+
+def get(url, **kwargs):
+    """(str, ...) -> requests.Response
+    Fetches the given URL with the shared fetcher, like requests.get.
+    """
+    return shared().get(url, **kwargs)
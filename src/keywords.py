@@ -12,6 +12,9 @@ class Keyword(Model):
               "keyword LEFT JOIN source ON keyword.source_id = " \
               "source.id) AS keyword "
     db_fields = "id, source_id, name"
+    db_unique = "name"
+
+    __slots__ = ('id', 'source_id', 'name', 'source')
     db_labels = "id, source_id, name, " \
                 "(coalesce(url, '')) as source"
 
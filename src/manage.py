@@ -0,0 +1,63 @@
+#
+# manage.py
+#
+# Maintenance commands for the application's database. Run a command with:
+#
+#     python manage.py <command> [database]
+#
+# The database defaults to the one the server uses. Running the file without
+# a command lists the commands.
+#
+from database import Database
+import sys
+
+
+# The database the server uses.
+DATABASE = 'test.db'
+
+
+def migrate(path=DATABASE):
+    """(str) -> None
+    Creates the tables of the database, or upgrades an existing database.
+    """
+    db = Database(path)
+    print "Schema version %d." % db.create_tables()
+    db.close()
+
+
+def rebuild_search(path=DATABASE):
+    """(str) -> None
+    Rebuilds the full text search index of the articles.
+    """
+    db = Database(path)
+    db.create_tables()
+    db.rebuild_search_index()
+    print "Indexed %d articles." % db.get_articles().count()
+    db.close()
+
+
+def normalize_dates(path=DATABASE):
+    """(str) -> None
+    Numbers the dates of articles in formats the migration didn't number.
+    """
+    db = Database(path)
+    db.create_tables()
+    print "Numbered %d dates." % db.normalize_dates()
+    db.close()
+
+
+# The commands that can be run, by name.
+COMMANDS = {
+    'migrate': migrate,
+    'rebuild-search': rebuild_search,
+    'normalize-dates': normalize_dates,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print "Usage: python manage.py <command> [database]"
+        for name in sorted(COMMANDS):
+            print "    %-16s %s" % (
+                name, COMMANDS[name].__doc__.split('\n')[1].strip())
+    else:
+        COMMANDS[sys.argv[1]](*sys.argv[2:])
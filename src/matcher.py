@@ -0,0 +1,179 @@
+from collections import deque
+import threading
+
+
+def tokenize(text):
+    """(str) -> [str]
+    Returns the words of the text, as keywords are matched: split on
+    whitespace, and in lower case.
+    """
+    return text.lower().split()
+
+
+class KeywordMatcher():
+    """Finds every keyword that occurs in a text in a single pass over the
+    text, using an Aho-Corasick automaton over words. Keywords may span
+    several words, and match whole words only, ignoring case. Each keyword
+    belongs to a source, like the keywords in the database.
+
+    Keywords can be added and removed at any time. The automaton is rebuilt
+    from the keywords the next time a text is matched, and matching uses the
+    automaton built at the time, so it is safe to match texts from several
+    threads while the keywords change.
+    """
+
+    def __init__(self, keywords=()):
+        """(KeywordMatcher, iterable of (str, int)) -> None
+        Creates a matcher for the given keyword names and source ids.
+        """
+        # The source id of each keyword, by the words of the keyword.
+        self.keywords = {}
+
+        # The lock guards the keywords and the automaton. The automaton is
+        # None when it needs to be rebuilt.
+        self.lock = threading.Lock()
+        self.automaton = None
+
+        for name, source_id in keywords:
+            self.add(name, source_id)
+
+    def add(self, name, source_id):
+        """(KeywordMatcher, str, int) -> None
+        Adds a keyword, or changes the source of an existing one.
+        """
+        words = tuple(tokenize(name))
+        if words:
+            with self.lock:
+                self.keywords[words] = source_id
+                self.automaton = None
+
+    def remove(self, name):
+        """(KeywordMatcher, str) -> None
+        Removes a keyword, if it exists.
+        """
+        words = tuple(tokenize(name))
+        with self.lock:
+            if words in self.keywords:
+                del self.keywords[words]
+                self.automaton = None
+
+    def find(self, text):
+        """(KeywordMatcher, str) -> [(str, int)]
+        Returns the name and source id of every keyword occurring in the
+        text, in the order they end in the text (longest first).
+        """
+        goto, fail, output = self._get_automaton()
+
+        matches = []
+        state = 0
+        for word in tokenize(text):
+            # Fall back to the longest suffix that can continue with the
+            # word.
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+
+            for words, source_id in output[state]:
+                matches.append((' '.join(words), source_id))
+        return matches
+
+    def sources(self, text):
+        """(KeywordMatcher, str) -> [int]
+        Returns the ids of the sources with keywords occurring in the text,
+        without repeats, in the order they first occur.
+        """
+        sources = []
+        for name, source_id in self.find(text):
+            if source_id not in sources:
+                sources.append(source_id)
+        return sources
+
+    def __len__(self):
+        """(KeywordMatcher) -> int
+        Returns the number of keywords.
+        """
+        return len(self.keywords)
+
+    def _get_automaton(self):
+        """(KeywordMatcher) -> (list, list, list)
+        Private function that returns the automaton for the keywords,
+        building it if the keywords changed since it was last built.
+        """
+        with self.lock:
+            if self.automaton is None:
+                self.automaton = self._build()
+            return self.automaton
+
+    def _build(self):
+        """(KeywordMatcher) -> (list, list, list)
+        Private function that builds the automaton for the keywords: for
+        each state, the transitions on words, the failure transition, and
+        the keywords (with their source ids) that end in the state.
+        """
+        # Build the trie of the keywords. State 0 is the root.
+        goto = [{}]
+        output = [[]]
+        for words, source_id in self.keywords.items():
+            state = 0
+            for word in words:
+                if word not in goto[state]:
+                    goto.append({})
+                    output.append([])
+                    goto[state][word] = len(goto) - 1
+                state = goto[state][word]
+            output[state].append((words, source_id))
+
+        # Find the failure transitions breadth first, so the failure state
+        # of a state (which is shallower) is always found before it.
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next in goto[state].items():
+                queue.append(next)
+
+                # The failure of the next state is the longest proper suffix
+                # of its words that is in the trie.
+                suffix = fail[state]
+                while suffix and word not in goto[suffix]:
+                    suffix = fail[suffix]
+                fail[next] = goto[suffix].get(word, 0)
+
+                # Keywords ending at the suffix also end at the next state.
+                output[next] = output[next] + output[fail[next]]
+
+        return goto, fail, output
+
+
+# The keyword matchers shared by every database connection in the process,
+# by database.
+matchers = {}
+matchers_lock = threading.Lock()
+
+
+def get_matcher(key, load):
+    """(object, function) -> KeywordMatcher
+    Returns the shared keyword matcher for the given key, creating it from
+    the keyword names and source ids returned by load if it doesn't exist.
+    """
+    with matchers_lock:
+        if key not in matchers:
+            matchers[key] = KeywordMatcher(load())
+        return matchers[key]
+
+
+def find_matcher(key):
+    """(object) -> KeywordMatcher
+    Returns the shared keyword matcher for the given key, or None if it
+    hasn't been created.
+    """
+    return matchers.get(key)
+
+
+def discard_matcher(key):
+    """(object) -> None
+    Discards the shared keyword matcher for the given key, so that it is
+    created again the next time it is needed.
+    """
+    with matchers_lock:
+        matchers.pop(key, None)
@@ -0,0 +1,399 @@
+import time
+
+
+def split_tags(tags):
+    """(str) -> str
+    Returns a subquery that splits the given SQL expression, a comma
+    separated list of tags, into a row for each tag, without the spaces
+    around the tags, and without empty tags.
+    """
+    return ("(WITH RECURSIVE split(tag, rest) AS ("
+            "SELECT '', %s || ',' UNION ALL "
+            "SELECT trim(substr(rest, 1, instr(rest, ',') - 1)), "
+            "substr(rest, instr(rest, ',') + 1) FROM split WHERE rest != '') "
+            "SELECT tag FROM split WHERE tag != '')" % tags)
+
+
+def count_changes(table):
+    """(str) -> [str]
+    Returns the statements creating the triggers that count the rows
+    inserted into, updated in and deleted from the given table in
+    change_count.
+    """
+    return ["CREATE TRIGGER IF NOT EXISTS %s_change_%s AFTER %s ON %s "
+            "BEGIN UPDATE change_count SET count = count + 1; END;" %
+            (table, event.lower(), event, table)
+            for event in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+# (list of (int, str, [str]))
+# The ordered migrations for the database schema. Each migration has a
+# version number, a description, and the statements that upgrade the schema
+# from the previous version. Migrations are only ever appended to this list:
+# once a migration has been released, databases in the wild may have applied
+# it, so changing it would leave them with a different schema.
+MIGRATIONS = [
+    (1, "Create the tables and reference triggers.", [
+        # Create the sources table.
+        "CREATE TABLE IF NOT EXISTS source("
+        "id INTEGER PRIMARY KEY NOT NULL, "
+        "url TEXT UNIQUE NOT NULL)",
+
+        # Create the keywords table.
+        "CREATE TABLE IF NOT EXISTS keyword( "
+        "id INTEGER PRIMARY KEY, "
+        "source_id INTEGER, "
+        "name TEXT UNIQUE NOT NULL, "
+        "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
+        "CASCADE)",
+
+        # Create the articles table.
+        "CREATE TABLE IF NOT EXISTS article("
+        "id INTEGER PRIMARY KEY NOT NULL, "
+        "source_id INTEGER NOT NULL, "
+        "url TEXT UNIQUE NOT NULL, "
+        "title TEXT NOT NULL, "
+        "date DATE NOT NULL, "
+        "author TEXT NOT NULL, "
+        "tags TEXT NOT NULL, "
+        "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
+        "CASCADE)",
+
+        # Create the watchlist table.
+        "CREATE TABLE IF NOT EXISTS watch("
+        "id INTEGER PRIMARY KEY NOT NULL, "
+        "url TEXT UNIQUE NOT NULL,"
+        "domain TEXT UNIQUE NOT NULL)",
+
+        # Create the reference table.
+        "CREATE TABLE IF NOT EXISTS ref("
+        "id INTEGER PRIMARY KEY, "
+        "source_id INTEGER NOT NULL, "
+        "child_id INTEGER NOT NULL, "
+        "parent_id INTEGER, "
+        "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
+        "CASCADE, "
+        "FOREIGN KEY(child_id) REFERENCES article(id) ON DELETE "
+        "CASCADE, "
+        "FOREIGN KEY(parent_id) REFERENCES article(id) ON DELETE "
+        "CASCADE, "
+        "UNIQUE(child_id, parent_id), "
+        "CHECK (child_id != parent_id))",
+
+        # Create the duplicate detection trigger for references.
+        "CREATE TRIGGER IF NOT EXISTS ref_dup_check BEFORE INSERT ON ref "
+        "WHEN NEW.parent_id IS NULL BEGIN SELECT "
+        "RAISE(ABORT, 'Duplicated article/source reference.') "
+        "WHERE EXISTS (SELECT * FROM ref "
+        "WHERE source_id=NEW.source_id "
+        "AND child_id=NEW.child_id LIMIT 1); END;",
+
+        # Creating the auto delete trigger for deleting a reference with
+        # the same source as an added link
+        "CREATE TRIGGER IF NOT EXISTS ref_clean AFTER INSERT on ref "
+        "WHEN NEW.parent_id IS NOT NULL BEGIN "
+        "DELETE FROM ref WHERE "
+        "source_id=NEW.source_id AND child_id=NEW.child_id "
+        "AND parent_id IS NULL; END;",
+
+        # Create the trigger that prevents adding a reference from an
+        # article to its publisher source.
+        "CREATE TRIGGER IF NOT EXISTS ref_source_check BEFORE INSERT ON ref "
+        "BEGIN "
+        "SELECT RAISE(ABORT, "
+        "'Reference source and article source are the same.') "
+        "WHERE EXISTS (SELECT * FROM article WHERE "
+        "id = NEW.child_id AND source_id = NEW.source_id); "
+        "END;"]),
+
+    (2, "Index the hot lookup columns.", [
+        # Articles are filtered by their source, and by date ranges.
+        "CREATE INDEX IF NOT EXISTS article_source_id ON article(source_id)",
+        "CREATE INDEX IF NOT EXISTS article_date ON article(date)",
+
+        # References are filtered by source, and ref_dup_check and ref_clean
+        # look references up by both their source and child article. Lookups
+        # by child article alone already use the UNIQUE(child_id, parent_id)
+        # index.
+        "CREATE INDEX IF NOT EXISTS ref_source_child ON ref(source_id, "
+        "child_id)",
+        "CREATE INDEX IF NOT EXISTS ref_parent_id ON ref(parent_id)",
+
+        # Keywords are listed by source.
+        "CREATE INDEX IF NOT EXISTS keyword_source_id ON keyword(source_id)"]),
+
+    (3, "Index the text of articles for full text search.", [
+        # The search index reads the text from the article table, instead of
+        # keeping its own copy, so the triggers below must keep it in step.
+        "CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5("
+        "url, title, date, author, tags, "
+        "content='article', content_rowid='id')",
+
+        "CREATE TRIGGER IF NOT EXISTS article_fts_insert AFTER INSERT ON "
+        "article BEGIN "
+        "INSERT INTO article_fts(rowid, url, title, date, author, tags) "
+        "VALUES (NEW.id, NEW.url, NEW.title, NEW.date, NEW.author, "
+        "NEW.tags); END;",
+
+        "CREATE TRIGGER IF NOT EXISTS article_fts_delete AFTER DELETE ON "
+        "article BEGIN "
+        "INSERT INTO article_fts(article_fts, rowid, url, title, date, "
+        "author, tags) VALUES ('delete', OLD.id, OLD.url, OLD.title, "
+        "OLD.date, OLD.author, OLD.tags); END;",
+
+        "CREATE TRIGGER IF NOT EXISTS article_fts_update AFTER UPDATE ON "
+        "article BEGIN "
+        "INSERT INTO article_fts(article_fts, rowid, url, title, date, "
+        "author, tags) VALUES ('delete', OLD.id, OLD.url, OLD.title, "
+        "OLD.date, OLD.author, OLD.tags); "
+        "INSERT INTO article_fts(rowid, url, title, date, author, tags) "
+        "VALUES (NEW.id, NEW.url, NEW.title, NEW.date, NEW.author, "
+        "NEW.tags); END;",
+
+        # Index the articles that already exist.
+        "INSERT INTO article_fts(article_fts) VALUES ('rebuild')"]),
+
+    (4, "Keep the tags of articles in their own table.", [
+        # Each tag of an article has a row, so articles can be found by tag
+        # with the index, instead of by matching the tags of every article.
+        # Tags are matched regardless of case, like the LIKE filters that
+        # they replace.
+        "CREATE TABLE IF NOT EXISTS article_tag("
+        "article_id INTEGER NOT NULL, "
+        "tag TEXT NOT NULL COLLATE NOCASE, "
+        "PRIMARY KEY(article_id, tag), "
+        "FOREIGN KEY(article_id) REFERENCES article(id) ON DELETE "
+        "CASCADE) WITHOUT ROWID",
+
+        "CREATE INDEX IF NOT EXISTS article_tag_tag ON article_tag(tag, "
+        "article_id)",
+
+        # The tags column of the article stays the source of the tags, so
+        # these triggers keep the table in step with it. Deleted articles
+        # lose their tags through the foreign key.
+        "CREATE TRIGGER IF NOT EXISTS article_tag_insert AFTER INSERT ON "
+        "article BEGIN "
+        "INSERT OR IGNORE INTO article_tag(article_id, tag) "
+        "SELECT NEW.id, tag FROM %s; END;" % split_tags('NEW.tags'),
+
+        "CREATE TRIGGER IF NOT EXISTS article_tag_update AFTER UPDATE OF "
+        "tags ON article WHEN NEW.tags IS NOT OLD.tags BEGIN "
+        "DELETE FROM article_tag WHERE article_id = OLD.id; "
+        "INSERT OR IGNORE INTO article_tag(article_id, tag) "
+        "SELECT NEW.id, tag FROM %s; END;" % split_tags('NEW.tags'),
+
+        # Split the tags of the articles that already exist.
+        "INSERT OR IGNORE INTO article_tag(article_id, tag) "
+        "WITH RECURSIVE split(article_id, tag, rest) AS ("
+        "SELECT id, '', tags || ',' FROM article UNION ALL "
+        "SELECT article_id, trim(substr(rest, 1, instr(rest, ',') - 1)), "
+        "substr(rest, instr(rest, ',') + 1) FROM split WHERE rest != '') "
+        "SELECT article_id, tag FROM split WHERE tag != ''"]),
+
+    (5, "Store the dates of articles as numbers.", [
+        # Dates are free form text, so they can't be compared as text. The
+        # day of the date is kept as the number YYYYMMDD beside it (see
+        # article.date_number), which date ranges are filtered on.
+        "ALTER TABLE article ADD COLUMN date_num INTEGER",
+        "CREATE INDEX IF NOT EXISTS article_date_num ON article(date_num, "
+        "id)",
+
+        # Number the dates of the articles that already exist, that are in
+        # the formats SQLite understands. manage.py normalize-dates numbers
+        # the rest.
+        "UPDATE article SET date_num = CAST(strftime('%Y%m%d', "
+        "replace(date, '/', '-')) AS INTEGER)"]),
+
+    (6, "Count the references to sources by day.", [
+        # The number of references to each source made by articles of each
+        # day (as article.date_num), so references can be counted by period
+        # without reading every reference. The triggers below keep the
+        # counts up to date, adding to a count with an UPDATE followed by an
+        # INSERT OR IGNORE, since SQLite before 3.24 has no upsert.
+        # References from articles without a date number aren't counted.
+        "CREATE TABLE IF NOT EXISTS ref_rollup("
+        "source_id INTEGER NOT NULL, "
+        "day INTEGER NOT NULL, "
+        "count INTEGER NOT NULL, "
+        "PRIMARY KEY(source_id, day), "
+        "FOREIGN KEY(source_id) REFERENCES source(id) ON DELETE "
+        "CASCADE) WITHOUT ROWID",
+
+        "CREATE TRIGGER IF NOT EXISTS ref_rollup_insert AFTER INSERT ON ref "
+        "BEGIN "
+        "UPDATE ref_rollup SET count = count + 1 "
+        "WHERE source_id = NEW.source_id AND day = "
+        "(SELECT date_num FROM article WHERE id = NEW.child_id); "
+        "INSERT OR IGNORE INTO ref_rollup(source_id, day, count) "
+        "SELECT NEW.source_id, date_num, 1 FROM article "
+        "WHERE id = NEW.child_id AND date_num IS NOT NULL; END;",
+
+        # References deleted along with their child article aren't counted
+        # here, since the article is gone by then: article_rollup_delete
+        # counts them instead.
+        "CREATE TRIGGER IF NOT EXISTS ref_rollup_delete AFTER DELETE ON ref "
+        "BEGIN "
+        "UPDATE ref_rollup SET count = count - 1 "
+        "WHERE source_id = OLD.source_id AND day = "
+        "(SELECT date_num FROM article WHERE id = OLD.child_id); "
+        "DELETE FROM ref_rollup WHERE source_id = OLD.source_id "
+        "AND count <= 0; END;",
+
+        "CREATE TRIGGER IF NOT EXISTS ref_rollup_update AFTER UPDATE OF "
+        "source_id, child_id ON ref WHEN NEW.source_id != OLD.source_id OR "
+        "NEW.child_id != OLD.child_id BEGIN "
+        "UPDATE ref_rollup SET count = count - 1 "
+        "WHERE source_id = OLD.source_id AND day = "
+        "(SELECT date_num FROM article WHERE id = OLD.child_id); "
+        "DELETE FROM ref_rollup WHERE source_id = OLD.source_id "
+        "AND count <= 0; "
+        "UPDATE ref_rollup SET count = count + 1 "
+        "WHERE source_id = NEW.source_id AND day = "
+        "(SELECT date_num FROM article WHERE id = NEW.child_id); "
+        "INSERT OR IGNORE INTO ref_rollup(source_id, day, count) "
+        "SELECT NEW.source_id, date_num, 1 FROM article "
+        "WHERE id = NEW.child_id AND date_num IS NOT NULL; END;",
+
+        # Moving an article to another day moves its references.
+        "CREATE TRIGGER IF NOT EXISTS article_rollup_update AFTER UPDATE OF "
+        "date_num ON article WHEN NEW.date_num IS NOT OLD.date_num BEGIN "
+        "UPDATE ref_rollup SET count = count - "
+        "(SELECT count(*) FROM ref WHERE child_id = OLD.id "
+        "AND ref.source_id = ref_rollup.source_id) "
+        "WHERE day = OLD.date_num; "
+        "DELETE FROM ref_rollup WHERE day = OLD.date_num AND count <= 0; "
+        "UPDATE ref_rollup SET count = count + "
+        "(SELECT count(*) FROM ref WHERE child_id = NEW.id "
+        "AND ref.source_id = ref_rollup.source_id) "
+        "WHERE day = NEW.date_num; "
+        "INSERT OR IGNORE INTO ref_rollup(source_id, day, count) "
+        "SELECT source_id, NEW.date_num, count(*) FROM ref "
+        "WHERE child_id = NEW.id AND NEW.date_num IS NOT NULL "
+        "GROUP BY source_id; END;",
+
+        "CREATE TRIGGER IF NOT EXISTS article_rollup_delete BEFORE DELETE ON "
+        "article BEGIN "
+        "UPDATE ref_rollup SET count = count - "
+        "(SELECT count(*) FROM ref WHERE child_id = OLD.id "
+        "AND ref.source_id = ref_rollup.source_id) "
+        "WHERE day = OLD.date_num; "
+        "DELETE FROM ref_rollup WHERE day = OLD.date_num AND count <= 0; "
+        "END;",
+
+        # Count the references that already exist.
+        "INSERT INTO ref_rollup(source_id, day, count) "
+        "SELECT ref.source_id, article.date_num, count(*) FROM ref "
+        "JOIN article ON article.id = ref.child_id "
+        "WHERE article.date_num IS NOT NULL "
+        "GROUP BY ref.source_id, article.date_num"]),
+
+    (7, "Keep the HTTP validators of fetched pages.", [
+        # The ETag, Last-Modified date and content hash of the last response
+        # for each fetched page, so the page is only parsed again once it
+        # changes (see fetcher.Fetcher.get_changed).
+        "CREATE TABLE IF NOT EXISTS http_validator("
+        "url TEXT PRIMARY KEY NOT NULL, "
+        "etag TEXT, "
+        "last_modified TEXT, "
+        "hash TEXT) WITHOUT ROWID"]),
+
+    (8, "Keep the frontier of crawls.", [
+        # The pages each crawl has found, and whether they were crawled yet,
+        # so a crawl that stops can be resumed (see web.CrawlEngine). A page
+        # is only crawled once per crawl for each parent and depth.
+        "CREATE TABLE IF NOT EXISTS crawl_frontier("
+        "id INTEGER PRIMARY KEY NOT NULL, "
+        "crawl TEXT NOT NULL, "
+        "kind TEXT NOT NULL, "
+        "url TEXT NOT NULL, "
+        "parent TEXT NOT NULL DEFAULT '', "
+        "date TEXT NOT NULL DEFAULT '', "
+        "verify INTEGER NOT NULL DEFAULT 1, "
+        "depth INTEGER NOT NULL, "
+        "priority INTEGER NOT NULL DEFAULT 0, "
+        "state TEXT NOT NULL DEFAULT 'queued', "
+        "attempts INTEGER NOT NULL DEFAULT 0, "
+        "UNIQUE(crawl, kind, url, parent, depth))",
+
+        "CREATE INDEX IF NOT EXISTS crawl_frontier_state ON "
+        "crawl_frontier(crawl, state, priority, id)"]),
+
+    (9, "Count the changes to the visualized data.", [
+        # The number of changes ever made to the sources, articles and
+        # references, which the visualizations are drawn from. Unlike the
+        # write generation of a process (see database.write_generation), it
+        # survives restarts and counts the writes of every process, so
+        # rendered visualizations can be cached by it (see
+        # Database.change_count).
+        "CREATE TABLE IF NOT EXISTS change_count("
+        "id INTEGER PRIMARY KEY NOT NULL CHECK(id = 1), "
+        "count INTEGER NOT NULL)",
+
+        "INSERT OR IGNORE INTO change_count(id, count) VALUES (1, 0)"] +
+        count_changes('source') + count_changes('article') +
+        count_changes('ref')),
+]
+
+
+def schema_version(connection):
+    """(sqlite3.Connection) -> int
+    Returns the version of the schema of the database, or 0 if no migrations
+    have been applied to it.
+    """
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version("
+        "version INTEGER PRIMARY KEY NOT NULL, "
+        "description TEXT NOT NULL, "
+        "applied TEXT NOT NULL)")
+
+    row = connection.execute(
+        "SELECT max(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(connection, target=None):
+    """(sqlite3.Connection, int) -> int
+    Applies every migration newer than the current schema version, up to
+    the target version (or the latest version if no target was given), and
+    returns the resulting schema version. Each migration is applied in its
+    own transaction, so a failed migration leaves the database at the
+    previous version, and raises the error that caused the failure.
+    """
+    if target is None:
+        target = MIGRATIONS[-1][0]
+
+    # Transactions are managed explicitly here, so turn off the implicit
+    # transaction handling of the sqlite3 module while migrating.
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+    try:
+        version = schema_version(connection)
+
+        for number, description, statements in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+
+            # Take the write lock before checking the version again, since
+            # another connection may have applied the migration meanwhile.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(connection) < number:
+                    for statement in statements:
+                        connection.execute(statement)
+
+                    connection.execute(
+                        "INSERT INTO schema_version(version, description, "
+                        "applied) VALUES (?, ?, ?)",
+                        (number, description,
+                         time.strftime('%Y-%m-%d %H:%M:%S')))
+
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+            version = number
+
+        return version
+    finally:
+        connection.isolation_level = isolation_level
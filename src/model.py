@@ -1,8 +1,13 @@
-class Model():
+class Model(object):
     """A database model. Objects that interact with the database (add, get,
     delete, etc...) should be derived from this class. This helps create a
     consistent interface for the database to use to implement its functions
-    (and prevents lots of repetition in queries as a bonus)."""
+    (and prevents lots of repetition in queries as a bonus).
+
+    Models list their members in __slots__, so that objects don't each carry
+    a dict. The slots must include every label in db_labels."""
+
+    __slots__ = ()
 
     # (str)
     # The table name for the class.
@@ -14,6 +19,12 @@ class Model():
     # columns, or the conversion from dict to the Model will fail.
     db_fields = ""
 
+    # (str)
+    # The fields (from db_fields) that uniquely identify an object besides
+    # its id. Adding an object whose unique fields match an existing row
+    # updates that row instead of adding a new one.
+    db_unique = ""
+
     # (str)
     # The labels to use after performing select operations. It is important
     # that these match all required elements in the constructor of the
@@ -27,15 +38,82 @@ class Model():
     # tables.
     db_from = ""
 
+    def to_dict(self):
+        """(Model) -> dict
+        Returns a dict of the members of the model that have been set.
+        """
+        members = {}
+        for name in model_slots(self.__class__):
+            if hasattr(self, name):
+                members[name] = getattr(self, name)
+        return members
+
     def __repr__(self):
         """(Model) -> str
         Returns the string representation of a model.
         """
-        # Convert the internal dictionary into something that looks like a
-        # parameter to list, for better readability.
+        # Convert the members into something that looks like a parameter
+        # list, for better readability.
         params = []
-        for k, v in self.__dict__.iteritems():
+        for k, v in self.to_dict().iteritems():
             params.append('%s=%r' % (k, v))
         params = ", ".join(params)
 
         return "%s(%s)" % (self.__class__.__name__, params)
+
+
+# The slot names of each model class, and the row mappers of each model and
+# query columns, built once.
+slots = {}
+mappers = {}
+
+
+def model_slots(model):
+    """(type) -> tuple of str
+    Returns the names of the slots of the model class, including the slots
+    of the classes it derives from.
+    """
+    if model not in slots:
+        names = []
+        for cls in reversed(model.__mro__):
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in names:
+                    names.append(name)
+        slots[model] = tuple(names)
+    return slots[model]
+
+
+def row_mapper(model, columns):
+    """(type, tuple of str) -> function
+    Returns a function that converts a row (a tuple of the values for the
+    given column names) into an object of the model, without running the
+    model's constructor. Members that aren't columns get the values the
+    constructor gives them, and columns that aren't members are ignored.
+    The function is compiled once for each model and list of columns.
+    """
+    key = (model, columns)
+    if key not in mappers:
+        members = model_slots(model)
+
+        # Take the defaults for the members that aren't columns from an
+        # object built by the constructor.
+        prototype = model()
+        defaults = [(name, getattr(prototype, name)) for name in members
+                    if name not in columns and hasattr(prototype, name)]
+
+        # Write the function out as source, so that each row is converted
+        # by plain attribute assignments, without a loop over the columns.
+        lines = ["def mapper(row):",
+                 "    object = new(model)"]
+        for index, (name, value) in enumerate(defaults):
+            lines.append("    object.%s = defaults[%d]" % (name, index))
+        for index, name in enumerate(columns):
+            if name in members:
+                lines.append("    object.%s = row[%d]" % (name, index))
+        lines.append("    return object")
+
+        scope = {'new': object.__new__, 'model': model,
+                 'defaults': [value for name, value in defaults]}
+        exec "\n".join(lines) in scope
+        mappers[key] = scope['mapper']
+    return mappers[key]
@@ -76,23 +76,11 @@ def get_references_in_article(database, a_id):
 
         name = str(article.title)
 
-        # Get all the references of this article.
-        references = database.get_references(a_id, None, None).all()
-        edges = dict()
-
-        for ref in references:
-
-            # Get the source name as end point of the edge
-            refstr = ""
-            if ref.source_url:
-                refstr += str(ref.source_url)
-
+        # Count the references of this article to each source.
+        for child, parent, weight in database.get_source_edges(child_id=a_id):
             # Add edge(child article, parent source) as dictionary key
             # and set proper count.
-            try:
-                edges[(name, refstr)] += 1
-            except KeyError:
-                edges[(name, refstr)] = 1
+            edges[(name, str(parent))] = weight
 
     return edges, name
 
@@ -122,22 +110,12 @@ def get_references_to_source(database, s_id):
         # Update the name of the source
         s_name = str(source.url)
 
-        # Get all the references to the source
-        references = database.get_references(None, s_id, None).all()
-        for ref in references:
-            child_source = ""
-            child_article = database.get_by_id(Article, ref.child_id)
-
-            # Get the name of the source of the article
-            if child_article.source:
-                child_source += str(child_article.source)
-
+        # Count the references to the source from each source.
+        for child, parent, weight in database.get_source_edges(
+                parent_source_id=s_id):
             # Add edge(child source, parent source) as dictionary key
             # and set proper count.
-            try:
-                ref_count[(child_source, s_name)] += 1
-            except KeyError:
-                ref_count[(child_source, s_name)] = 1
+            ref_count[(str(child), s_name)] = weight
 
     return ref_count, s_name
 
@@ -160,33 +138,19 @@ def get_references_from_source(database, s_id):
 
     # Get the source information from the database
     source = database.get_by_id(Source, s_id)
-    articles = database.get_articles(source_id=s_id).all()
     ref_count = dict()
     s_name = ""
 
-    if articles:
+    # Count the references inside the articles from source s_id to each
+    # source.
+    for child, parent, weight in database.get_source_edges(
+            child_source_id=s_id):
         # Update the name of the source
         s_name = str(source.url)
 
-        # Get all the references inside every article from source s_id
-        for article in articles:
-            references = database.get_references(article.id).all()
-
-            # Get all the references to parent_source
-            for reference in references:
-
-                parent_source = ""
-
-                # Get the name of the source of the article
-                if reference.source_url:
-                    parent_source += str(reference.source_url)
-
-                # Add edge(child source, parent source) as dictionary key
-                # and set proper count.
-                try:
-                    ref_count[(s_name, parent_source)] += 1
-                except KeyError:
-                    ref_count[(s_name, parent_source)] = 1
+        # Add edge(child source, parent source) as dictionary key
+        # and set proper count.
+        ref_count[(s_name, str(parent))] = weight
 
     return ref_count, s_name
 
@@ -4,37 +4,29 @@ from database import Database
 from source import Source
 from article import Article
 from keywords import Keyword
-from datetime import datetime
 import os
 import matplotlib
 matplotlib.use('Agg')  # Use matplotlib without a display server.
 import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from random import randint
 
 colors = ["b", "g", "c", "m", "y", "k"]
 styles = ["+", "--", "-.", "o", "+", "*", "p", "s", "D", "h"]
 
 
-def plot_bars(database, imgname, sources):
-    """(Database, name, list) -> None
+def plot_bars(database, imgname, sources, period='year'):
+    """(Database, name, list, str) -> None
     Draw the bars of the number of references made to a source contained inside
-    info, which contains the references made per year.
+    info, which contains the references made per period (year, month, week or
+    day).
     """
-    graph_info = get_graph_information(database, sources)
-    print ("PRINT GRAPH INFO BELOW ============")
-    print (sources)
+    graph_info = get_graph_information(database, sources, period)
 
-    print (graph_info)
-
-    # Format the years to be integers
-    years = []
-    for year in graph_info[0]:
-        years.append(int(year))
+    # Place a group of bars at each period, in order.
+    positions = range(len(graph_info[0]))
 
     # Choose an combination of line style
     color = 0
-    style = 0
 
     # Set up the img file where the graph will be outputted
     fig = plt.figure()
@@ -44,49 +36,33 @@ def plot_bars(database, imgname, sources):
     ax = fig.add_subplot(111)
 
     # Determine the width of each bar depending on the number of sources
-    width = 0.9 * (1.0 / len(graph_info[1]))
-    
-    #years = [2011, 2012, 2013, 2014, 2015, 2016] * len(sources)
-    #Graph a line for each source in sources
-    for i in range(len(sources)):
-
-        # Find where to place bars depending on width and number of sources
+    width = 0.9 * (1.0 / max(len(graph_info[1]), 1))
 
-        new_years = [year + width * i for year in years]
-        
-        print new_years
-        print ("============")
+    # Graph the bars for each source in sources
+    for i in range(len(graph_info[1])):
 
-        for j in years:
-            print (graph_info[1][i][i])
-            print (graph_info[2][i])
-            ax.bar(new_years[j], graph_info[1][i][i], width=width, color=colors[color],label=graph_info[2][i])
+        # Find where to place bars depending on width and number of sources
+        new_positions = [position + width * i for position in positions]
 
         # x-axis, y-axis, width, color, label
-        
+        ax.bar(new_positions, graph_info[1][i], width=width,
+               color=colors[color], label=graph_info[2][i])
+
         # Choose different colors and styles for lines
         color += 1
-        if color > len(colors):
+        if color >= len(colors):
             color = 0
-    # for i in range(len(sources)):
-    #     # Find where to place bars depending on width and number of sources
-    #     new_years = [year + width * i for year in years]
-    #     ax.bar(new_years[i],randint(1,20),width=width,color=colors[color],label=graph_info[2][i])
-
-    #     color += 1
-    #     if color > len(colors):
-    #         color = 0
 
     # Set up the labels on the graph
-    plt.title("Number of references made to sources by year")
-    plt.xlabel("Year")
+    plt.title("Number of references made to sources by %s" % period)
+    plt.xlabel(period.capitalize())
     plt.ylabel("Number of times referenced by articles")
 
     # Set up the legend of the graph
     plt.legend()
 
     # Set up the labels on the x-axis
-    ax.xaxis.set_major_formatter(mdates.ticker.FormatStrFormatter('%d'))
+    set_period_labels(ax, period, graph_info[0])
 
     # Save the image and output it into the file
     fig.savefig(imgname, dpi=100)
@@ -94,16 +70,16 @@ def plot_bars(database, imgname, sources):
     plt.close()
 
 
-def plot_lines(database, imgname, sources):
-    """(Database, name, list) -> None
+def plot_lines(database, imgname, sources, period='year'):
+    """(Database, name, list, str) -> None
     Draw the line of the number of references made to a source contained inside
-    info, which contains the references made per year.
+    info, which contains the references made per period (year, month, week or
+    day).
     """
-    graph_info = get_graph_information(database, sources)
-    # Format the years to be integers
-    years = []
-    for year in graph_info[0]:
-        years.append(int(year))
+    graph_info = get_graph_information(database, sources, period)
+
+    # Place each period at its position, in order.
+    positions = range(len(graph_info[0]))
 
     # Choose an combination of line style
     color = 0
@@ -118,23 +94,23 @@ def plot_lines(database, imgname, sources):
 
     # Graph a line for each source in sources
     for i in range(0, len(graph_info[1])):
-        ax.plot(years, graph_info[1][i], color=colors[color],
+        ax.plot(positions, graph_info[1][i], color=colors[color],
                 label=graph_info[2][i], linewidth=4)
 
         # Choose different colors and styles for lines
         color += 1
-        if color > len(colors):
+        if color >= len(colors):
             color = 0
 
             # Choose a different style for the next line
             style += 1
-            if style > len(styles):
+            if style >= len(styles):
                 # Reset to the initial color and style
                 style = 0
 
     # Set up the labels on the graph
-    plt.title("Number of references made to sources by year")
-    plt.xlabel("Year")
+    plt.title("Number of references made to sources by %s" % period)
+    plt.xlabel(period.capitalize())
     plt.ylabel("Number of times referenced by articles")
 
     # Set up the legend of the graph
@@ -143,7 +119,7 @@ def plot_lines(database, imgname, sources):
         l.set_linewidth(10)
 
     # Set up the labels on the x-axis
-    ax.xaxis.set_major_formatter(mdates.ticker.FormatStrFormatter('%d'))
+    set_period_labels(ax, period, graph_info[0])
 
     # Save the image and output it into the file
     fig.savefig(imgname, dpi=100)
@@ -151,11 +127,21 @@ def plot_lines(database, imgname, sources):
     plt.close()
 
 
-def get_references_to_source(database, s_id):
-    """(Database, int) -> dict
+def set_period_labels(ax, period, periods):
+    """(Axes, str, [int]) -> None
+    Labels the positions on the x-axis of a graph with the periods they show.
+    """
+    ax.set_xticks(range(len(periods)))
+    ax.set_xticklabels([period_label(period, number) for number in periods],
+                       rotation=45 if period != 'year' else 0)
+
+
+def get_references_to_source(database, s_id, period='year'):
+    """(Database, int, str) -> dict
     Given a source, return a dictionary that contains the information:
     url -> s_id.url
-    references -> {YEAR -> Number of references}
+    references -> {PERIOD -> Number of references}
+    The period is year, month, week or day (see Database.get_reference_counts).
     """
 
     # Get the source and get the references made to the source
@@ -167,35 +153,26 @@ def get_references_to_source(database, s_id):
     info = {"name": source.url}
     
 
-    # Get the references to the source per year
-    references = {}
-    for ref in database.get_references(None, s_id).all():
-        print ref
-        # Update the number of refs made at the year the article was made
-        article = database.get_by_id(Article, ref.child_id)
-        if article.date:
-            year = datetime.strptime(article.date, '%Y-%m-%d').year
-            print year
-            try:
-                references[year] += 1
-            except KeyError:
-                references[year] = 1
+    # Get the references to the source per period, from the counts the
+    # database keeps.
+    references = database.get_reference_counts(s_id, period)
 
     info["references"] = references
     
     return info
 
 
-def get_graph_information(database, sources):
-    """(Database, sources) -> tuple([str], [str], [str])
-    Return the years that references are made to specified sources and the
-    number of references made to each source in each year.
+def get_graph_information(database, sources, period='year'):
+    """(Database, sources, str) -> tuple([int], [[int]], [str])
+    Return the periods (years by default) that references are made to
+    specified sources and the number of references made to each source in
+    each period.
     """
     source_information = []
 
     # Get all of the information related to each source in sources:
     for s_id in sources:
-        info = get_references_to_source(database, s_id)
+        info = get_references_to_source(database, s_id, period)
         if info is not None:
             source_information.append(info)
 
@@ -232,6 +209,21 @@ def get_graph_information(database, sources):
 
     return years, graphs, names
 
+
+def period_label(period, number):
+    """(str, int) -> str
+    Returns the label for the axis of a graph of the given period, numbered
+    as by Database.get_reference_counts.
+    """
+    if period == 'month':
+        return '%d-%02d' % (number / 100, number % 100)
+    elif period == 'week':
+        return '%d-W%02d' % (number / 100, number % 100)
+    elif period == 'day':
+        return '%d-%02d-%02d' % (number / 10000, number / 100 % 100,
+                                 number % 100)
+    return '%d' % number
+
 if __name__ == '__main__':
     db = Database("testvisual.db")
     db.create_tables()
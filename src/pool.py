@@ -0,0 +1,240 @@
+import re
+import sqlite3
+import threading
+import time
+
+
+# (list of (str, object))
+# The pragmas every connection is configured with, in the order they are
+# applied. The busy timeout comes first, so that switching the journal mode
+# waits for other connections instead of failing.
+DEFAULT_PRAGMAS = [
+    # Milliseconds to wait for a lock held by another connection.
+    ('busy_timeout', 5000),
+
+    # Write-ahead logging lets readers keep reading while a writer commits.
+    ('journal_mode', 'WAL'),
+
+    # In WAL mode, NORMAL only syncs at checkpoints. A power loss can lose
+    # the last commits, but can't corrupt the database.
+    ('synchronous', 'NORMAL'),
+
+    # The page cache size. Negative values are in KiB (16 MiB).
+    ('cache_size', -16000),
+
+    # Bytes of the database file to memory map (256 MiB).
+    ('mmap_size', 268435456),
+
+    # Keep temporary tables and indexes (used for sorting) in memory.
+    ('temp_store', 'MEMORY'),
+]
+
+# Pragma names and values are formatted into the pragma statement, so they
+# must be plain words or numbers.
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE = re.compile(r'^(-?[0-9]+|[A-Za-z_]+)$')
+
+
+class PoolTimeout(Exception):
+    """Raised when a connection could not be checked out of a connection
+    pool before the pool's timeout expired.
+    """
+    pass
+
+
+def pragma_profile(pragmas=None):
+    """(dict) -> [(str, object)]
+    Returns the list of pragmas to configure connections with: the default
+    pragmas, overridden or extended by the given dict of pragma values.
+    Raises ValueError for names or values that aren't valid pragmas.
+    """
+    pragmas = dict(pragmas or {})
+
+    # Keep the order of the defaults, and apply any extra pragmas after.
+    profile = []
+    for name, value in DEFAULT_PRAGMAS:
+        profile.append((name, pragmas.pop(name, value)))
+    profile += sorted(pragmas.items())
+
+    for name, value in profile:
+        if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(str(value)):
+            raise ValueError("Invalid pragma: %s = %s" % (name, value))
+
+    return profile
+
+
+def connect(path, check_same_thread=True, pragmas=None):
+    """(str, Bool, dict) -> sqlite3.Connection
+    Opens a connection to the database at the given path, and configures it
+    the way the application expects, using the pragma profile for the given
+    pragmas (see pragma_profile). If check_same_thread is False, the
+    connection may be handed between threads (but must only be used by one
+    thread at a time).
+    """
+    connection = sqlite3.connect(path, check_same_thread=check_same_thread)
+
+    # Transactions are managed explicitly by the database (see
+    # Database.batch), so turn off the implicit transactions of the sqlite3
+    # module. Statements outside of a transaction commit immediately.
+    connection.isolation_level = None
+
+    # Enable foreign key support, since it is not on by default in SQLite3.
+    connection.execute("PRAGMA foreign_keys = ON")
+
+    # Apply the journal mode, cache and locking settings.
+    for name, value in pragma_profile(pragmas):
+        connection.execute("PRAGMA %s = %s" % (name, value))
+
+    return connection
+
+
+class ConnectionPool():
+    """A bounded pool of open, configured SQLite connections to a single
+    database file. Connections are checked out with acquire, and handed back
+    with release, so that callers (such as Flask requests) don't pay for
+    opening and configuring a connection every time.
+
+    Connections are opened lazily, up to the size of the pool. When every
+    connection is checked out, acquire waits for one to be released. A
+    connection is only ever used by one thread at a time, but may be used by
+    different threads over its lifetime.
+
+    Since every connection to ':memory:' is a different database, pools are
+    only useful for databases stored in files.
+    """
+
+    def __init__(self, path, size=5, timeout=30.0, pragmas=None):
+        """(ConnectionPool, str, int, float, dict) -> None
+        Creates a pool of at most size connections to the database at the
+        given path, configured with the given pragmas. Checkouts wait at most
+        timeout seconds for a connection.
+        """
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas
+
+        # Check the pragmas now, instead of on the first checkout.
+        pragma_profile(pragmas)
+
+        # Connections that are open, but not checked out.
+        self.idle = []
+
+        # The condition guards every member below, and is notified whenever
+        # a connection is released.
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Pool counters.
+        self.opened = 0
+        self.checkouts = 0
+        self.waits = 0
+
+    def acquire(self):
+        """(ConnectionPool) -> sqlite3.Connection
+        Checks out a connection from the pool. Reuses an idle connection if
+        one is available, opens a new one if the pool isn't full, and waits
+        for a connection to be released otherwise. Raises PoolTimeout if no
+        connection became available in time.
+        """
+        with self.condition:
+            waited = False
+            deadline = time.time() + self.timeout
+
+            while not self.idle and self.opened >= self.size:
+                if self.closed:
+                    raise PoolTimeout("The connection pool is closed.")
+
+                # Every connection is checked out, so wait for a release.
+                if not waited:
+                    waited = True
+                    self.waits += 1
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout("Timed out waiting for a database "
+                                      "connection.")
+                self.condition.wait(remaining)
+
+            if self.closed:
+                raise PoolTimeout("The connection pool is closed.")
+
+            self.checkouts += 1
+            if self.idle:
+                # Reuse the most recently released connection.
+                return self.idle.pop()
+
+            # Reserve the slot before connecting, so other threads can't
+            # overfill the pool while the connection is opened.
+            self.opened += 1
+
+        try:
+            return connect(self.path, check_same_thread=False,
+                           pragmas=self.pragmas)
+        except Exception:
+            # Give the reserved slot back.
+            with self.condition:
+                self.opened -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, connection):
+        """(ConnectionPool, sqlite3.Connection) -> None
+        Returns a checked out connection to the pool. Any transaction left
+        open on the connection is rolled back first.
+        """
+        try:
+            connection.rollback()
+        except sqlite3.Error:
+            # The connection is unusable, so drop it instead of reusing it.
+            self._discard(connection)
+            return
+
+        with self.condition:
+            if self.closed:
+                self.opened -= 1
+                connection.close()
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def close(self):
+        """(ConnectionPool) -> None
+        Closes every idle connection in the pool. Connections that are
+        checked out are closed as they are released.
+        """
+        with self.condition:
+            self.closed = True
+            for connection in self.idle:
+                connection.close()
+            self.opened -= len(self.idle)
+            self.idle = []
+            self.condition.notify_all()
+
+    def stats(self):
+        """(ConnectionPool) -> dict
+        Returns the pool counters: the number of connections that are open,
+        idle and checked out, the total number of checkouts, and how many of
+        those checkouts had to wait for a connection.
+        """
+        with self.condition:
+            return {'size': self.size,
+                    'open': self.opened,
+                    'idle': len(self.idle),
+                    'in_use': self.opened - len(self.idle),
+                    'checkouts': self.checkouts,
+                    'waits': self.waits}
+
+    def _discard(self, connection):
+        """(ConnectionPool, sqlite3.Connection) -> None
+        Private function that closes a broken connection and frees its slot
+        in the pool.
+        """
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
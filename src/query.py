@@ -1,3 +1,37 @@
+from cache import LRUCache
+from model import row_mapper
+import base64
+import json
+
+
+# The row counts of recent queries, keyed by the database (see
+# database.Database.key) and the query, along with the write generation of
+# the database they were counted at (see database.write_generation).
+counts = LRUCache(1024)
+
+
+def encode_token(by, asc, values):
+    """(str, Bool, list) -> str
+    Returns an opaque continuation token for a keyset page, holding the
+    ordering it was made for and the values of the row to continue from.
+    """
+    return base64.urlsafe_b64encode(json.dumps([by, asc] + list(values)))
+
+
+def decode_token(token, by, asc):
+    """(str, str, Bool) -> list
+    Returns the row values stored in a continuation token made by
+    encode_token. Raises ValueError if the token is malformed, or was made
+    for a different ordering.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(token)))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid page token.")
+
+    if not isinstance(values, list) or values[:2] != [by, asc]:
+        raise ValueError("Invalid page token.")
+    return values[2:]
 
 
 class Query():
@@ -36,6 +70,23 @@ class Query():
              self._order(by, asc)),
             self.params)
 
+    def iter(self, batch_size=500, by='', asc=True):
+        """(Query, int, str, Bool) -> generator
+        Returns a generator of the objects in the database that match the
+        query, like all, but reads them from the database batch_size at a
+        time instead of all at once. Use it to go through queries that may
+        match too many rows to hold in memory.
+        """
+        return self.database.stream(
+            self.model,
+            'SELECT %s FROM %s %s %s' %
+            (self.model.db_labels,
+             self.model.db_from,
+             self.query,
+             self._order(by, asc)),
+            self.params,
+            batch_size)
+
     def count(self):
         """(Query) -> int
         Returns the number of rows in the query.
@@ -46,7 +97,7 @@ class Query():
         result = self.database.query(
             self.model,
             'SELECT count(*) as c FROM %s %s' %
-            (self.model.db_table, self.query),
+            (self.model.db_from, self.query),
             self.params,
             convert=False)
 
@@ -56,6 +107,18 @@ class Query():
             # Invalid queries produce no results.
             return 0
 
+    def exists(self):
+        """(Query) -> Bool
+        Returns True if any object in the database matches the query. Only
+        checks for the first matching row, without reading its labels.
+        """
+        result = self.database.query(
+            self.model,
+            'SELECT 1 FROM %s %s LIMIT 1' % (self.model.db_from, self.query),
+            self.params,
+            convert=False)
+        return bool(result)
+
     def first(self):
         """(Query) -> dict
         Returns the dictionary for the first object in the database that
@@ -98,4 +161,147 @@ class Query():
              self._order(by, asc),
              length,
              offset),
-            self.params)
\ No newline at end of file
+            self.params)
+
+    def _cached_count(self):
+        """(Query) -> int
+        Private function that returns the number of rows in the query,
+        reusing the last count if the database hasn't been written to since.
+        """
+        key = self._count_key()
+        generation = self.database.generation()
+        cached = counts.get(key)
+        if cached and cached[0] == generation:
+            return cached[1]
+
+        total = self.count()
+        counts.put(key, (generation, total))
+        return total
+
+    def _count_key(self):
+        """(Query) -> tuple
+        Private function that returns the key of the query in the cache of
+        counts.
+        """
+        return (self.database.key(), self.model.db_from, self.query,
+                self.params)
+
+    def keyset(self, length=10, by='', asc=True, after=None, before=None,
+               offset=0):
+        """(Query, int, str, Bool, str, str, int) -> ([Model], str, str)
+        Returns a page of the objects that match the query, ordered by the
+        given field and then by id, along with the continuation tokens for
+        the previous and next pages (None if there is no such page). The
+        page starts after the row of the after token, or ends before the row
+        of the before token. With neither token, the page starts offset rows
+        into the query.
+
+        Unlike subset, continuing from a token seeks straight to the row
+        instead of scanning every row before it, so deep pages are as fast
+        as the first one. The field ordered by must not be NULL.
+        """
+        rows, _, previous, next = self._page(length, by, asc, after, before,
+                                             offset, count=False)
+        return rows, previous, next
+
+    def page(self, length=10, by='', asc=True, after=None, before=None,
+             offset=0):
+        """(Query, int, str, Bool, str, str, int) -> ([Model], int, str, str)
+        Returns a page of the objects that match the query like keyset, along
+        with the total number of rows in the query.
+
+        Pages at an offset are counted in the same statement that reads
+        them. Pages continuing from a token reuse
+        the count of an earlier page of the same query, as long as the
+        database hasn't been written to since.
+        """
+        return self._page(length, by, asc, after, before, offset, count=True)
+
+    def _page(self, length, by, asc, after, before, offset, count):
+        """(Query, int, str, Bool, str, str, int, Bool) ->
+            ([Model], int, str, str)
+        Private function that returns a page of the objects that match the
+        query, the total number of rows in the query (None if count is
+        False), and the previous and next page tokens. See keyset and page.
+        """
+        # Order by the field (if given), and by id to break ties.
+        keys = [by, 'id'] if by else ['id']
+        forward = before is None
+        dir = 'ASC' if asc == forward else 'DESC'
+        filters = []
+        params = self.params
+
+        # Continue from the row in the token, comparing the keys in order.
+        token = after if forward else before
+        if token is not None:
+            values = decode_token(token, by, asc)
+            if len(values) != len(keys):
+                raise ValueError("Invalid page token.")
+
+            op = '>' if dir == 'ASC' else '<'
+            if by:
+                # The first comparison is a range the index on the field can
+                # seek to, and the second skips the rows already seen.
+                filters.append('%s %s= ? AND (%s %s ? OR id %s ?)' %
+                               (by, op, by, op, op))
+                params += (values[0], values[0], values[1])
+            else:
+                filters.append('id %s ?' % op)
+                params += (values[0], )
+            offset = 0
+
+        # Count the rows in the same statement as the page, unless a token
+        # was given. The count is a subquery that is only run once, so it
+        # can use its own index rather than reading every labelled row (as
+        # a count(*) OVER () window would).
+        inline = count and not filters
+        generation = self.database.generation()
+        if inline:
+            params = self.params + params
+
+        # Wrap the query, so the keys can be compared by their labels. The
+        # extra row tells whether there is a page past this one.
+        columns, rows = self.database.select(
+            'SELECT *%s FROM (SELECT %s FROM %s %s) AS page %s '
+            'ORDER BY %s LIMIT %d OFFSET %d' %
+            (', (SELECT count(*) FROM %s %s) AS page_total' %
+             (self.model.db_from, self.query) if inline else '',
+             self.model.db_labels,
+             self.model.db_from,
+             self.query,
+             'WHERE ' + ' AND '.join(filters) if filters else '',
+             ', '.join(['%s %s' % (key, dir) for key in keys]),
+             length + 1,
+             offset),
+            params)
+
+        more = len(rows) > length
+        rows = rows[:length]
+
+        # Find the total, which the objects don't have a member for.
+        total = None
+        if inline and rows:
+            total = rows[0][columns.index('page_total')]
+            counts.put(self._count_key(), (generation, total))
+        elif count:
+            total = self._cached_count()
+        rows = map(row_mapper(self.model, columns), rows)
+
+        def token_for(row):
+            """(Model) -> str
+            Returns the continuation token for the given row.
+            """
+            return encode_token(by, asc, [getattr(row, key) for key in keys])
+
+        if not rows:
+            return rows, total, None, None
+        elif forward:
+            # There is a previous page if the page didn't start at the top.
+            previous = token_for(rows[0]) if token or offset else None
+            return rows, total, previous, \
+                token_for(rows[-1]) if more else None
+        else:
+            # The rows were read backwards, so put them back in order.
+            rows.reverse()
+            return rows, total, token_for(rows[0]) if more else None, \
+                token_for(rows[-1])
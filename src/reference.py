@@ -13,6 +13,10 @@ class Reference(Model):
               "LEFT JOIN article ON ref.parent_id = article.id "
     
     db_fields = "id, child_id, source_id, parent_id"
+    db_unique = "child_id, parent_id"
+
+    __slots__ = ('id', 'child_id', 'source_id', 'parent_id', 'parent_title',
+                 'parent_url', 'source_url', 'reference')
     
     db_labels = "ref.id as id, ref.child_id as child_id, " \
                 "ref.source_id as source_id, ref.parent_id as parent_id, " \
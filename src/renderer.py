@@ -0,0 +1,257 @@
+from collections import OrderedDict
+import multiprocessing
+import Queue
+import threading
+import time
+import uuid
+
+# The states of a render job.
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed out'
+
+# The states a job doesn't leave.
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+
+class RenderQueueFull(Exception):
+    """Raised when a render job is submitted while the queue of a render
+    service is full.
+    """
+    pass
+
+
+class RenderStopped(Exception):
+    """Raised inside a render service when a render is stopped before it
+    finishes, because it was cancelled or took too long. The state is the
+    state of the job.
+    """
+
+    def __init__(self, state):
+        """(RenderStopped, str) -> None
+        Creates the exception for a job stopped in the given state.
+        """
+        Exception.__init__(self, "Render %s." % state)
+        self.state = state
+
+
+class RenderJob():
+    """A visualization waiting to be rendered, being rendered, or rendered
+    by a render service. The image is made by calling function with a
+    database, the path to write the image to, and args.
+    """
+
+    def __init__(self, name, key, function, args=()):
+        """(RenderJob, str, object, function, tuple) -> None
+        Creates a queued job for an image of the given name and cache key.
+        """
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.function = function
+        self.args = args
+        self.state = QUEUED
+        self.filename = None
+        self.error = None
+        self.created = time.time()
+
+        # Set to stop the job.
+        self.cancelled = threading.Event()
+
+    def to_dict(self):
+        """(RenderJob) -> dict
+        Returns the state of the job, for responses to the user interface.
+        """
+        return {'job': self.id,
+                'state': self.state,
+                'filename': self.filename,
+                'error': self.error}
+
+
+def render_process(database, function, args, path, connection):
+    """(function, function, tuple, str, multiprocessing.Connection) -> None
+    Renders an image in a process of its own, so that the global state of
+    pyplot is never shared with another render. Opens a database with the
+    database function, and sends None through the connection if the image
+    was rendered, or the error message if it wasn't.
+    """
+    # Every render starts from an empty Agg canvas.
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.close('all')
+
+    try:
+        db = database()
+        try:
+            function(db, path, *args)
+        finally:
+            db.close()
+        connection.send(None)
+    except Exception as e:
+        connection.send(str(e) or e.__class__.__name__)
+    finally:
+        connection.close()
+
+
+class RenderService():
+    """Renders visualizations off the request threads. Jobs are queued, and
+    rendered by a fixed number of workers, each in a new process, into a
+    render cache (see cache.RenderCache). Each job can be polled for its
+    state, cancelled, and is stopped if it takes longer than the timeout.
+    """
+
+    def __init__(self, cache, database, workers=2, queue_size=16,
+                 timeout=60, history=256):
+        """(RenderService, RenderCache, function, int, int, float, int)
+            -> None
+        Creates a render service that renders into the given cache, with
+        databases opened by calling database. At most queue_size jobs wait
+        for a worker, and the states of the last history finished jobs are
+        kept for polling.
+        """
+        self.cache = cache
+        self.database = database
+        self.timeout = timeout
+        self.history = history
+        self.queue = Queue.Queue(queue_size)
+
+        # The jobs by id, oldest first. The lock guards the jobs.
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, name, key, function, args=()):
+        """(RenderService, str, object, function, tuple) -> RenderJob
+        Returns the job rendering the image for the given name and key. The
+        job is already done if the image is cached, and is the job already
+        rendering the image if there is one. Otherwise a new job is queued.
+        Raises RenderQueueFull if too many jobs are waiting.
+        """
+        job = RenderJob(name, key, function, args)
+        filename = self.cache.find(name, key)
+        if filename:
+            job.state = DONE
+            job.filename = filename
+            self._keep(job)
+            return job
+
+        with self.lock:
+            # Share the job of an earlier request for the same image.
+            for other in self.jobs.values():
+                if other.name == name and other.key == key and \
+                        other.state in (QUEUED, RUNNING):
+                    return other
+
+            try:
+                self.queue.put_nowait(job)
+            except Queue.Full:
+                raise RenderQueueFull("Too many visualizations are being "
+                                      "generated. Try again later.")
+            self.jobs[job.id] = job
+        return job
+
+    def job(self, id):
+        """(RenderService, str) -> RenderJob
+        Returns the job with the given id, or None if there is no such job
+        (or it finished too long ago).
+        """
+        with self.lock:
+            return self.jobs.get(id)
+
+    def cancel(self, id):
+        """(RenderService, str) -> Bool
+        Cancels the job with the given id: a queued job is never rendered,
+        and the process of a running job is stopped. Returns True if the job
+        was cancelled, or False if it had already finished.
+        """
+        with self.lock:
+            job = self.jobs.get(id)
+            if job is None or job.state in FINISHED:
+                return False
+            job.cancelled.set()
+            if job.state == QUEUED:
+                job.state = CANCELLED
+            return True
+
+    def _keep(self, job):
+        """(RenderService, RenderJob) -> None
+        Private function that keeps a job for polling, forgetting the oldest
+        finished jobs beyond the history.
+        """
+        with self.lock:
+            self.jobs[job.id] = job
+            finished = [id for id, other in self.jobs.items()
+                        if other.state in FINISHED]
+            for id in finished[:max(len(finished) - self.history, 0)]:
+                del self.jobs[id]
+
+    def _work(self):
+        """(RenderService) -> None
+        Private function that renders queued jobs, forever.
+        """
+        while True:
+            job = self.queue.get()
+            with self.lock:
+                if job.cancelled.is_set():
+                    continue
+                job.state = RUNNING
+
+            try:
+                job.filename = self.cache.get(
+                    job.name, job.key, lambda path: self._render(job, path))
+                job.state = DONE
+            except RenderStopped as e:
+                job.state = e.state
+            except Exception as e:
+                job.error = str(e)
+                job.state = FAILED
+            self._keep(job)
+
+    def _render(self, job, path):
+        """(RenderService, RenderJob, str) -> None
+        Private function that renders the image of a job to the path, in a
+        new process. Stops the process if the job is cancelled or runs out
+        of time. Raises RenderStopped if the process was stopped, or
+        RuntimeError if the render failed.
+        """
+        receiver, sender = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(
+            target=render_process,
+            args=(self.database, job.function, job.args, path, sender))
+        process.daemon = True
+        process.start()
+        sender.close()
+
+        # Wait for the process, checking whether it should be stopped.
+        end = time.time() + self.timeout
+        state = None
+        while process.is_alive():
+            if job.cancelled.is_set():
+                state = CANCELLED
+            elif time.time() > end:
+                state = TIMED_OUT
+            if state:
+                process.terminate()
+                process.join()
+                raise RenderStopped(state)
+            process.join(0.05)
+
+        # The process sends the error message, if there was one.
+        try:
+            error = receiver.recv() if receiver.poll() else "Render crashed."
+        except EOFError:
+            error = "Render crashed."
+        finally:
+            receiver.close()
+        if error is not None:
+            raise RuntimeError(error)
@@ -3,7 +3,7 @@ import json
 
 
 class ClassEncoder(json.JSONEncoder):
-    """A custom JSON encoder that defaults to using the __dict__ method for
+    """A custom JSON encoder that defaults to using the to_dict method for
     database Model classes and subclasses. This allows for automatic
     conversion to JSON.
     """
@@ -13,7 +13,7 @@ class ClassEncoder(json.JSONEncoder):
         default serializable object otherwise.
         """
         if isinstance(o, Model):
-            return o.__dict__
+            return o.to_dict()
         return json.JSONEncoder.default(self, o)
 
 
@@ -1,5 +1,5 @@
 import feedparser
-import requests
+import fetcher
 import datetime
 import time
 import os
@@ -10,7 +10,7 @@ from database import Database
 from article import Article
 from keywords import Keyword
 from reference import Reference
-from web import crawl_url
+from web import crawl_url, CrawlEngine
 
 
 def rss_feed(rss_url):    
@@ -21,8 +21,24 @@ def rss_feed(rss_url):
    (key: value)<->(aticle_link: publish_date in isotime format).
     """
     try:
-        # Use feedparser to analyze given RSS feed, if it is valid RSS.
-        d = feedparser.parse(rss_url)
+        # Fetch the feed with the crawlers' shared connections.
+        response = fetcher.get(rss_url)
+    except:
+        return (0, {})
+    return read_feed(response)
+
+
+def read_feed(response):
+    """(Response) -> list(int, dict)
+    Find all the updated article links in a fetched RSS feed, like rss_feed.
+    """
+    try:
+        # Use feedparser to analyze given RSS feed, if it is valid RSS. The
+        # headers give the feed's location and encoding.
+        headers = dict([(name.lower(), value)
+                        for name, value in response.headers.items()])
+        headers['content-location'] = response.url
+        d = feedparser.parse(response.content, response_headers=headers)
     except:
         return "Sorry, invalid RSS feed. Please check and try again later."
     
@@ -59,24 +75,42 @@ def time_convert(timestr):
     
 
 
-def parse_rss(database, feed, depth=1):
-    """(Database, str, int) -> [Article]
+def parse_rss(database, feed, depth=1, changed=False):
+    """(Database, str, int, Bool) -> [Article]
     Get all the updated article links in the RSS feed. 
     Find the reference inside all the articles recursively(set by "level"
-    depth), and add the references into database.
+    depth), and add the references into database. If changed is True, the
+    feed is only parsed if it changed since it was last parsed that way
+    without failing articles.
 
     Return the total count of updated articles, and a dictionary with 
     (key: value)<->(aticle_link: publish_date in isotime format).
     """
     # Get the updates article count, and article urls and publish dates.
-    rss_a = rss_feed(feed)
+    response = None
+    if not changed:
+        rss_a = rss_feed(feed)
+    else:
+        try:
+            response = fetcher.shared().get_changed(database, feed,
+                                                    save=False)
+        except:
+            return []
+        if response is None:
+            return []
+        rss_a = read_feed(response)
     
-    # Get all (article urls, publish dates) pairs
-    articles = []
+    # Crawl all (article urls, publish dates) pairs together.
+    engine = CrawlEngine(database)
     pairs = rss_a[1].items()
     for url, pubdate in pairs:        
-        articles += crawl_url(database, url, date=pubdate, depth=depth)
-        
+        engine.crawl_url(url, date=pubdate, depth=depth)
+    articles = engine.run()
+
+    # Only count the feed as parsed if none of its articles failed, so that
+    # they're crawled again next time even if the feed is unchanged.
+    if response is not None and not engine.failed:
+        fetcher.shared().save_validator(database, feed, response)
     return articles
 
         
@@ -100,7 +134,7 @@ if __name__ == "__main__":
     for url, pubdate in pairs: 
         print url
         print pubdate
-        url = requests.get(url).url
+        url = fetcher.get(url).url
         print url
         
         craw_rss1 = crawl_url(db, url, 
@@ -0,0 +1,41 @@
+from article import Article
+import re
+
+
+# Words in a search, as the search index splits them.
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(text):
+    """(str) -> str
+    Returns the full text search expression that matches articles
+    containing every word of the given text, as a word or the start of one.
+    Characters that aren't part of words (such as the % wildcards of LIKE
+    filters) are ignored. Returns the empty string if there are no words.
+    """
+    # Quote each word, so words like AND or NEAR aren't taken as operators.
+    return ' '.join(['"%s"*' % word for word in WORD.findall(text)])
+
+
+class ArticleMatch(Article):
+    """An article that matched a full text search, with its relevance score
+    (lower scores are more relevant) and a snippet of the matching text
+    with the matched words highlighted.
+    """
+    db_from = "article_fts JOIN article ON article.id = article_fts.rowid " \
+              "JOIN source ON article.source_id = source.id"
+    db_labels = Article.db_labels + ", " \
+        "bm25(article_fts) AS score, " \
+        "snippet(article_fts, -1, '<mark>', '</mark>', '...', 12) AS snippet"
+
+    __slots__ = ('score', 'snippet')
+
+    def __init__(self, url='', title='', date='', author='', tags=''):
+        """(ArticleMatch, str, str, str, str, str) -> None
+        Constructs the article match with the given parameters.
+        """
+        Article.__init__(self, url, title, date, author, tags)
+
+        # Search fields.
+        self.score = None
+        self.snippet = None
@@ -21,18 +21,25 @@
 # class is used throughout.
 #
 # For the database, connections may be split across multiple threads, and the
-# sqlite3 requires that a connection stay on a single thread. Flask has
-# functionality that assists in only connecting to the database whenever
-# necessary, and we make use of that with the get_db function (and the
-# close_db function, but that does not need to be called directly).
+# sqlite3 requires that a connection is only used by one thread at a time.
+# Flask has functionality that assists in only connecting to the database
+# whenever necessary, and we make use of that with the get_db function (and
+# the close_db function, but that does not need to be called directly).
+# Connections are kept open in a connection pool between requests, so a
+# request only checks out a connection that is already configured.
 #
 from flask import Flask, render_template, request, g
 from tld import update_tld_names
 from tld.exceptions import TldDomainNotFound, TldBadUrl
 from urllib2 import unquote
 from updater import Updater
-from database import Database
+from database import Database, PERIODS
+from pool import ConnectionPool
+from cache import RenderCache
+from renderer import RenderService, RenderQueueFull, DONE, FAILED, \
+    CANCELLED, TIMED_OUT
 from article import Article
+from search import ArticleMatch
 from source import Source
 from reference import Reference
 from keywords import Keyword
@@ -42,9 +49,10 @@ from plot2d import plot_lines, plot_bars
 from networkvisual import *
 import rss
 import web
+import fetcher
 import os
-import time
 import thread
+import threading
 
 
 # Setup the Flask server, and route anything under the static folder for UI
@@ -62,24 +70,174 @@ app.config.update(dict(
     # The path to the database file.
     DATABASE='test.db',
 
+    # The maximum number of database connections kept open by the server,
+    # and the number of seconds a request waits for a free connection.
+    DATABASE_POOL_SIZE=8,
+    DATABASE_POOL_TIMEOUT=30,
+
+    # SQLite pragmas for every database connection, overriding the defaults
+    # in pool.DEFAULT_PRAGMAS. The write-ahead log lets UI requests read
+    # while the watchlist update is writing.
+    DATABASE_PRAGMAS=dict(
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        cache_size=-16000,
+        mmap_size=268435456,
+        temp_store='MEMORY',
+        busy_timeout=5000),
+
+    # How many times a statement is retried while the database is locked,
+    # and the seconds to wait before the first retry (doubling after each).
+    DATABASE_BUSY_RETRIES=3,
+    DATABASE_BUSY_DELAY=0.1,
+
+    # The most visualization images kept in static/img, and the seconds an
+    # image is kept after it was last requested.
+    RENDER_CACHE_SIZE=256,
+    RENDER_CACHE_AGE=24 * 60 * 60,
+
+    # The number of visualizations rendered at once (each in a process of
+    # its own), the most waiting to be rendered, and the seconds a render
+    # may take before it is stopped.
+    RENDER_WORKERS=2,
+    RENDER_QUEUE_SIZE=16,
+    RENDER_TIMEOUT=60,
+
     # Debug mode enables automatic source reloading.
     DEBUG=True
 ))
 app.config.from_envvar('FLASK_SETTINGS', silent=True)
 
 
+# The connection pool shared by every request, and the service rendering
+# visualizations, created on first use.
+pool = None
+pool_lock = threading.Lock()
+renderer = None
+
+
+def get_pool():
+    """(None) -> ConnectionPool
+    Returns the database connection pool, creating it if it doesn't exist."""
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ConnectionPool(app.config['DATABASE'],
+                                  app.config['DATABASE_POOL_SIZE'],
+                                  app.config['DATABASE_POOL_TIMEOUT'],
+                                  app.config['DATABASE_PRAGMAS'])
+        return pool
+
+
+def get_renderer():
+    """(None) -> RenderService
+    Returns the service rendering visualizations, and the cache of rendered
+    visualizations it renders into, creating them if they don't exist."""
+    global renderer
+    with pool_lock:
+        if renderer is None:
+            renderer = RenderService(
+                RenderCache(os.path.join("static", "img"),
+                            app.config['RENDER_CACHE_SIZE'],
+                            app.config['RENDER_CACHE_AGE']),
+                render_db,
+                app.config['RENDER_WORKERS'],
+                app.config['RENDER_QUEUE_SIZE'],
+                app.config['RENDER_TIMEOUT'])
+        return renderer
+
+
+def render_db():
+    """(None) -> Database
+    Opens a database connection for a visualization being rendered. Renders
+    run in processes of their own, so they can't use the connection pool."""
+    return Database(app.config['DATABASE'],
+                    pragmas=app.config['DATABASE_PRAGMAS'],
+                    busy_retries=app.config['DATABASE_BUSY_RETRIES'],
+                    busy_delay=app.config['DATABASE_BUSY_DELAY'])
+
+
 def get_db():
     """(None) -> Database
-    Opens a new database connection if one is not already open."""
+    Checks out a database connection if one is not already checked out."""
     if not hasattr(g, 'db'):
-        g.db = Database(app.config['DATABASE'])
+        g.db = Database(app.config['DATABASE'], pool=get_pool(),
+                        busy_retries=app.config['DATABASE_BUSY_RETRIES'],
+                        busy_delay=app.config['DATABASE_BUSY_DELAY'])
     return g.db
 
 
+def get_page(query, by='', asc=True):
+    """(Query, str, Bool) -> Response
+    Returns the response for a page of a query, ordered by the given field.
+    Pages are requested with the length and offset parameters, or with the
+    after and before continuation tokens of a previous response, which are
+    given as the next and previous parameters of the response."""
+    try:
+        rows, total, previous, next = query.page(
+            request.args.get('length', 10, type=int), by, asc,
+            after=request.args.get('after', None),
+            before=request.args.get('before', None),
+            offset=request.args.get('offset', 0, type=int))
+    except ValueError as e:
+        return Response(result=False, msg=str(e))
+
+    # Give the rows, the filtered count and the tokens to the user
+    # interface.
+    return Response(result=True,
+                    data=rows,
+                    params={'total': total,
+                            'previous': previous,
+                            'next': next})
+
+
+def get_render(name, params, function, args):
+    """(str, tuple, function, tuple) -> Response
+    Returns the response for a visualization image, rendered off the request
+    by calling function with a database, the path to write the image to, and
+    args. Images are cached by name and params until the visualized data
+    changes (see Database.change_count), so repeated requests reuse the image
+    instead of rendering it again, even across restarts.
+    If the image isn't ready yet, the response has the id of the job
+    rendering it, to poll with /viz/job."""
+    db = get_db()
+    try:
+        job = get_renderer().submit(name, (name, params, db.change_count()),
+                                    function, args)
+    except RenderQueueFull as e:
+        return Response(result=False, msg=str(e))
+
+    return get_job_response(job)
+
+
+def get_job_response(job):
+    """(RenderJob) -> Response
+    Returns the response for the state of a visualization render job."""
+    data = job.to_dict()
+    if job.state == DONE:
+        data['filename'] = '/img/%s' % job.filename
+        return Response(result=True, data=data,
+                        msg="Visualization generated.")
+    elif job.state == CANCELLED:
+        return Response(result=False, data=data,
+                        msg="Visualization cancelled.")
+    elif job.state == TIMED_OUT:
+        return Response(result=False, data=data,
+                        msg="The visualization took too long to generate.")
+    elif job.state == FAILED:
+        print job.error
+        return Response(result=False, data=data,
+                        msg="An error occurred while generating the "
+                        "visualization. Try again.")
+    return Response(result=True, data=data,
+                    msg="Visualization is being generated.")
+
+
 @app.teardown_appcontext
 def close_db(_):
     """(Exception) -> None
-    Closes the database at the end of a Flask request."""
+    Returns the database connection to the pool at the end of a Flask
+    request."""
     if hasattr(g, 'db'):
         g.db.close()
 
@@ -237,23 +395,17 @@ def db_get_articles():
         title=request.args.get('title', u'', type=unicode),
         author=request.args.get('author', u'', type=unicode),
         tags=request.args.get('tags', u'', type=unicode),
+        all_tags=request.args.get('all_tags', 0, type=int) == 1,
         date_start=request.args.get('date_start', u'', type=unicode),
         date_end=request.args.get('date_end', u'', type=unicode),
-        query=request.args.get('query', u'', type=unicode))
+        query=request.args.get('query', u'', type=unicode),
+        ranked=True)
 
-    # Get the total number of articles in the filtered query.
-    total = query.count()
-
-    # Get the articles from the query, ordering by date descending.
-    articles = query.subset(request.args.get('offset', 0, type=int),
-                            request.args.get('length', 10, type=int),
-                            by='date',
-                            asc=False)
-
-    # Give the articles, and the filtered count to the user interface.
-    return Response(result=True,
-                    data=articles,
-                    params={'total': total}).to_json()
+    # Get a page of the articles, ordering search results by relevance, and
+    # other articles by date descending.
+    if query.model is ArticleMatch:
+        return get_page(query, by='score').to_json()
+    return get_page(query, by='date', asc=False).to_json()
 
 
 @app.route('/db/get_keywords')
@@ -266,17 +418,8 @@ def db_get_keywords():
     query = db.get_keywords(
         request.args.get('source_id', None, type=int))
 
-    # Get the total number of keywords in the filtered query.
-    total = query.count()
-
-    # Get the keywords from the query.
-    keywords = query.subset(request.args.get('offset', 0, type=int),
-                            request.args.get('length', 10, type=int))
-
-    # Give the keywords, and the filtered count to the user interface.
-    return Response(result=True,
-                    data=keywords,
-                    params={'total': total}).to_json()
+    # Get a page of the keywords.
+    return get_page(query).to_json()
 
 
 @app.route('/db/get_references')
@@ -289,18 +432,8 @@ def db_get_references():
     query = db.get_references(
         child_id=request.args.get('child_id', -1, type=int))
 
-    # Get the total number of references in the filtered query.
-    total = query.count()
-
-    # Get the references from the query.
-    references = query.subset(request.args.get('offset', 0, type=int),
-                              request.args.get('length', 10, type=int),
-                              by='reference')
-
-    # Give the references, and the filtered count to the user interface.
-    return Response(result=True,
-                    data=references,
-                    params={'total': total}).to_json()
+    # Get a page of the references, ordering by the reference.
+    return get_page(query, by='reference').to_json()
 
 
 @app.route('/db/get_source')
@@ -325,18 +458,21 @@ def db_get_sources():
     db = get_db()
     query = db.get_sources(request.args.get('url', u'', type=unicode))
 
-    # Get the total number of sources in the filtered query.
-    total = query.count()
+    # Get a page of the sources, ordering by URL.
+    return get_page(query, by='url').to_json()
 
-    # Get the sources from the query.
-    sources = query.subset(request.args.get('offset', 0, type=int),
-                           request.args.get('length', 10, type=int),
-                           by='url')
 
-    # Give the sources, and the filtered count to the user interface.
-    return Response(result=True,
-                    data=sources,
-                    params={'total': total}).to_json()
+@app.route('/db/get_tags')
+def db_get_tags():
+    """(None) -> str
+    Gets the tags that match the given query, with their article counts.
+    """
+    # Get the tags query for the given parameters.
+    db = get_db()
+    query = db.get_tags(request.args.get('tag', u'', type=unicode))
+
+    # Get a page of the tags, ordering the most used tags first.
+    return get_page(query, by='count', asc=False).to_json()
 
 
 @app.route('/db/get_watches')
@@ -348,18 +484,8 @@ def db_get_watches():
     db = get_db()
     query = db.get_watches(request.args.get('url', u'', type=unicode))
 
-    # Get the total number of sources in the filtered query.
-    total = query.count()
-
-    # Get the sources from the query.
-    watches = query.subset(request.args.get('offset', 0, type=int),
-                           request.args.get('length', 10, type=int),
-                           by='url')
-
-    # Give the watches, and the filtered count to the user interface.
-    return Response(result=True,
-                    data=watches,
-                    params={'total': total}).to_json()
+    # Get a page of the watches, ordering by URL.
+    return get_page(query, by='url').to_json()
 
 
 @app.route('/db/modify_article')
@@ -438,6 +564,26 @@ def db_modify_source():
                         msg="Source URL was not valid.").to_json()
 
 
+@app.route('/db/stats')
+def db_stats():
+    """(None) -> str
+    Gets the counters for the database connection pool.
+    """
+    return Response(result=True, data={'pool': get_pool().stats()}).to_json()
+
+
+@app.route('/web/stats')
+def web_stats():
+    """(None) -> str
+    Gets the counters for the connections the crawlers fetch pages with,
+    and for the filter of the URLs they crawled.
+    """
+    seen = web.seen_urls(get_db())
+    return Response(result=True,
+                    data={'fetcher': fetcher.shared().stats(),
+                          'seen': seen.stats() if seen else None}).to_json()
+
+
 @app.route('/db/toggle_watch')
 def db_toggle_watch():
     """(None) -> str
@@ -482,22 +628,10 @@ def viz_draw_ref_in_article():
         return Response(result=False,
                         msg="No article given.").to_json()
 
-    # Generate the graph.
-    filename = time.strftime("aref-%Y%m%d-%H%M%S.png")
-    path = os.path.join("static", "img", filename)
-    db = get_db()
-
-    try:
-        draw_references_in_article(db, path, id)
-    except Exception as e:
-        print e
-        return Response(result=False,
-                        msg="An error occurred while generating the "
-                        "visualization. Try again.").to_json()
-
-    return Response(result=True,
-                    data={'filename': '/img/%s' % filename},
-                    msg="Visualization generated.").to_json()
+    # Generate the graph, or reuse the last one made since the database
+    # changed.
+    return get_render('aref', (id, ), draw_references_in_article,
+                      (id, )).to_json()
 
 
 @app.route('/viz/draw_ref_from_source')
@@ -512,22 +646,10 @@ def viz_draw_ref_from_source():
         return Response(result=False,
                         msg="No source given.").to_json()
 
-    # Generate the graph.
-    filename = time.strftime("s-ref-from-%Y%m%d-%H%M%S.png")
-    path = os.path.join("static", "img", filename)
-    db = get_db()
-
-    try:
-        draw_references_from_source(db, path, id)
-    except Exception as e:
-        print e
-        return Response(result=False,
-                        msg="An error occurred while generating the "
-                        "visualization. Try again.").to_json()
-
-    return Response(result=True,
-                    data={'filename': '/img/%s' % filename},
-                    msg="Visualization generated.").to_json()
+    # Generate the graph, or reuse the last one made since the database
+    # changed.
+    return get_render('s-ref-from', (id, ), draw_references_from_source,
+                      (id, )).to_json()
 
 
 @app.route('/viz/draw_ref_to_source')
@@ -542,22 +664,10 @@ def viz_draw_ref_to_source():
         return Response(result=False,
                         msg="No source given.").to_json()
 
-    # Generate the graph.
-    filename = time.strftime("s-ref-to-%Y%m%d-%H%M%S.png")
-    path = os.path.join("static", "img", filename)
-    db = get_db()
-
-    try:
-        draw_references_to_source(db, path, id)
-    except Exception as e:
-        print e
-        return Response(result=False,
-                        msg="An error occurred while generating the "
-                        "visualization. Try again.").to_json()
-
-    return Response(result=True,
-                    data={'filename': '/img/%s' % filename},
-                    msg="Visualization generated.").to_json()
+    # Generate the graph, or reuse the last one made since the database
+    # changed.
+    return get_render('s-ref-to', (id, ), draw_references_to_source,
+                      (id, )).to_json()
 
 
 @app.route('/viz/plot_bar')
@@ -572,16 +682,15 @@ def viz_plot_bar():
                         msg="No sources given").to_json()
     ids = ids.split()
 
-    # Generate the line plot, and return the image.
-    filename = time.strftime("bar-%Y%m%d-%H%M%S.png")
-    path = os.path.join("static", "img", filename)
-    db = get_db()
-
-    plot_bars(db, path, ids)
+    # Get the period to count references by.
+    period = request.args.get('period', 'year', type=str)
+    if period not in PERIODS:
+        return Response(result=False,
+                        msg="Unknown period: %s" % period).to_json()
 
-    return Response(result=True,
-                    data={'filename': '/img/%s' % filename},
-                    msg="Visualization generated.").to_json()
+    # Generate the bar plot, and return the image.
+    return get_render('bar', (tuple(ids), period), plot_bars,
+                      (ids, period)).to_json()
 
 
 @app.route('/viz/plot_lines')
@@ -596,22 +705,38 @@ def viz_plot_lines():
                         msg="No sources given").to_json()
     ids = ids.split()
 
+    # Get the period to count references by.
+    period = request.args.get('period', 'year', type=str)
+    if period not in PERIODS:
+        return Response(result=False,
+                        msg="Unknown period: %s" % period).to_json()
+
     # Generate the line plot, and return the image.
-    filename = time.strftime("line-%Y%m%d-%H%M%S.png")
-    path = os.path.join("static", "img", filename)
-    db = get_db()
+    return get_render('line', (tuple(ids), period), plot_lines,
+                      (ids, period)).to_json()
 
-    try:
-        plot_lines(db, path, ids)
-    except Exception as e:
-        print e
-        return Response(result=False,
-                        msg="An error occurred while generating the "
-                        "visualization. Try again.").to_json()
 
-    return Response(result=True,
-                    data={'filename': '/img/%s' % filename},
-                    msg="Visualization generated.").to_json()
+@app.route('/viz/job')
+def viz_job():
+    """(None) -> str
+    Gets the state of a visualization render job given by id, with the image
+    once it is generated.
+    """
+    job = get_renderer().job(request.args.get('id', u'', type=unicode))
+    if job is None:
+        return Response(result=False, msg="No such visualization.").to_json()
+    return get_job_response(job).to_json()
+
+
+@app.route('/viz/cancel_job')
+def viz_cancel_job():
+    """(None) -> str
+    Cancels a visualization render job given by id.
+    """
+    if get_renderer().cancel(request.args.get('id', u'', type=unicode)):
+        return Response(result=True, msg="Visualization cancelled.").to_json()
+    return Response(result=False,
+                    msg="The visualization already finished.").to_json()
 
 
 @app.route('/web/crawl_url')
@@ -670,11 +795,26 @@ def update():
 
         # Get all watched pages from the database.
         db = get_db()
-        watches = db.get_watches().all()
 
-        print "[Watchlist] There are %d URLs in the watchlist." % len(watches)
+        # The fetcher counts everything fetched since the server started, so
+        # keep its counters to report this update's fetches.
+        start = fetcher.shared().stats()
+
+        # Finish the crawls that stopped before they were done.
+        crawls = web.stopped_crawls(db)
+        if crawls:
+            print "[Watchlist] Resuming %d stopped crawls." % len(crawls)
+            try:
+                web.resume_crawls(db)
+            except Exception as e:
+                print "[Watchlist] Error occurred: %s" % e
+        watches = db.get_watches()
+
+        print "[Watchlist] There are %d URLs in the watchlist." % \
+              watches.count()
 
-        for watch in watches:
+        # Read the watches as they are updated, rather than all at once.
+        for watch in watches.iter():
             print "[Watchlist] Updating URL: %s" % watch.url
 
             try:
@@ -684,14 +824,22 @@ def update():
                     pass
                 elif watch.url.endswith(('.rss', '.xml')):
                     # This is an RSS feed.
-                    rss.parse_rss(db, watch.url, depth=2)
+                    rss.parse_rss(db, watch.url, depth=2, changed=True)
                 else:
                     # Try crawling the page as a site.
-                    web.crawl_site(db, watch.url, depth=3)
+                    web.crawl_site(db, watch.url, depth=3, changed=True)
             except Exception as e:
                 print "[Watchlist] Error occurred: %s" % e
 
         print "[Watchlist] Finished updating."
+        stats = fetcher.shared().stats(since=start)
+        print "[Watchlist] Fetched %d pages (%d bytes), reusing connections " \
+              "for %d%% of them." % (stats['requests'], stats['bytes'],
+                                     stats['reuse_ratio'] * 100)
+        print "[Watchlist] Skipped %d unchanged pages (%d not modified, %d " \
+              "with the same content)." % (stats['avoided'],
+                                           stats['not_modified'],
+                                           stats['unchanged'])
 
 if __name__ == '__main__':
     # Update top level domains for URL checking.
@@ -701,7 +849,8 @@ if __name__ == '__main__':
         pass
 
     # Create necessary tables for the database
-    db = Database(app.config['DATABASE'])
+    db = Database(app.config['DATABASE'],
+                  pragmas=app.config['DATABASE_PRAGMAS'])
     db.create_tables()
     db.close()
     
@@ -9,6 +9,9 @@ class Source(Model):
     db_table = "source"
     db_from = "source"
     db_fields = "id, url"
+    db_unique = "url"
+
+    __slots__ = ('id', 'url')
     db_labels = "source.id, source.url"
 
     def __init__(self, url=''):
@@ -59,6 +59,11 @@
         self.pages = 1;
         self.total = 0;
 
+        // The continuation tokens for the pages before and after the
+        // current page, given by the server.
+        self.previous = null;
+        self.next = null;
+
         // Add a click handler for row selection to the body of the table
         self.body.on('click', 'tr', function () {
             // Get the clicked row
@@ -129,14 +134,23 @@
         /**
          * Fetches JSON data from the server using the Datagrid options, and
          * renders the table.
+         * @param {Object} cursor is an optional Object with an 'after' or
+         *                 'before' continuation token to fetch the page
+         *                 from. Without it, the current page is fetched by
+         *                 its offset.
          */
-        function fetch () {
+        function fetch (cursor) {
+            // Continuation tokens let the server seek straight to the page,
+            // instead of counting off every row before it.
+            var position = cursor || {
+                offset: self.page * self.options['length']
+            };
+
             // Extend the data for the JSON request with the data generated
             // by the user function
             var data = $.extend({
-                length: self.options['length'],
-                offset: self.page * self.options['length']
-            }, self.options['data_callback']());
+                length: self.options['length']
+            }, position, self.options['data_callback']());
 
             // Fetch the JSON from the server.
             $.getJSON(
@@ -163,6 +177,10 @@
             // Store total/filtered row amounts.
             self.total = r['total'];
 
+            // Store the continuation tokens for the neighbouring pages.
+            self.previous = r['previous'] || null;
+            self.next = r['next'] || null;
+
             // Calculate the total number of pages, with a minimum of
             // 1 page.
             self.pages = Math.max(Math.ceil(self.total / length), 1);
@@ -212,9 +230,10 @@
          * Builds a page control list item for pagination.
          * @param i the index of the page.
          * @param label the label of the page control.
+         * @param cursor the optional cursor to fetch the page with.
          * @private
          */
-        function _build_page_li(i, label) {
+        function _build_page_li(i, label, cursor) {
             // Create the list element.
             var $li = $('<li><a href="#">' + label + '</a></li>');
 
@@ -236,7 +255,7 @@
                     self.page = i;
 
                     // Refresh the table.
-                    fetch();
+                    fetch(cursor);
                 });
             }
 
@@ -263,8 +282,10 @@
             // Remove all elements currently in the page list.
             self.pageList.children().remove();
 
-            // Add the previous button.
-            _build_page_li(self.page - 1, '&laquo;');
+            // Add the previous button, which continues from the first row
+            // of the page when the server gave a token.
+            _build_page_li(self.page - 1, '&laquo;',
+                self.previous ? {before: self.previous} : undefined);
 
             // Add the regular page controls, up to a max of 5.
             for (var i = 0; i < Math.min(self.pages, 5); ++i) {
@@ -276,8 +297,10 @@
                 }
             }
 
-            // Add the next button.
-            _build_page_li(self.page + 1, '&raquo;');
+            // Add the next button, which continues from the last row of the
+            // page when the server gave a token.
+            _build_page_li(self.page + 1, '&raquo;',
+                self.next ? {after: self.next} : undefined);
         }
 
         // Return the public API for the Datagrid.
@@ -141,6 +141,62 @@ var selected_items = function(select) {
     return instance.getValue().join(" ");
 };
 
+/**
+ * Generates a visualization on the server, and goes to it once it has been
+ * rendered. The server renders visualizations in the background, so the job
+ * is polled until it is done, and is cancelled if the user gives up on it.
+ * @param url is the server url that starts generating the visualization
+ * @param params are the parameters of the visualization
+ */
+var visualize = function(url, params) {
+    var modal = $('#modal-visual-wait');
+
+    // Handles the state of the job.
+    var received = function (r) {
+        if (r['result'] == false) {
+            // Tell the user what went wrong.
+            modal.modal('hide');
+            toastr.error(r['msg']);
+        } else if (r['data']['filename']) {
+            // Rendered, go to the URL.
+            modal.modal('hide');
+            location.href = r['data']['filename'];
+        } else if (modal.data('job') == r['data']['job']) {
+            // Still rendering, ask again in a moment.
+            setTimeout(function () {
+                if (modal.data('job') == r['data']['job']) {
+                    $.getJSON('/viz/job', {'id': r['data']['job']}, received);
+                }
+            }, 500);
+        }
+    };
+
+    // Display the modal telling the user to stand by.
+    modal.data('job', null);
+    modal.modal('show');
+    $.getJSON(url, params, function (r) {
+        if (r['result'] == true && !r['data']['filename']) {
+            modal.data('job', r['data']['job']);
+        }
+        received(r);
+    });
+};
+
+/**
+ * Cancels the visualization being generated.
+ */
+var cancelVisualize = function() {
+    var modal = $('#modal-visual-wait');
+    var job = modal.data('job');
+
+    // Stop polling, and stop the render on the server.
+    modal.data('job', null);
+    modal.modal('hide');
+    if (job) {
+        $.getJSON('/viz/cancel_job', {'id': job});
+    }
+};
+
 /*
  * Executes as the page finishes loading. Sets up interaction between the
  * UI and the backend.
@@ -662,108 +718,46 @@ $(document).ready(function () {
         tabSwitch(tabs['sources']);
     });
 
+    // Cancel the visualization being generated.
+    $('#button-viz-cancel').click(cancelVisualize);
+
     // 2D plot visualization.
     $('#button-viz-plot-line').click(function () {
-        // Display the modal telling the user to stand by.
-        $('#modal-visual-wait').modal('show');
-
         // Generate the visualization for the sources listed.
-        $.getJSON('/viz/plot_lines', {
+        visualize('/viz/plot_lines', {
             'sources': selected_items($('#viz-plot-line-sources'))
-        },  function (r) {
-            // Results received, dismiss the modal.
-            $('#modal-visual-wait').modal('hide');
-            if (r['result'] == true) {
-                // Filename received, go to the URL.
-                location.href = r['data']['filename'];
-            } else {
-                // Tell the user what went wrong.
-                toastr.error(r['msg']);
-            }
         });
     });
 
     // 2D bar plot visualization.
     $('#button-viz-plot-bar').click(function () {
-        // Display the modal telling the user to stand by.
-        $('#modal-visual-wait').modal('show');
-
         // Generate the visualization for the sources listed.
-        $.getJSON('/viz/plot_bar', {
-         'sources': selected_items($('#viz-plot-bar-sources'))
-        },  function (r) {
-            // Results received, dismiss the modal.
-            $('#modal-visual-wait').modal('hide');
-            if (r['result'] == true) {
-                // Filename received, go to the URL.
-                location.href = r['data']['filename'];
-            } else {
-                // Tell the user what went wrong.
-                toastr.error(r['msg']);
-            }
+        visualize('/viz/plot_bar', {
+            'sources': selected_items($('#viz-plot-bar-sources'))
         });
     });
 
     // Reference in article visualization.
     $('#button-viz-graph-ref-article').click(function () {
-        // Display the modal telling the user to stand by.
-        $('#modal-visual-wait').modal('show');
-
         // Generate the visualization for the sources listed.
-        $.getJSON('/viz/draw_ref_in_article', {
+        visualize('/viz/draw_ref_in_article', {
             'article': selected_item($('#viz-ref-article'))
-        },  function (r) {
-            // Results received, dismiss the modal.
-            $('#modal-visual-wait').modal('hide');
-            if (r['result'] == true) {
-                // Filename received, go to the URL.
-                location.href = r['data']['filename'];
-            } else {
-                // Tell the user what went wrong.
-                toastr.error(r['msg']);
-            }
         });
     });
 
     // Reference to source visualization.
     $('#button-viz-ref-to-source').click(function () {
-        // Display the modal telling the user to stand by.
-        $('#modal-visual-wait').modal('show');
-
         // Generate the visualization for the sources listed.
-        $.getJSON('/viz/draw_ref_to_source', {
+        visualize('/viz/draw_ref_to_source', {
             'source': selected_item($('#viz-ref-to-source'))
-        },  function (r) {
-            // Results received, dismiss the modal.
-            $('#modal-visual-wait').modal('hide');
-            if (r['result'] == true) {
-                // Filename received, go to the URL.
-                location.href = r['data']['filename'];
-            } else {
-                // Tell the user what went wrong.
-                toastr.error(r['msg']);
-            }
         });
     });
 
     // Reference from source visualization.
     $('#button-viz-ref-from-source').click(function () {
-        // Display the modal telling the user to stand by.
-        $('#modal-visual-wait').modal('show');
-
         // Generate the visualization for the sources listed.
-        $.getJSON('/viz/draw_ref_from_source', {
+        visualize('/viz/draw_ref_from_source', {
             'source': selected_item($('#viz-ref-from-source'))
-        },  function (r) {
-            // Results received, dismiss the modal.
-            $('#modal-visual-wait').modal('hide');
-            if (r['result'] == true) {
-                // Filename received, go to the URL.
-                location.href = r['data']['filename'];
-            } else {
-                // Tell the user what went wrong.
-                toastr.error(r['msg']);
-            }
         });
     });
 
@@ -0,0 +1,39 @@
+from model import Model
+
+
+class Tag(Model):
+    """A tag is a label that articles are given by their publisher. Tags are
+    read from the tags of the articles, along with the number of articles
+    that have them, and are uniquely represented by their name (which is
+    also their id).
+    """
+    db_table = "article_tag"
+    db_from = "(SELECT tag AS id, tag, count(*) AS count FROM article_tag " \
+              "GROUP BY tag) AS tag"
+    db_fields = "article_id, tag"
+
+    __slots__ = ('id', 'tag', 'count')
+    db_labels = "tag.id, tag.tag, tag.count"
+
+    def __init__(self, tag='', count=0):
+        """(Tag, str, int) -> None
+        Constructs a tag with the given name and number of articles.
+        """
+        self.tag = tag.strip() if tag else ''
+        self.count = count
+
+        # Database fields.
+        self.id = self.tag or None
+
+
+def split_tags(tags):
+    """(str) -> [str]
+    Returns the tags in a comma separated list of tags, without the spaces
+    around them, and without empty or repeated tags.
+    """
+    tag_list = []
+    for tag in tags.split(','):
+        tag = tag.strip()
+        if tag and tag not in tag_list:
+            tag_list.append(tag)
+    return tag_list
@@ -0,0 +1,76 @@
+import unittest
+import shutil
+import tempfile
+import os
+from bloom import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def setUp(self):
+        """(TestBloomFilter) -> None
+        Set up an empty directory for the filter file.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'urls.seen')
+
+    def tearDown(self):
+        """(TestBloomFilter) -> None
+        Remove the filter directory.
+        """
+        shutil.rmtree(self.directory)
+
+    def test_add(self):
+        """(TestBloomFilter) -> None
+        Test that added strings are found, and that the file is only created
+        once a string is added.
+        """
+        seen = BloomFilter(self.path, capacity=10)
+        self.assertFalse("http://a.com/1.html" in seen)
+        self.assertFalse(os.path.exists(self.path))
+
+        self.assertTrue(seen.add("http://a.com/1.html"))
+        self.assertFalse(seen.add("http://a.com/1.html"))
+        self.assertTrue(u"http://a.com/\u00e9.html" not in seen)
+        seen.add(u"http://a.com/\u00e9.html")
+        self.assertTrue("http://a.com/1.html" in seen)
+        self.assertTrue(u"http://a.com/\u00e9.html" in seen)
+        self.assertEqual(seen.stats()['count'], 2)
+        seen.close()
+
+    def test_grow(self):
+        """(TestBloomFilter) -> None
+        Test that the filter grows past its capacity, keeping what was added
+        and its false positive rate.
+        """
+        seen = BloomFilter(self.path, capacity=100, error_rate=0.01)
+        for i in range(2000):
+            seen.add("http://a.com/%d.html" % i)
+        self.assertTrue(seen.stats()['layers'] > 1)
+        for i in range(2000):
+            self.assertTrue("http://a.com/%d.html" % i in seen)
+
+        false_positives = len([i for i in range(10000)
+                               if "http://b.com/%d.html" % i in seen])
+        self.assertTrue(false_positives < 200)
+        seen.close()
+
+    def test_reopen(self):
+        """(TestBloomFilter) -> None
+        Test that the filter is loaded again from its file.
+        """
+        seen = BloomFilter(self.path, capacity=10)
+        for i in range(50):
+            seen.add("http://a.com/%d.html" % i)
+        stats = seen.stats()
+        seen.close()
+
+        seen = BloomFilter(self.path)
+        self.assertEqual(seen.stats(), stats)
+        for i in range(50):
+            self.assertTrue("http://a.com/%d.html" % i in seen)
+        self.assertTrue(seen.add("http://a.com/new.html"))
+        seen.close()
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,151 @@
+import unittest
+from cache import LRUCache, RenderCache
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_put(self):
+        """(TestLRUCache) -> None
+        Test getting cached and missing keys.
+        """
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('b', 0), 0)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_evict_least_recent(self):
+        """(TestLRUCache) -> None
+        Test that the least recently used key is evicted when full.
+        """
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_remove_clear(self):
+        """(TestLRUCache) -> None
+        Test removing keys, and clearing the cache.
+        """
+        cache = LRUCache()
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.remove('a')
+        cache.remove('missing')
+        self.assertEqual(cache.get('a'), None)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        """(TestRenderCache) -> None
+        Set up an empty directory for the images, and count the renders.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.cache = RenderCache(self.directory, size=3, max_age=60)
+        self.renders = []
+
+    def tearDown(self):
+        """(TestRenderCache) -> None
+        Remove the image directory.
+        """
+        shutil.rmtree(self.directory)
+
+    def render(self, path):
+        """(TestRenderCache, str) -> None
+        Writes an image to the path.
+        """
+        self.renders.append(path)
+        with open(path, 'w') as image:
+            image.write('image')
+
+    def test_hit(self):
+        """(TestRenderCache) -> None
+        Test that a key is rendered once, and that other keys get their own
+        files.
+        """
+        first = self.cache.get('line', ((1, 2), 'year', 0), self.render)
+        again = self.cache.get('line', ((1, 2), 'year', 0), self.render)
+        other = self.cache.get('line', ((1, 2), 'year', 1), self.render)
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith('line-'))
+        self.assertEqual(len(self.renders), 2)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted([first, other]))
+
+    def test_failed_render(self):
+        """(TestRenderCache) -> None
+        Test that a failed render leaves no file behind.
+        """
+        def fail(path):
+            """(str) -> None
+            Writes part of an image, and fails.
+            """
+            self.render(path)
+            raise ValueError("Render failed.")
+
+        self.assertRaises(ValueError, self.cache.get, 'bar', (1, ), fail)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_evict(self):
+        """(TestRenderCache) -> None
+        Test that the least recently used and expired images are removed,
+        but not other files.
+        """
+        open(os.path.join(self.directory, 'other.png'), 'w').close()
+        names = [self.cache.get('bar', (i, ), self.render)
+                 for i in range(3)]
+
+        # Use the first image, so the second is the least recently used.
+        path = os.path.join(self.directory, names[0])
+        os.utime(path, (time.time() + 1, time.time() + 1))
+        self.cache.get('bar', (3, ), self.render)
+        self.assertEqual(self.cache.stats()['entries'], 3)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory, names[1])))
+        self.assertTrue(os.path.exists(path))
+
+        # Expire the first image.
+        os.utime(path, (time.time() - 120, time.time() - 120))
+        self.cache.evict()
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory, 'other.png')))
+
+    def test_concurrent(self):
+        """(TestRenderCache) -> None
+        Test that requests for the same key at once render it only once.
+        """
+        def render(path):
+            """(str) -> None
+            Writes an image slowly.
+            """
+            time.sleep(0.05)
+            self.render(path)
+
+        threads = [threading.Thread(target=self.cache.get,
+                                    args=('aref', (5, ), render))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.renders), 1)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
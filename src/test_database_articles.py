@@ -2,6 +2,7 @@ import unittest
 from database import Database
 from source import Source
 from article import Article
+from reference import Reference
 
 
 class TestDBArticles(unittest.TestCase):
@@ -96,10 +97,10 @@ class TestDBArticles(unittest.TestCase):
         # Attempt to add the second article with same url
         self.assertTrue(self.db.add_article(article))
 
-        # Confirm that there is one article inside the db and id has incremented
+        # Confirm that there is one article inside the db and its id is kept
         articles = self.db.get_articles()
         self.assertEqual(articles.count(), 1)
-        self.assertEqual(articles.first().id, id + 1)
+        self.assertEqual(articles.first().id, id)
 
     def test_add_article_duplicate_url_changes(self):
         """(TestDBArticle) -> None
@@ -118,7 +119,7 @@ class TestDBArticles(unittest.TestCase):
         self.db.add_article(new_article)
 
         #Confirm the changes that have been made
-        result = self.db.get_by_id(Article, 2)
+        result = self.db.get_by_id(Article, 1)
         self.assertEqual(new_article.author, result.author)
         self.assertEqual(new_article.tags, result.tags)
 
@@ -330,5 +331,107 @@ class TestDBArticles(unittest.TestCase):
         articles = self.db.get_articles("", "Very unique title")
         self.assertEqual(articles.count(), 0)
 
+    def test_add_article_returns_id(self):
+        """(TestDBArticles) -> None
+        Test that add_article returns the id of the article, and sets it.
+        """
+        article = Article("http://test_source.com/a.html", "Title")
+        id = self.db.add_article(article)
+        self.assertEqual(id, 1)
+        self.assertEqual(article.id, 1)
+        self.assertEqual(article.source, "test_source.com")
+
+        # Adding the article again returns the same id.
+        again = Article("http://test_source.com/a.html", "New title")
+        self.assertEqual(self.db.add_article(again), 1)
+
+    def test_modify_article_keeps_references(self):
+        """(TestDBArticles) -> None
+        Test that modifying an article, by id or by URL, keeps its id and
+        the references to and from it.
+        """
+        self.db.add_source(Source("other.com"))
+        self.db.add_source(Source("third.com"))
+        child = Article("http://test_source.com/child.html", "Child")
+        parent = Article("http://other.com/parent.html", "Parent")
+        self.db.add_article(child)
+        self.db.add_article(parent)
+        self.assertTrue(self.db.add_reference(
+            Reference(child.id, parent_id=parent.id)))
+        self.assertTrue(self.db.add_reference(Reference(child.id, 3)))
+
+        # Modify by id, changing the URL.
+        child.url = "http://test_source.com/moved.html"
+        self.assertEqual(self.db.add_article(child), 1)
+
+        # Modify by URL.
+        self.assertEqual(self.db.add_article(
+            Article("http://other.com/parent.html", "Changed")), 2)
+
+        self.assertEqual(self.db.get_by_id(Article, 1).url, child.url)
+        self.assertEqual(self.db.get_by_id(Article, 2).title, "Changed")
+        self.assertEqual(self.db.get_references(child_id=1).count(), 2)
+
+    def test_modify_article_duplicate_url(self):
+        """(TestDBArticles) -> None
+        Test that an article can't be modified to have the URL of another
+        article.
+        """
+        first = Article("http://test_source.com/1.html", "First")
+        second = Article("http://test_source.com/2.html", "Second")
+        self.db.add_article(first)
+        self.db.add_article(second)
+
+        second.url = first.url
+        self.assertFalse(self.db.add_article(second))
+        self.assertEqual(self.db.get_articles().count(), 2)
+        self.assertEqual(self.db.get_by_id(Article, 1).title, "First")
+
+    def test_articles_exist(self):
+        """(TestDBArticles) -> None
+        Test checking whether any articles match a query.
+        """
+        self.assertFalse(self.db.get_articles().exists())
+        self.db.add_article(Article("http://test_source.com/1.html", "One"))
+        self.assertTrue(self.db.get_articles().exists())
+        self.assertTrue(self.db.get_articles(
+            url="http://test_source.com/1.html").exists())
+        self.assertFalse(self.db.get_articles(
+            url="http://test_source.com/2.html").exists())
+
+    def test_get_articles_date_formats(self):
+        """(TestDBArticles) -> None
+        Test that date ranges compare the days of dates in any format.
+        """
+        self.db.add_article(Article("http://test_source.com/1.html", "One",
+                                    "2010/10/29"))
+        self.db.add_article(Article("http://test_source.com/2.html", "Two",
+                                    "2014-11-11"))
+        self.db.add_article(Article("http://test_source.com/3.html", "Three",
+                                    "Nov 2, 2012"))
+        self.db.add_article(Article("http://test_source.com/4.html", "Four",
+                                    "Unknown"))
+
+        query = self.db.get_articles(date_start="2010-10-01",
+                                     date_end="2013-01-01")
+        self.assertEqual(sorted([article.title for article in query.all()]),
+                         ["One", "Three"])
+        self.assertEqual(self.db.get_articles(
+            date_start="2014/11/11").first().title, "Two")
+
+    def test_normalize_dates(self):
+        """(TestDBArticles) -> None
+        Test numbering the dates of articles that weren't numbered.
+        """
+        self.db.add_article(Article("http://test_source.com/1.html", "One",
+                                    "Nov 2, 2012"))
+        self.db.execute("UPDATE article SET date_num = NULL")
+        self.assertEqual(self.db.get_articles(
+            date_start="2012-01-01").count(), 0)
+
+        self.assertEqual(self.db.normalize_dates(), 1)
+        self.assertEqual(self.db.get_articles(
+            date_start="2012-01-01").count(), 1)
+
 if __name__ == "__main__":
     unittest.main(exit=False)
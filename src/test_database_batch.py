@@ -0,0 +1,88 @@
+import unittest
+from database import Database
+from source import Source
+from keywords import Keyword
+import os
+
+
+class TestDBBatch(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBBatch) -> None
+        Set up the database file for testing, and a second connection to
+        check what has been committed.
+        """
+        self.db = Database("testbatch.db")
+        self.db.create_tables()
+        self.other = Database("testbatch.db")
+
+    def tearDown(self):
+        """(TestDBBatch) -> None
+        Remove the database test file.
+        """
+        self.other.close()
+        self.db.close()
+        os.remove("testbatch.db")
+
+    def test_batch_commit(self):
+        """(TestDBBatch) -> None
+        Test that writes in a batch are committed when the batch ends.
+        """
+        with self.db.batch():
+            self.assertTrue(self.db.add_source(Source("a.com")))
+            self.assertTrue(self.db.add_source(Source("b.com")))
+
+            # Not committed yet, but visible inside the batch.
+            self.assertEqual(self.db.get_sources().count(), 2)
+            self.assertEqual(self.other.get_sources().count(), 0)
+
+        self.assertEqual(self.other.get_sources().count(), 2)
+
+    def test_batch_rollback(self):
+        """(TestDBBatch) -> None
+        Test that an exception leaving a batch rolls back its writes.
+        """
+        try:
+            with self.db.batch():
+                self.db.add_source(Source("a.com"))
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertEqual(self.db.get_sources().count(), 0)
+        self.assertEqual(self.db.depth, 0)
+
+    def test_batch_nested_rollback(self):
+        """(TestDBBatch) -> None
+        Test that an exception leaving a nested batch only rolls back the
+        writes made in the nested batch.
+        """
+        with self.db.batch():
+            self.db.add_source(Source("a.com"))
+            try:
+                with self.db.batch():
+                    self.db.add_source(Source("b.com"))
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.db.add_source(Source("c.com"))
+
+        sources = [source.url for source in self.other.get_sources().all()]
+        self.assertEqual(sorted(sources), ["a.com", "c.com"])
+
+    def test_batch_integrity_errors(self):
+        """(TestDBBatch) -> None
+        Test that failed writes in a batch are still reported, and don't
+        undo the other writes in the batch.
+        """
+        with self.db.batch():
+            self.assertTrue(self.db.add_source(Source("a.com")))
+            self.assertTrue(self.db.add_keyword(Keyword(1, "A")))
+            self.assertFalse(self.db.add_keyword(Keyword(5, "B")))
+            self.assertFalse(self.db.add_source(Source("")))
+
+        self.assertEqual(self.other.get_sources().count(), 1)
+        self.assertEqual(self.other.get_keywords().count(), 1)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,109 @@
+import unittest
+from database import Database, ADDED, DUPLICATE, REJECTED
+from article import Article
+from source import Source
+from reference import Reference
+from keywords import Keyword
+import os
+
+
+class TestDBBulk(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBBulk) -> None
+        Set up the database file for testing.
+        """
+        self.db = Database("testbulk.db")
+        self.db.create_tables()
+
+    def tearDown(self):
+        """(TestDBBulk) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testbulk.db")
+
+    def test_add_articles(self):
+        """(TestDBBulk) -> None
+        Test adding many articles adds their sources, and reports duplicates
+        and malformed URLs.
+        """
+        articles = [Article("http://a.com/1.html", "One"),
+                    Article("http://b.com/2.html", "Two"),
+                    Article("http://a.com/1.html", "Again"),
+                    Article("not a url", "Bad"),
+                    Article("http://a.com/3.html")]
+        self.assertEqual(self.db.add_articles(articles),
+                         [ADDED, ADDED, DUPLICATE, REJECTED, REJECTED])
+
+        self.assertEqual(self.db.get_sources().count(), 2)
+        self.assertEqual(self.db.get_articles().count(), 2)
+
+        # The existing article isn't replaced.
+        article = self.db.get_articles(url="http://a.com/1.html").first()
+        self.assertEqual(article.title, "One")
+
+    def test_add_articles_no_sources(self):
+        """(TestDBBulk) -> None
+        Test that articles without a source are rejected when sources aren't
+        added.
+        """
+        self.db.add_source(Source("a.com"))
+        articles = [Article("http://a.com/1.html", "One"),
+                    Article("http://b.com/2.html", "Two")]
+        self.assertEqual(self.db.add_articles(articles, add_sources=False),
+                         [ADDED, REJECTED])
+        self.assertEqual(self.db.get_sources().count(), 1)
+
+    def test_add_articles_chunks(self):
+        """(TestDBBulk) -> None
+        Test adding more articles than fit in one chunk.
+        """
+        articles = [Article("http://a.com/%d.html" % (i % 700), "Title")
+                    for i in range(1200)]
+        outcomes = self.db.add_articles(articles)
+        self.assertEqual(outcomes.count(ADDED), 700)
+        self.assertEqual(outcomes.count(DUPLICATE), 500)
+        self.assertEqual(self.db.get_articles().count(), 700)
+
+    def test_add_references(self):
+        """(TestDBBulk) -> None
+        Test adding many references finds the parent sources, and reports
+        references rejected by the triggers.
+        """
+        self.db.add_articles([Article("http://a.com/1.html", "One"),
+                              Article("http://b.com/2.html", "Two")])
+        a = self.db.get_articles(url="http://a.com/1.html").first()
+        b = self.db.get_articles(url="http://b.com/2.html").first()
+
+        references = [Reference(a.id, parent_id=b.id),
+                      Reference(a.id, b.source_id),
+                      Reference(a.id, a.source_id),
+                      Reference(a.id, parent_id=100),
+                      Reference(b.id, a.source_id)]
+        self.assertEqual(self.db.add_references(references),
+                         [ADDED, DUPLICATE, REJECTED, REJECTED, ADDED])
+        self.assertEqual(references[0].source_id, b.source_id)
+        self.assertEqual(self.db.get_references().count(), 2)
+
+    def test_add_keywords(self):
+        """(TestDBBulk) -> None
+        Test adding many keywords reports duplicates and missing sources.
+        """
+        self.db.add_source(Source("a.com"))
+        keywords = [Keyword(1, "A"), Keyword(1, "Alpha"), Keyword(1, "A"),
+                    Keyword(5, "B")]
+        self.assertEqual(self.db.add_keywords(keywords),
+                         [ADDED, ADDED, DUPLICATE, REJECTED])
+        self.assertEqual(self.db.get_keywords().count(), 2)
+
+    def test_add_empty(self):
+        """(TestDBBulk) -> None
+        Test adding no objects.
+        """
+        self.assertEqual(self.db.add_articles([]), [])
+        self.assertEqual(self.db.add_references([]), [])
+        self.assertEqual(self.db.add_keywords(iter([])), [])
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
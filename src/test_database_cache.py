@@ -0,0 +1,161 @@
+import unittest
+from database import Database
+from article import Article
+from source import Source
+from reference import Reference
+import os
+
+
+class TestDBCache(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBCache) -> None
+        Set up the database file for testing, with an article.
+        """
+        self.db = Database("testcache.db")
+        self.db.create_tables()
+        self.db.add_article(Article("http://a.com/1.html", "One"))
+
+    def tearDown(self):
+        """(TestDBCache) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testcache.db")
+
+    def test_hits(self):
+        """(TestDBCache) -> None
+        Test that repeated lookups, of URLs in the database or not, are
+        cached.
+        """
+        article = self.db.get_article_by_url("http://a.com/1.html")
+        self.assertEqual(article.title, "One")
+        self.assertTrue(
+            self.db.get_article_by_url(" http://a.com/1.html ") is article)
+        self.assertEqual(self.db.get_article_by_url("http://a.com/2.html"),
+                         None)
+        self.assertEqual(self.db.get_article_by_url("http://a.com/2.html"),
+                         None)
+        self.assertEqual(self.db.get_article_by_url(None), None)
+
+        stats = self.db.cache_stats()['articles']
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+        self.assertEqual(self.db.get_source_by_url("a.com").id, 1)
+        self.assertEqual(self.db.get_source_by_url("b.com"), None)
+
+    def test_by_urls(self):
+        """(TestDBCache) -> None
+        Test looking up many URLs at once, some of them cached, repeated, or
+        not in the database.
+        """
+        self.db.add_article(Article("http://a.com/2.html", "Two"))
+        self.db.get_article_by_url("http://a.com/1.html")
+        urls = ["http://a.com/1.html", "http://a.com/2.html", None,
+                "http://a.com/3.html", " http://a.com/2.html"]
+        articles = self.db.get_articles_by_urls(urls)
+        self.assertEqual(sorted(articles), ["http://a.com/1.html",
+                                            "http://a.com/2.html"])
+        self.assertEqual(articles["http://a.com/2.html"].title, "Two")
+
+        # The misses are cached too.
+        self.assertEqual(self.db.get_article_by_url("http://a.com/3.html"),
+                         None)
+        self.assertEqual(self.db.cache_stats()['articles']['hits'], 2)
+
+    def test_exact(self):
+        """(TestDBCache) -> None
+        Test that lookups match URLs exactly, unlike LIKE filters.
+        """
+        self.assertEqual(self.db.get_article_by_url("http://a.com/_.html"),
+                         None)
+        self.assertEqual(self.db.get_article_by_url("HTTP://A.COM/1.HTML"),
+                         None)
+
+    def test_add(self):
+        """(TestDBCache) -> None
+        Test that adding articles and sources updates cached misses.
+        """
+        self.assertEqual(self.db.get_article_by_url("http://b.com/2.html"),
+                         None)
+        self.assertEqual(self.db.get_source_by_url("b.com"), None)
+        self.db.add_article(Article("http://b.com/2.html", "Two"))
+        self.assertEqual(
+            self.db.get_article_by_url("http://b.com/2.html").title, "Two")
+        self.assertEqual(self.db.get_source_by_url("b.com").url, "b.com")
+
+        self.assertEqual(self.db.get_article_by_url("http://c.com/3.html"),
+                         None)
+        self.db.add_articles([Article("http://c.com/3.html", "Three")])
+        self.assertNotEqual(
+            self.db.get_article_by_url("http://c.com/3.html"), None)
+
+    def test_modify_delete(self):
+        """(TestDBCache) -> None
+        Test that modifying and deleting articles and sources updates the
+        cache.
+        """
+        article = self.db.get_article_by_url("http://a.com/1.html")
+        article.title = "Changed"
+        self.db.add_article(article)
+        self.assertEqual(
+            self.db.get_article_by_url("http://a.com/1.html").title,
+            "Changed")
+
+        article = self.db.get_article_by_url("http://a.com/1.html")
+        self.db.delete_by_id(Article, article.id)
+        self.assertEqual(self.db.get_article_by_url("http://a.com/1.html"),
+                         None)
+
+        self.db.add_article(Article("http://a.com/1.html", "One"))
+        self.assertNotEqual(
+            self.db.get_article_by_url("http://a.com/1.html"), None)
+        self.db.delete_by_id(Source, self.db.get_source_by_url("a.com").id)
+        self.assertEqual(self.db.get_source_by_url("a.com"), None)
+        self.assertEqual(self.db.get_article_by_url("http://a.com/1.html"),
+                         None)
+
+    def test_duplicate(self):
+        """(TestDBCache) -> None
+        Test that failed writes, which change nothing, keep the caches, the
+        keyword matcher and the write generation, while rolled back writes
+        don't.
+        """
+        self.db.add_source(Source("b.com"))
+        article = self.db.get_article_by_url("http://a.com/1.html")
+        source = self.db.get_source_by_url("b.com")
+        self.db.add_reference(Reference(article.id, source.id))
+
+        keywords = self.db.keyword_matcher()
+        generation = self.db.generation()
+        self.assertFalse(self.db.add_reference(Reference(article.id,
+                                                         source.id)))
+        self.db.add_references([Reference(article.id, source.id)])
+        self.assertTrue(self.db.keyword_matcher() is keywords)
+        self.assertEqual(self.db.generation(), generation)
+        self.assertEqual(self.db.cache_stats()['articles']['entries'], 1)
+
+        try:
+            with self.db.batch():
+                self.db.add_source(Source("c.com"))
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertFalse(self.db.keyword_matcher() is keywords)
+        self.assertEqual(self.db.cache_stats()['articles']['entries'], 0)
+
+    def test_other_connection(self):
+        """(TestDBCache) -> None
+        Test that writes from another connection clear the cache.
+        """
+        self.assertEqual(self.db.get_article_by_url("http://b.com/2.html"),
+                         None)
+        other = Database("testcache.db")
+        other.add_article(Article("http://b.com/2.html", "Two"))
+        other.close()
+        self.assertNotEqual(
+            self.db.get_article_by_url("http://b.com/2.html"), None)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
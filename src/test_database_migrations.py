@@ -0,0 +1,110 @@
+import unittest
+import sqlite3
+from database import Database
+from migrations import MIGRATIONS, migrate, schema_version
+from source import Source
+import os
+
+
+class TestDBMigrations(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBMigrations) -> None
+        Set up the database file for testing.
+        """
+        self.db = Database("testmigrations.db")
+
+    def tearDown(self):
+        """(TestDBMigrations) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testmigrations.db")
+
+    def indexes(self):
+        """(TestDBMigrations) -> [str]
+        Returns the names of the explicitly created indexes.
+        """
+        rows = self.db.query(None, "SELECT name FROM sqlite_master WHERE "
+                                   "type = 'index' AND sql IS NOT NULL",
+                             convert=False)
+        return [row['name'] for row in rows]
+
+    def test_create_tables(self):
+        """(TestDBMigrations) -> None
+        Test create_tables on an empty database applies every migration.
+        """
+        latest = MIGRATIONS[-1][0]
+        self.assertEqual(self.db.create_tables(), latest)
+        self.assertEqual(schema_version(self.db.connection), latest)
+        self.assertTrue('ref_source_child' in self.indexes())
+
+    def test_create_tables_twice(self):
+        """(TestDBMigrations) -> None
+        Test that create_tables doesn't change an up to date database.
+        """
+        self.db.create_tables()
+        self.assertTrue(self.db.add_source(Source("test.com")))
+        self.db.create_tables()
+
+        rows = self.db.query(None, "SELECT count(*) AS c FROM schema_version",
+                             convert=False)
+        self.assertEqual(rows[0]['c'], len(MIGRATIONS))
+        self.assertEqual(self.db.get_sources().count(), 1)
+
+    def test_upgrade_existing(self):
+        """(TestDBMigrations) -> None
+        Test upgrading a database that was created before schema versions
+        existed keeps its data and gains the indexes.
+        """
+        migrate(self.db.connection, 1)
+        self.db.connection.execute("DROP TABLE schema_version")
+        # Add the article as the application did at the time, since articles
+        # now store columns added by later migrations.
+        self.db.connection.execute("INSERT INTO source(url) VALUES "
+                                   "('test.com')")
+        self.db.connection.execute(
+            "INSERT INTO article(source_id, url, title, date, author, tags) "
+            "VALUES (1, 'http://test.com/a.html', 'Title', '2010/10/29', '', "
+            "'')")
+        self.assertEqual(self.indexes(), [])
+
+        self.db.create_tables()
+        self.assertEqual(self.db.get_articles().count(), 1)
+        self.assertTrue('article_source_id' in self.indexes())
+
+        # The date of the article is numbered.
+        self.assertEqual(self.db.get_articles(
+            date_start="2010-10-29", date_end="2010-10-29").count(), 1)
+
+    def test_index_used(self):
+        """(TestDBMigrations) -> None
+        Test that filtering references by source uses an index.
+        """
+        self.db.create_tables()
+        plan = self.db.query(None, "EXPLAIN QUERY PLAN SELECT * FROM ref "
+                                   "WHERE source_id = 1", convert=False)
+        self.assertTrue('ref_source_child' in plan[0]['detail'])
+
+    def test_failed_migration(self):
+        """(TestDBMigrations) -> None
+        Test that a failing migration is rolled back.
+        """
+        MIGRATIONS.append((MIGRATIONS[-1][0] + 1, "Broken.",
+                           ["CREATE TABLE broken(id INTEGER)",
+                            "CREATE TABLE broken(id INTEGER)"]))
+        try:
+            self.assertRaises(sqlite3.OperationalError,
+                              self.db.create_tables)
+        finally:
+            MIGRATIONS.pop()
+
+        # The previous migrations stay applied, but the broken one doesn't.
+        self.assertEqual(schema_version(self.db.connection),
+                         MIGRATIONS[-1][0])
+        rows = self.db.query(None, "SELECT name FROM sqlite_master WHERE "
+                                   "name = 'broken'", convert=False)
+        self.assertEqual(rows, [])
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,191 @@
+import unittest
+from database import Database
+from article import Article
+from source import Source
+import os
+
+
+class TestDBPages(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBPages) -> None
+        Set up the database file for testing, with 25 articles on 5 dates.
+        """
+        self.db = Database("testpages.db")
+        self.db.create_tables()
+        self.db.add_articles([Article("http://a.com/%d.html" % i,
+                                      "Title %d" % i,
+                                      "2014-11-%02d" % (i % 5 + 1))
+                              for i in range(25)])
+
+    def tearDown(self):
+        """(TestDBPages) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testpages.db")
+
+    def test_keyset_matches_subset(self):
+        """(TestDBPages) -> None
+        Test that walking the pages with next tokens gives the same rows as
+        ordering by the field and id, with ties on the date.
+        """
+        query = self.db.get_articles()
+        expected = [article.id for article in
+                    self.db.query(Article, "SELECT id FROM article ORDER BY "
+                                           "date DESC, id DESC")]
+
+        ids = []
+        rows, previous, next = query.keyset(10, by='date', asc=False)
+        self.assertEqual(previous, None)
+        while True:
+            ids += [row.id for row in rows]
+            if next is None:
+                break
+            rows, previous, next = query.keyset(10, by='date', asc=False,
+                                                after=next)
+            self.assertNotEqual(previous, None)
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(rows), 5)
+
+    def test_keyset_before(self):
+        """(TestDBPages) -> None
+        Test that the previous token returns the page before.
+        """
+        query = self.db.get_articles()
+        first, _, next = query.keyset(10, by='date', asc=False)
+        second, previous, _ = query.keyset(10, by='date', asc=False,
+                                           after=next)
+
+        rows, previous, next = query.keyset(10, by='date', asc=False,
+                                            before=previous)
+        self.assertEqual([row.id for row in rows],
+                         [row.id for row in first])
+        self.assertEqual(previous, None)
+        self.assertNotEqual(next, None)
+
+    def test_keyset_offset(self):
+        """(TestDBPages) -> None
+        Test that a page at an offset gives tokens for its neighbours.
+        """
+        query = self.db.get_sources()
+        self.assertEqual(query.keyset(10, by='url', offset=5),
+                         ([], None, None))
+
+        query = self.db.get_articles()
+        rows, previous, next = query.keyset(10, by='url', offset=20)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(next, None)
+        before, _, _ = query.keyset(10, by='url', before=previous)
+        self.assertEqual([row.id for row in before],
+                         [row.id for row in query.subset(10, 10, by='url')])
+
+    def test_keyset_filtered(self):
+        """(TestDBPages) -> None
+        Test keyset pages of a filtered query, ordered by id.
+        """
+        self.db.add_source(Source("b.com"))
+        query = self.db.get_articles(date_start="2014-11-04")
+        rows, previous, next = query.keyset(7)
+        self.assertEqual(len(rows), 7)
+        rows, previous, next = query.keyset(7, after=next)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(next, None)
+
+    def test_keyset_invalid_token(self):
+        """(TestDBPages) -> None
+        Test that malformed tokens, and tokens for another ordering, are
+        rejected.
+        """
+        query = self.db.get_articles()
+        _, _, next = query.keyset(10, by='date', asc=False)
+        self.assertRaises(ValueError, query.keyset, 10, by='date',
+                          asc=False, after='not a token')
+        self.assertRaises(ValueError, query.keyset, 10, by='url',
+                          after=next)
+
+    def test_page_total(self):
+        """(TestDBPages) -> None
+        Test that pages give the total rows of the query, whether they are
+        read at an offset or from a token.
+        """
+        query = self.db.get_articles(date_start="2014-11-02")
+        rows, total, previous, next = query.page(10, by='date', asc=False)
+        self.assertEqual(total, 20)
+        self.assertEqual(len(rows), 10)
+        self.assertFalse(hasattr(rows[0], 'page_total'))
+
+        rows, total, previous, next = query.page(10, by='date', asc=False,
+                                                 after=next)
+        self.assertEqual(total, 20)
+        self.assertEqual(next, None)
+
+        # Past the last row.
+        self.assertEqual(query.page(10, offset=30), ([], 20, None, None))
+
+    def test_page_total_written(self):
+        """(TestDBPages) -> None
+        Test that the total of a page from a token is counted again after
+        the database is written to.
+        """
+        query = self.db.get_articles()
+        rows, total, previous, next = query.page(10)
+        self.assertEqual(total, 25)
+
+        self.db.add_article(Article("http://a.com/new.html", "New"))
+        rows, total, previous, next = query.page(10, after=next)
+        self.assertEqual(total, 26)
+
+        self.db.delete_by_id(Article, rows[0].id)
+        rows, total, previous, next = query.page(10, before=previous)
+        self.assertEqual(total, 25)
+
+    def test_page_total_memory(self):
+        """(TestDBPages) -> None
+        Test that in memory databases don't share the totals of their pages,
+        since each is a different database.
+        """
+        first = Database(":memory:")
+        second = Database(":memory:")
+        for db, total in ((first, 25), (second, 3)):
+            db.create_tables()
+            db.add_articles([Article("http://a.com/%d.html" % i, "Title")
+                             for i in range(total)])
+
+        # Pages from tokens reuse the total counted by the first page.
+        tokens = [db.get_articles().page(2)[3] for db in (first, second)]
+        for db, token, total in ((first, tokens[0], 25),
+                                 (second, tokens[1], 3)):
+            rows, count, previous, next = db.get_articles().page(2,
+                                                                 after=token)
+            self.assertEqual(count, total)
+        self.assertNotEqual(first.key(), second.key())
+        first.close()
+        second.close()
+
+    def test_count_joined(self):
+        """(TestDBPages) -> None
+        Test that count agrees with the rows of a joined query.
+        """
+        query = self.db.get_articles(query="%a.com/1%")
+        self.assertEqual(query.count(), len(query.all()))
+
+    def test_iter(self):
+        """(TestDBPages) -> None
+        Test that iterating a query in batches gives the same objects as all,
+        while the database is used between the batches.
+        """
+        query = self.db.get_articles(date_start="2014-11-02")
+        ids = []
+        for article in query.iter(batch_size=3, by='date', asc=False):
+            ids.append(article.id)
+            self.assertEqual(self.db.get_by_id(Article, article.id).url,
+                             article.url)
+
+        self.assertEqual(ids, [article.id for article in
+                               query.all(by='date', asc=False)])
+        self.assertEqual(list(self.db.get_sources("b.com").iter()), [])
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,203 @@
+import unittest
+import sqlite3
+import threading
+import time
+from database import Database
+from pool import ConnectionPool, PoolTimeout, pragma_profile
+from source import Source
+import os
+
+
+class TestDBPool(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBPool) -> None
+        Set up the database file and a small pool for testing.
+        """
+        self.pool = ConnectionPool("testpool.db", size=2, timeout=0.1)
+        db = Database("testpool.db", pool=self.pool)
+        db.create_tables()
+        db.close()
+
+    def tearDown(self):
+        """(TestDBPool) -> None
+        Close the pool and remove the database test file.
+        """
+        self.pool.close()
+        os.remove("testpool.db")
+
+    def test_reuse_connection(self):
+        """(TestDBPool) -> None
+        Test that a released connection is reused by the next checkout.
+        """
+        db = Database("testpool.db", pool=self.pool)
+        connection = db.connection
+        db.close()
+
+        db = Database("testpool.db", pool=self.pool)
+        self.assertTrue(db.connection is connection)
+        db.close()
+
+        # Only one connection was ever opened.
+        stats = self.pool.stats()
+        self.assertEqual(stats['open'], 1)
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['waits'], 0)
+
+    def test_shared_data(self):
+        """(TestDBPool) -> None
+        Test that data written through one checkout is seen by the next.
+        """
+        db = Database("testpool.db", pool=self.pool)
+        self.assertTrue(db.add_source(Source("pool.com")))
+        db.close()
+
+        db = Database("testpool.db", pool=self.pool)
+        self.assertEqual(db.get_sources("pool.com").count(), 1)
+        db.close()
+
+    def test_foreign_keys(self):
+        """(TestDBPool) -> None
+        Test that pooled connections are configured with foreign keys.
+        """
+        db = Database("testpool.db", pool=self.pool)
+        result = db.query(None, "PRAGMA foreign_keys", convert=False)
+        self.assertEqual(result[0]['foreign_keys'], 1)
+        db.close()
+
+    def test_bounded(self):
+        """(TestDBPool) -> None
+        Test that the pool never opens more connections than its size, and
+        that a checkout times out while every connection is in use.
+        """
+        db1 = Database("testpool.db", pool=self.pool)
+        db2 = Database("testpool.db", pool=self.pool)
+        self.assertRaises(PoolTimeout, Database, "testpool.db", self.pool)
+        self.assertEqual(self.pool.stats()['open'], 2)
+        self.assertEqual(self.pool.stats()['waits'], 1)
+        db1.close()
+        db2.close()
+        self.assertEqual(self.pool.stats()['idle'], 2)
+
+    def test_wait_for_release(self):
+        """(TestDBPool) -> None
+        Test that a waiting checkout gets a connection released by another
+        thread.
+        """
+        self.pool.timeout = 5
+        db1 = Database("testpool.db", pool=self.pool)
+        db2 = Database("testpool.db", pool=self.pool)
+
+        # Release a connection shortly after the checkout starts waiting.
+        timer = threading.Timer(0.05, db1.close)
+        timer.start()
+        db3 = Database("testpool.db", pool=self.pool)
+        timer.join()
+
+        self.assertEqual(self.pool.stats()['open'], 2)
+        self.assertEqual(self.pool.stats()['waits'], 1)
+        db2.close()
+        db3.close()
+
+    def test_pragmas(self):
+        """(TestDBPool) -> None
+        Test that pooled connections use the write-ahead log and the pragmas
+        given to the pool.
+        """
+        pool = ConnectionPool("testpool.db", pragmas={'cache_size': -1000})
+        db = Database("testpool.db", pool=pool)
+        mode = db.query(None, "PRAGMA journal_mode", convert=False)
+        self.assertEqual(mode[0]['journal_mode'], 'wal')
+        size = db.query(None, "PRAGMA cache_size", convert=False)
+        self.assertEqual(size[0]['cache_size'], -1000)
+        db.close()
+        pool.close()
+
+    def test_pragmas_invalid(self):
+        """(TestDBPool) -> None
+        Test that pragmas that can't be formatted safely are rejected.
+        """
+        self.assertRaises(ValueError, pragma_profile,
+                          {'journal_mode': 'WAL; DROP TABLE source'})
+        self.assertRaises(ValueError, pragma_profile, {'bad name': 1})
+
+    def test_busy_retry(self):
+        """(TestDBPool) -> None
+        Test that a write retries while another connection holds the write
+        lock, and succeeds once the lock is released.
+        """
+        result = []
+
+        def write():
+            """(None) -> None
+            Adds a source from another connection.
+            """
+            db = Database("testpool.db", pragmas={'busy_timeout': 0},
+                          busy_retries=5, busy_delay=0.02)
+            result.append(db.add_source(Source("busy.com")))
+            db.close()
+
+        # Hold the write lock until shortly after the write starts retrying.
+        writer = Database("testpool.db", pragmas={'busy_timeout': 0})
+        with writer.batch():
+            thread = threading.Thread(target=write)
+            thread.start()
+            time.sleep(0.05)
+        thread.join()
+
+        self.assertEqual(result, [True])
+        self.assertEqual(writer.get_sources("busy.com").count(), 1)
+        writer.close()
+
+    def test_busy_retry_fails(self):
+        """(TestDBPool) -> None
+        Test that a write fails loudly when the database stays locked.
+        """
+        writer = Database("testpool.db", pragmas={'busy_timeout': 0})
+        db = Database("testpool.db", pragmas={'busy_timeout': 0},
+                      busy_retries=2, busy_delay=0.01)
+
+        with writer.batch():
+            self.assertRaises(sqlite3.OperationalError, db.add_source,
+                              Source("busy.com"))
+
+        writer.close()
+        db.close()
+
+    def test_table_locked(self):
+        """(TestDBPool) -> None
+        Test that a table locked by the same connection isn't retried, since
+        waiting can't unlock it.
+        """
+        db = Database("testpool.db", busy_retries=3, busy_delay=1)
+        db.add_source(Source("a.com"))
+        db.add_source(Source("b.com"))
+        cursor = db.connection.cursor()
+        cursor.execute("SELECT * FROM source").fetchone()
+        start = time.time()
+        self.assertRaises(sqlite3.OperationalError, db.execute,
+                          "DROP TABLE watch")
+        self.assertTrue(time.time() - start < 0.5)
+        cursor.close()
+        db.close()
+
+    def test_busy_timeout(self):
+        """(TestDBPool) -> None
+        Test that a write isn't retried past the busy timeout SQLite already
+        waited for.
+        """
+        writer = Database("testpool.db", pragmas={'busy_timeout': 0})
+        db = Database("testpool.db", pragmas={'busy_timeout': 200},
+                      busy_retries=3, busy_delay=1)
+
+        with writer.batch():
+            start = time.time()
+            self.assertRaises(sqlite3.OperationalError, db.add_source,
+                              Source("busy.com"))
+            self.assertTrue(time.time() - start < 1)
+
+        writer.close()
+        db.close()
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -95,8 +95,8 @@ class TestDBReferences(unittest.TestCase):
 			                    "BCCAuthor", "Tags", False))
         a1 = self.db.add_reference(Reference(1, 2))
         a2 = self.db.add_reference(Reference(2, 3))
-        self.assertTrue(a1 == True)
-        self.assertTrue(a2 == True)
+        self.assertEqual(a1, 1)
+        self.assertEqual(a2, 2)
 
     def test_add_reference_invalid(self):
         '''(TestDBReference) -> None
@@ -249,5 +249,26 @@ class TestDBReferences(unittest.TestCase):
         result = self.db.get_references(1)
         self.assertTrue(result.count() == 2)
 
+    def test_source_edges(self):
+        """(TestDBReferences) -> None
+        Test counting the references between sources.
+        """
+        self.db.add_source(Source("http://test_source_3.com"))
+        self.db.add_article(Article("http://test_source_1.com/2.html", "T"))
+        self.db.add_article(Article("http://test_source_2.com/3.html", "T"))
+        self.db.add_references([Reference(1, 2), Reference(1, 3),
+                                Reference(2, 2), Reference(3, 3)])
+
+        self.assertEqual(sorted(self.db.get_source_edges()),
+                         [("test_source_1.com", "test_source_2.com", 2),
+                          ("test_source_1.com", "test_source_3.com", 1),
+                          ("test_source_2.com", "test_source_3.com", 1)])
+        self.assertEqual(self.db.get_source_edges(child_id=2),
+                         [("test_source_1.com", "test_source_2.com", 1)])
+        self.assertEqual(sorted(self.db.get_source_edges(parent_source_id=3)),
+                         [("test_source_1.com", "test_source_3.com", 1),
+                          ("test_source_2.com", "test_source_3.com", 1)])
+        self.assertEqual(len(self.db.get_source_edges(child_source_id=1)), 2)
+
 if __name__ == "__main__":
     unittest.main(exit=False)
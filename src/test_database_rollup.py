@@ -0,0 +1,96 @@
+import unittest
+from database import Database
+from article import Article
+from reference import Reference
+from source import Source
+import os
+
+
+class TestDBRollup(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBRollup) -> None
+        Set up the database file for testing, with articles from a.com on
+        three days referring to b.com.
+        """
+        self.db = Database("testrollup.db")
+        self.db.create_tables()
+        self.db.add_source(Source("b.com"))
+        self.db.add_articles([
+            Article("http://a.com/1.html", "One", "2013-12-30"),
+            Article("http://a.com/2.html", "Two", "2014-01-02"),
+            Article("http://a.com/3.html", "Three", "2014-02-10"),
+            Article("http://a.com/4.html", "Four")])
+        self.b = self.db.get_source_by_url("b.com").id
+        for url in ["http://a.com/1.html", "http://a.com/2.html",
+                    "http://a.com/3.html", "http://a.com/4.html"]:
+            article = self.db.get_article_by_url(url)
+            self.db.add_reference(Reference(article.id, self.b))
+
+    def tearDown(self):
+        """(TestDBRollup) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testrollup.db")
+
+    def counted(self):
+        """(TestDBRollup) -> dict
+        Returns the references to b.com by day, counted from the references.
+        """
+        rows = self.db.query(None, "SELECT article.date_num AS day, "
+                                   "count(*) AS c FROM ref JOIN article ON "
+                                   "article.id = ref.child_id WHERE "
+                                   "ref.source_id = ? AND article.date_num "
+                                   "IS NOT NULL GROUP BY day", (self.b, ),
+                             convert=False)
+        return dict([(row['day'], row['c']) for row in rows])
+
+    def test_periods(self):
+        """(TestDBRollup) -> None
+        Test counting the references by each period, without the article
+        that has no date.
+        """
+        self.assertEqual(self.db.get_reference_counts(self.b),
+                         {2013: 1, 2014: 2})
+        self.assertEqual(self.db.get_reference_counts(self.b, 'month'),
+                         {201312: 1, 201401: 1, 201402: 1})
+        self.assertEqual(self.db.get_reference_counts(self.b, 'week'),
+                         {201401: 2, 201407: 1})
+        self.assertEqual(self.db.get_reference_counts(self.b, 'day'),
+                         self.counted())
+        self.assertRaises(ValueError, self.db.get_reference_counts, self.b,
+                          'decade')
+
+    def test_changes(self):
+        """(TestDBRollup) -> None
+        Test that the counts follow deleted references, deleted articles and
+        changed dates.
+        """
+        article = self.db.get_article_by_url("http://a.com/3.html")
+        article.date = "2013-12-30"
+        self.db.add_article(article)
+        self.assertEqual(self.db.get_reference_counts(self.b, 'day'),
+                         {20131230: 2, 20140102: 1})
+
+        reference = self.db.get_references(child_id=article.id).first()
+        self.db.delete_by_id(Reference, reference.id)
+        self.assertEqual(self.db.get_reference_counts(self.b, 'day'),
+                         self.counted())
+
+        article = self.db.get_article_by_url("http://a.com/2.html")
+        self.db.delete_by_id(Article, article.id)
+        self.assertEqual(self.db.get_reference_counts(self.b, 'day'),
+                         {20131230: 1})
+
+        # The article without a date gets one.
+        article = self.db.get_article_by_url("http://a.com/4.html")
+        article.date = "2015-06-01"
+        self.db.add_article(article)
+        self.assertEqual(self.db.get_reference_counts(self.b),
+                         {2013: 1, 2015: 1})
+        self.assertEqual(self.db.get_reference_counts(self.b, 'day'),
+                         self.counted())
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,103 @@
+import unittest
+from database import Database
+from article import Article
+from search import ArticleMatch, match_expression
+import os
+
+
+class TestDBSearch(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBSearch) -> None
+        Set up the database file for testing, with a few articles.
+        """
+        self.db = Database("testsearch.db")
+        self.db.create_tables()
+        self.db.add_articles([
+            Article("http://a.com/1.html", "Election results are in",
+                    "2014-11-01", "Jane Doe", "politics"),
+            Article("http://b.com/2.html", "Hockey night", "2014-11-02",
+                    "John Smith", "sports"),
+            Article("http://c.com/3.html", "Elections, elections",
+                    "2014-11-03", "Jane Roe", "politics, elections")])
+
+    def tearDown(self):
+        """(TestDBSearch) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testsearch.db")
+
+    def titles(self, query):
+        """(TestDBSearch, Query) -> [str]
+        Returns the sorted titles of the articles in the query.
+        """
+        return sorted([article.title for article in query.all()])
+
+    def test_match_expression(self):
+        """(TestDBSearch) -> None
+        Test that searches become quoted prefix terms, without wildcards.
+        """
+        self.assertEqual(match_expression("%elect%"), '"elect"*')
+        self.assertEqual(match_expression('jane AND "doe"'),
+                         '"jane"* "AND"* "doe"*')
+        self.assertEqual(match_expression("%%"), '')
+
+    def test_query_prefix(self):
+        """(TestDBSearch) -> None
+        Test that the query filter matches word prefixes in every column.
+        """
+        self.assertEqual(
+            self.titles(self.db.get_articles(query="%elect%")),
+            ["Election results are in", "Elections, elections"])
+        self.assertEqual(self.titles(self.db.get_articles(query="jane doe")),
+                         ["Election results are in"])
+        self.assertEqual(self.titles(self.db.get_articles(query="b.com")),
+                         ["Hockey night"])
+        self.assertEqual(self.db.get_articles(query="%%").count(), 3)
+        self.assertEqual(self.db.get_articles(query="curling").count(), 0)
+
+    def test_ranked(self):
+        """(TestDBSearch) -> None
+        Test ranked searches order by relevance, and highlight matches.
+        """
+        query = self.db.get_articles(query="election", ranked=True)
+        self.assertTrue(query.model is ArticleMatch)
+
+        rows, total, previous, next = query.page(10, by='score')
+        self.assertEqual(total, 2)
+        self.assertEqual(rows[0].title, "Elections, elections")
+        self.assertTrue(rows[0].score <= rows[1].score)
+        self.assertTrue('<mark>' in rows[0].snippet)
+
+        # Without words, the query isn't ranked.
+        query = self.db.get_articles(query="%%", ranked=True)
+        self.assertTrue(query.model is Article)
+
+    def test_index_follows_changes(self):
+        """(TestDBSearch) -> None
+        Test that the index follows modified and deleted articles.
+        """
+        article = self.db.get_articles(query="hockey").first()
+        self.db.delete_by_id(Article, article.id)
+        self.assertEqual(self.db.get_articles(query="hockey").count(), 0)
+
+        # Adding the article again replaces the existing one.
+        self.db.add_article(Article("http://a.com/1.html", "Curling",
+                                    "2014-11-01", "Jane Doe", "sports"))
+        self.assertEqual(self.db.get_articles(query="election").count(), 1)
+        self.assertEqual(self.db.get_articles(query="curling").count(), 1)
+
+    def test_rebuild(self):
+        """(TestDBSearch) -> None
+        Test that rebuilding the index indexes articles the triggers missed.
+        """
+        self.db.execute("DROP TRIGGER article_fts_insert")
+        self.db.add_article(Article("http://d.com/4.html", "Curling"))
+        self.assertEqual(self.db.get_articles(query="curling").count(), 0)
+
+        self.db.rebuild_search_index()
+        self.assertEqual(self.db.get_articles(query="curling").count(), 1)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
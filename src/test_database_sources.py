@@ -42,11 +42,10 @@ class TestDBSources(unittest.TestCase):
         self.assertTrue(self.db.add_source(Source(name)))
         id = self.db.get_sources(name).first().id
 
-        # Attempt to add the same source and confirm that the id has
-        # incremented by 1.
+        # Attempt to add the same source and confirm that the id is kept.
         self.assertTrue(self.db.add_source(Source(name)))
         new_id = self.db.get_sources(name).first().id
-        self.assertTrue(id + 1 == new_id)
+        self.assertTrue(id == new_id)
 
     def test_add_source_many(self):
         """(TestDBSources) -> None
@@ -71,11 +70,12 @@ class TestDBSources(unittest.TestCase):
         self.db.add_source(Source("can.com"))
         count = 3
 
-        # Add the same source again and check that the id has changed
+        # Add the same source again and check that the id hasn't changed
         self.db.add_source(Source(name))
         source = self.db.get_sources(name).first()
 
-        self.assertEquals(source.id, count + 1)
+        self.assertEquals(source.id, 1)
+        self.assertEquals(self.db.get_sources().count(), count)
 
     def test_add_source_empty_name(self):
         """(TestDBSources) -> None
@@ -0,0 +1,89 @@
+import unittest
+from database import Database
+from article import Article
+import os
+
+
+class TestDBTags(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBTags) -> None
+        Set up the database file for testing, with tagged articles.
+        """
+        self.db = Database("testtags.db")
+        self.db.create_tables()
+        self.db.add_article(Article("http://a.com/1.html", "One",
+                                    tags="Politics, Canada"))
+        self.db.add_article(Article("http://a.com/2.html", "Two",
+                                    tags="politics,world, ,"))
+        self.db.add_article(Article("http://a.com/3.html", "Three",
+                                    tags="Sports"))
+
+    def tearDown(self):
+        """(TestDBTags) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testtags.db")
+
+    def titles(self, query):
+        """(TestDBTags, Query) -> [str]
+        Returns the titles of the articles of the query, in order of URL.
+        """
+        return [article.title for article in query.all(by='url')]
+
+    def test_any_tags(self):
+        """(TestDBTags) -> None
+        Test finding the articles with any of the tags, regardless of case.
+        """
+        self.assertEqual(self.titles(self.db.get_articles(tags="politics")),
+                         ["One", "Two"])
+        self.assertEqual(self.titles(self.db.get_articles(
+            tags="canada, sports")), ["One", "Three"])
+        self.assertEqual(self.titles(self.db.get_articles(tags="polit")), [])
+
+    def test_all_tags(self):
+        """(TestDBTags) -> None
+        Test finding the articles with all of the tags.
+        """
+        self.assertEqual(self.titles(self.db.get_articles(
+            tags="Politics,Canada", all_tags=True)), ["One"])
+        self.assertEqual(self.titles(self.db.get_articles(
+            tags="Canada,World", all_tags=True)), [])
+
+    def test_modify_delete(self):
+        """(TestDBTags) -> None
+        Test that the tags follow modified and deleted articles.
+        """
+        article = self.db.get_article_by_url("http://a.com/3.html")
+        article.tags = "World"
+        self.db.add_article(article)
+        self.assertEqual(self.titles(self.db.get_articles(tags="sports")), [])
+        self.assertEqual(self.titles(self.db.get_articles(tags="world")),
+                         ["Two", "Three"])
+
+        self.db.delete_by_id(Article, article.id)
+        self.assertEqual(self.titles(self.db.get_articles(tags="world")),
+                         ["Two"])
+
+    def test_get_tags(self):
+        """(TestDBTags) -> None
+        Test counting the articles with each tag.
+        """
+        tags = self.db.get_tags().all(by='count', asc=False)
+        self.assertEqual(tags[0].tag.lower(), "politics")
+        self.assertEqual(tags[0].count, 2)
+        self.assertEqual(len(tags), 4)
+
+        rows, total, previous, next = self.db.get_tags().page(
+            2, by='count', asc=False)
+        self.assertEqual(total, 4)
+        rows, total, previous, next = self.db.get_tags().page(
+            2, by='count', asc=False, after=next)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(next, None)
+
+        self.assertEqual(self.db.get_tags("sp%").first().count, 1)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
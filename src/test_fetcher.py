@@ -0,0 +1,160 @@
+import unittest
+import threading
+import BaseHTTPServer
+import os
+from database import Database
+from fetcher import Fetcher, USER_AGENT
+
+
+class PageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves small pages over keep-alive connections. /etag is served with
+    an ETag, and isn't sent again to requests that have it, /same is always
+    the same, and any other page echoes the User-Agent of the request.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """(PageHandler) -> None
+        Serves the page.
+        """
+        if self.path == '/etag' and \
+                self.headers.get('If-None-Match') == '"1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.path in ('/etag', '/same'):
+            body = 'page'
+        else:
+            body = self.headers.get('User-Agent', '')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/etag':
+            self.send_header('ETag', '"1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """(PageHandler, ...) -> None
+        Keeps the requests out of the test output.
+        """
+        pass
+
+
+class TestFetcher(unittest.TestCase):
+
+    def setUp(self):
+        """(TestFetcher) -> None
+        Set up a local web server, and a fetcher.
+        """
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                PageHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.fetcher = Fetcher()
+
+    def tearDown(self):
+        """(TestFetcher) -> None
+        Stop the web server, and close the fetcher.
+        """
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuse(self):
+        """(TestFetcher) -> None
+        Test that fetching pages one after another reuses the connection,
+        and that the bytes received are counted.
+        """
+        for i in range(4):
+            page = self.fetcher.get(self.url + str(i))
+            self.assertEqual(page.text, USER_AGENT)
+
+        stats = self.fetcher.stats()
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reuse_ratio'], 0.75)
+        self.assertEqual(stats['bytes'], 4 * len(USER_AGENT))
+
+    def test_since(self):
+        """(TestFetcher) -> None
+        Test that the counters since earlier counters only count what was
+        fetched since then.
+        """
+        self.fetcher.get(self.url)
+        start = self.fetcher.stats()
+        for i in range(2):
+            self.fetcher.get(self.url + str(i))
+
+        stats = self.fetcher.stats(since=start)
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['connections'], 0)
+        self.assertEqual(stats['reuse_ratio'], 1.0)
+        self.assertEqual(stats['bytes'], 2 * len(USER_AGENT))
+        self.assertEqual(self.fetcher.stats()['requests'], 3)
+
+    def test_failure(self):
+        """(TestFetcher) -> None
+        Test that fetching a page from a server that isn't there raises an
+        error, like requests.
+        """
+        self.assertRaises(Exception, self.fetcher.get, 'http://127.0.0.1:1/')
+        self.assertEqual(self.fetcher.stats()['requests'], 0)
+
+    def test_changed(self):
+        """(TestFetcher) -> None
+        Test that pages are only given again once they change, whether the
+        server says so or not.
+        """
+        db = Database("testfetcher.db")
+        db.create_tables()
+        try:
+            for path in ('etag', 'same'):
+                page = self.fetcher.get_changed(db, self.url + path)
+                self.assertEqual(page.text, 'page')
+                self.assertEqual(
+                    self.fetcher.get_changed(db, self.url + path), None)
+            self.assertEqual(db.get_validator(self.url + 'etag')['etag'],
+                             '"1"')
+
+            # A page that changes is given again.
+            self.assertEqual(self.fetcher.get_changed(db, self.url).text,
+                             USER_AGENT)
+            self.assertEqual(self.fetcher.get_changed(
+                db, self.url, headers={'User-Agent': 'Other'}).text, 'Other')
+
+            stats = self.fetcher.stats()
+            self.assertEqual(stats['not_modified'], 1)
+            self.assertEqual(stats['unchanged'], 1)
+            self.assertEqual(stats['avoided'], 2)
+        finally:
+            db.close()
+            os.remove("testfetcher.db")
+
+    def test_save(self):
+        """(TestFetcher) -> None
+        Test that a page fetched without saving it is only unchanged once it
+        is saved.
+        """
+        db = Database("testfetcher.db")
+        db.create_tables()
+        try:
+            url = self.url + 'same'
+            page = self.fetcher.get_changed(db, url, save=False)
+            self.assertEqual(db.get_validator(url), None)
+            page = self.fetcher.get_changed(db, url, save=False)
+            self.assertEqual(page.text, 'page')
+
+            self.fetcher.save_validator(db, url, page)
+            self.assertEqual(self.fetcher.get_changed(db, url), None)
+        finally:
+            db.close()
+            os.remove("testfetcher.db")
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,122 @@
+import unittest
+from matcher import KeywordMatcher
+from database import Database
+from source import Source
+from keywords import Keyword
+import os
+
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def test_find(self):
+        """(TestKeywordMatcher) -> None
+        Test finding single and multiple word keywords, ignoring case.
+        """
+        keywords = KeywordMatcher([("CBC", 1), ("New York Times", 2),
+                                   ("York", 3), ("@cbcnews", 4)])
+        text = "The new york times and cbc quoted @CBCNews, not @cbcnews."
+        self.assertEqual(keywords.find(text),
+                         [("york", 3), ("new york times", 2), ("cbc", 1)])
+        self.assertEqual(keywords.sources("york, York York"), [3])
+        self.assertEqual(keywords.find(""), [])
+
+    def test_overlapping(self):
+        """(TestKeywordMatcher) -> None
+        Test keywords that overlap, and keywords that are suffixes of each
+        other.
+        """
+        keywords = KeywordMatcher([("a b c", 1), ("b c d", 2), ("c", 3),
+                                   ("a b a b c", 4)])
+        self.assertEqual(keywords.sources("a b a b c d"), [4, 1, 3, 2])
+
+    def test_add_remove(self):
+        """(TestKeywordMatcher) -> None
+        Test that added and removed keywords are matched from then on.
+        """
+        keywords = KeywordMatcher()
+        self.assertEqual(keywords.sources("cbc news"), [])
+        keywords.add(" CBC  News ", 1)
+        self.assertEqual(keywords.sources("cbc news"), [1])
+        keywords.add("cbc news", 2)
+        self.assertEqual(keywords.sources("cbc news"), [2])
+        keywords.remove("Cbc News")
+        keywords.remove("missing")
+        self.assertEqual(keywords.sources("cbc news"), [])
+        self.assertEqual(len(keywords), 0)
+
+
+class TestDBKeywordMatcher(unittest.TestCase):
+
+    def setUp(self):
+        """(TestDBKeywordMatcher) -> None
+        Set up the database file for testing, with a source and keyword.
+        """
+        self.db = Database("testmatcher.db")
+        self.db.create_tables()
+        self.db.add_source(Source("cbc.ca"))
+        self.db.add_keyword(Keyword(1, "CBC"))
+
+    def tearDown(self):
+        """(TestDBKeywordMatcher) -> None
+        Remove the database test file.
+        """
+        self.db.close()
+        os.remove("testmatcher.db")
+
+    def test_shared(self):
+        """(TestDBKeywordMatcher) -> None
+        Test that connections to the same database share the matcher, and
+        that it follows keywords added and deleted through any of them.
+        """
+        other = Database("testmatcher.db")
+        keywords = self.db.keyword_matcher()
+        self.assertTrue(other.keyword_matcher() is keywords)
+        self.assertEqual(keywords.sources("on cbc"), [1])
+
+        other.add_keyword(Keyword(1, "The National"))
+        self.assertEqual(keywords.sources("the national"), [1])
+        self.assertEqual(other.add_keywords([Keyword(1, "Radio Canada")]),
+                         ['added'])
+        self.assertEqual(keywords.sources("radio canada"), [1])
+
+        keyword = other.get_keywords(name="CBC").first()
+        other.delete_by_id(Keyword, keyword.id)
+        self.assertEqual(keywords.sources("on cbc"), [])
+        other.close()
+
+    def test_rename(self):
+        """(TestDBKeywordMatcher) -> None
+        Test that a keyword modified by id is only matched by its new name.
+        """
+        self.assertEqual(self.db.keyword_matcher().sources("on cbc"), [1])
+        keyword = self.db.get_keywords(name="CBC").first()
+        keyword.name = "Radio Canada"
+        self.db.add_keyword(keyword)
+        self.assertEqual(self.db.keyword_matcher().sources("on cbc"), [])
+        self.assertEqual(self.db.keyword_matcher().sources("radio canada"),
+                         [1])
+
+    def test_delete_source(self):
+        """(TestDBKeywordMatcher) -> None
+        Test that deleting a source forgets the keywords of the source.
+        """
+        self.assertEqual(self.db.keyword_matcher().sources("cbc"), [1])
+        self.db.delete_by_id(Source, 1)
+        self.assertEqual(self.db.keyword_matcher().sources("cbc"), [])
+
+    def test_rollback(self):
+        """(TestDBKeywordMatcher) -> None
+        Test that keywords added in a batch that rolled back are forgotten.
+        """
+        self.db.keyword_matcher()
+        try:
+            with self.db.batch():
+                self.db.add_keyword(Keyword(1, "Radio Canada"))
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(self.db.keyword_matcher().sources("radio canada"),
+                         [])
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
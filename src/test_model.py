@@ -0,0 +1,54 @@
+import unittest
+import json
+from model import row_mapper
+from article import Article
+from reference import Reference
+from response import Response
+
+
+class TestModel(unittest.TestCase):
+
+    def test_row_mapper(self):
+        """(TestModel) -> None
+        Test that a row mapper sets the members for the columns, gives the
+        other members their defaults, and ignores unknown columns.
+        """
+        mapper = row_mapper(Article, ('id', 'url', 'title', 'extra'))
+        article = mapper((3, "http://a.com/1.html", "One", 5))
+        self.assertEqual(article.id, 3)
+        self.assertEqual(article.url, "http://a.com/1.html")
+        self.assertEqual(article.title, "One")
+        self.assertEqual(article.author, '')
+        self.assertFalse(article.watched)
+        self.assertFalse(hasattr(article, 'extra'))
+
+        # The mapper is only compiled once.
+        self.assertTrue(row_mapper(Article, ('id', 'url', 'title', 'extra'))
+                        is mapper)
+
+    def test_no_dict(self):
+        """(TestModel) -> None
+        Test that models don't carry a dict of their members.
+        """
+        self.assertFalse(hasattr(Article("http://a.com/1.html"), '__dict__'))
+        self.assertFalse(hasattr(Reference(1, 2), '__dict__'))
+
+    def test_to_dict(self):
+        """(TestModel) -> None
+        Test that to_dict gives the members of mapped objects.
+        """
+        reference = row_mapper(Reference, ('id', 'child_id'))((1, 2))
+        self.assertEqual(reference.to_dict()['child_id'], 2)
+        self.assertEqual(reference.to_dict()['parent_url'], None)
+
+    def test_json(self):
+        """(TestModel) -> None
+        Test that models are serialized in responses.
+        """
+        article = Article("http://a.com/1.html", "One")
+        data = json.loads(Response(True, data=[article]).to_json())['data']
+        self.assertEqual(data[0]['url'], "http://a.com/1.html")
+        self.assertEqual(data[0]['title'], "One")
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
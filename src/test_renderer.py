@@ -0,0 +1,164 @@
+import unittest
+import shutil
+import tempfile
+import time
+import sqlite3
+import os
+from cache import RenderCache
+from database import Database
+import database
+from renderer import RenderService, RenderQueueFull, DONE, FAILED, \
+    CANCELLED, TIMED_OUT, QUEUED, RUNNING, FINISHED
+
+
+def open_db():
+    """(None) -> Database
+    Opens the database of the renders.
+    """
+    return Database("testrender.db")
+
+
+def draw(database, path, text='image'):
+    """(Database, str, str) -> None
+    Writes an image to the path.
+    """
+    with open(path, 'w') as image:
+        image.write(text)
+
+
+def draw_slowly(database, path):
+    """(Database, str) -> None
+    Writes an image to the path, much later.
+    """
+    time.sleep(30)
+    draw(database, path)
+
+
+def draw_failure(database, path):
+    """(Database, str) -> None
+    Fails to write an image.
+    """
+    raise ValueError("No such source.")
+
+
+class TestRenderer(unittest.TestCase):
+
+    def setUp(self):
+        """(TestRenderer) -> None
+        Set up an empty directory for the images, and the render service.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.cache = RenderCache(self.directory)
+        self.service = RenderService(self.cache, open_db, workers=1,
+                                     queue_size=1, timeout=2)
+
+    def tearDown(self):
+        """(TestRenderer) -> None
+        Remove the image directory and the database test file.
+        """
+        shutil.rmtree(self.directory)
+        if os.path.exists("testrender.db"):
+            os.remove("testrender.db")
+
+    def wait(self, job, states=FINISHED):
+        """(TestRenderer, RenderJob, tuple) -> RenderJob
+        Waits for the job to reach one of the states.
+        """
+        end = time.time() + 10
+        while job.state not in states and time.time() < end:
+            time.sleep(0.02)
+        return job
+
+    def test_render(self):
+        """(TestRenderer) -> None
+        Test that an image is rendered, and that the next job for it is done
+        straight away.
+        """
+        job = self.wait(self.service.submit('line', 1, draw, ('plot', )))
+        self.assertEqual(job.state, DONE)
+        self.assertTrue(self.service.job(job.id) is job)
+        with open(os.path.join(self.directory, job.filename)) as image:
+            self.assertEqual(image.read(), 'plot')
+
+        again = self.service.submit('line', 1, draw, ('plot', ))
+        self.assertEqual(again.state, DONE)
+        self.assertEqual(again.filename, job.filename)
+
+    def test_failure(self):
+        """(TestRenderer) -> None
+        Test that a failed render gives the error, and writes no image.
+        """
+        job = self.wait(self.service.submit('line', 1, draw_failure))
+        self.assertEqual(job.state, FAILED)
+        self.assertEqual(job.error, "No such source.")
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_timeout(self):
+        """(TestRenderer) -> None
+        Test that a render that takes too long is stopped.
+        """
+        job = self.wait(self.service.submit('line', 1, draw_slowly))
+        self.assertEqual(job.state, TIMED_OUT)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_cancel(self):
+        """(TestRenderer) -> None
+        Test cancelling a running job and a queued job, and that the queue
+        refuses jobs once it is full.
+        """
+        running = self.wait(self.service.submit('line', 1, draw_slowly),
+                            (RUNNING, ))
+        queued = self.service.submit('line', 2, draw)
+        self.assertEqual(queued.state, QUEUED)
+        self.assertRaises(RenderQueueFull, self.service.submit, 'line', 3,
+                          draw)
+
+        # A job for the same image is shared.
+        self.assertTrue(self.service.submit('line', 2, draw) is queued)
+
+        self.assertTrue(self.service.cancel(queued.id))
+        self.assertEqual(queued.state, CANCELLED)
+        self.assertTrue(self.service.cancel(running.id))
+        self.assertEqual(self.wait(running).state, CANCELLED)
+        self.assertFalse(self.service.cancel(running.id))
+
+        # The worker goes on to the next job.
+        job = self.wait(self.service.submit('line', 3, draw))
+        self.assertEqual(job.state, DONE)
+        self.assertEqual(os.listdir(self.directory), [job.filename])
+
+    def test_restart(self):
+        """(TestRenderer) -> None
+        Test that an image rendered before a restart isn't used again once
+        the data changed, even if another process changed it.
+        """
+        db = open_db()
+        db.create_tables()
+        try:
+            job = self.wait(self.service.submit(
+                'line', ('line', 1, db.change_count()), draw, ('old', )))
+            self.assertEqual(job.state, DONE)
+
+            # Start over, with the images already rendered, as a restarted
+            # server would.
+            database.generations.clear()
+            self.cache = RenderCache(self.directory)
+            self.service = RenderService(self.cache, open_db, workers=1)
+
+            # Another process changes the data.
+            other = sqlite3.connect("testrender.db")
+            other.execute("INSERT INTO source(url) VALUES ('a.com')")
+            other.commit()
+            other.close()
+
+            again = self.wait(self.service.submit(
+                'line', ('line', 1, db.change_count()), draw, ('new', )))
+            self.assertEqual(again.state, DONE)
+            self.assertNotEqual(again.filename, job.filename)
+            with open(os.path.join(self.directory, again.filename)) as image:
+                self.assertEqual(image.read(), 'new')
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -6,8 +6,10 @@ from database import Database
 from article import Article
 from keywords import Keyword
 from reference import Reference
-from web import crawl_url
+from web import crawl_url, CrawlEngine, resume_crawls, stopped_crawls
 import requests
+import threading
+import time
 import os
 
 class TestWebCrawler(unittest.TestCase):
@@ -76,5 +78,305 @@ class TestWebCrawler(unittest.TestCase):
             self.assertTrue(article.title in self.result_valid_url)
      
 
+# The pages of the sites crawled by the crawl engine tests.
+ARTICLE = '<html><head><title>%s</title><meta property="og:type" ' \
+          'content="article"></head><body><p>%s</p></body></html>'
+PAGES = {
+    'http://a.com/': '<html><body>%s</body></html>' % ''.join(
+        ['<a href="http://a.com/%d.html">A</a>'
+         '<a href="http://b.com/%d.html">B</a>' % (i, i)
+         for i in range(1, 6)]),
+    'http://a.com/1.html': ARTICLE % (
+        "One", '<a href="http://a.com/2.html">2</a>'
+               '<a href="HTTP://A.com/2.html#more">2</a>'
+               '<a href="http://a.com/3.html">3</a>'
+               '<a href="http://B.com/9.html#top">9</a>'
+               '<a href="http://b.com/10.html">10</a>'),
+    'http://a.com/2.html': ARTICLE % (
+        "Two", '<a href="http://a.com/4.html">4</a>'),
+    'http://a.com/3.html': ARTICLE % ("Three", ''),
+    'http://a.com/4.html': ARTICLE % ("Four", ''),
+    'http://a.com/5.html': ARTICLE % ("Five", ''),
+    'http://b.com/9.html': ARTICLE % ("Nine", ''),
+    'http://b.com/10.html': '<html><head><title>Ten</title></head></html>'
+}
+for i in range(1, 6):
+    PAGES['http://b.com/%d.html' % i] = ARTICLE % ("B%d" % i, '')
+
+
+class FakeResponse():
+    """A response to a request for one of the test pages.
+    """
+    headers = {}
+
+    def __init__(self, status_code=200):
+        """(FakeResponse, int) -> None
+        Creates a response with the given HTTP status.
+        """
+        self.status_code = status_code
+
+
+class Crash(Exception):
+    """Stops a crawl.
+    """
+    pass
+
+
+class CrashingEngine(CrawlEngine):
+    """A crawl engine that stops when it crawls the third article.
+    """
+
+    def _crawl_url(self, url, *args):
+        """(CrashingEngine, str, ...) -> None
+        Crawls the URL, unless it is the third article.
+        """
+        if url == 'http://a.com/3.html':
+            raise Crash()
+        CrawlEngine._crawl_url(self, url, *args)
+
+
+class TestCrawlEngine(unittest.TestCase):
+
+    def setUp(self):
+        """(TestCrawlEngine) -> None
+        Set up the database file for testing, and count the fetches.
+        """
+        self.db = Database("testengine.db")
+        self.db.create_tables()
+        self.lock = threading.Lock()
+        self.fetched = []
+        self.fetching = {}
+        self.most = {}
+        self.statuses = {}
+
+    def tearDown(self):
+        """(TestCrawlEngine) -> None
+        Remove the database test file, and its filter of crawled URLs.
+        """
+        self.db.close()
+        os.remove("testengine.db")
+        if os.path.exists("testengine.db.seen"):
+            os.remove("testengine.db.seen")
+
+    def fetch(self, url):
+        """(TestCrawlEngine, str) -> (FakeResponse, BeautifulSoup)
+        Fetches one of the test pages slowly, keeping track of the most pages
+        fetched at once from each host, and in all. Pages are served with the
+        status given for them in statuses, if any, and pages whose status is
+        None can't be fetched.
+        """
+        host = url.split('/')[2]
+        with self.lock:
+            self.fetched.append(url)
+            for key in (host, None):
+                self.fetching[key] = self.fetching.get(key, 0) + 1
+                self.most[key] = max(self.most.get(key, 0),
+                                     self.fetching[key])
+        time.sleep(0.02)
+        with self.lock:
+            for key in (host, None):
+                self.fetching[key] -= 1
+        status = self.statuses.get(url, 200)
+        if url not in PAGES or status is None:
+            return None
+        return FakeResponse(status), BeautifulSoup(PAGES[url])
+
+    def titles(self, articles):
+        """(TestCrawlEngine, [Article]) -> [str]
+        Returns the sorted titles of the articles, without repeats. Like a
+        crawl of one page at a time, a crawl gives an article again when it
+        is reached from more than one page.
+        """
+        return sorted(set([article.title for article in articles]))
+
+    def test_crawl_url(self):
+        """(TestCrawlEngine) -> None
+        Test that crawling a URL adds the linked articles down to the depth,
+        with references to the page linking them.
+        """
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        self.assertEqual(self.titles(engine.run()),
+                         ["Nine", "One", "Three", "Two"])
+        self.assertEqual(self.db.get_article_by_url('http://a.com/4.html'),
+                         None)
+
+        one = self.db.get_article_by_url('http://a.com/1.html')
+        nine = self.db.get_article_by_url('http://b.com/9.html')
+        reference = self.db.get_references(child_id=nine.id).first()
+        self.assertEqual(reference.parent_id, one.id)
+
+        # The same page linked differently is only crawled once.
+        self.assertEqual(self.fetched.count('http://a.com/2.html'), 1)
+        self.assertEqual(self.db.get_frontier_crawls(), [])
+
+    def test_crawl_site(self):
+        """(TestCrawlEngine) -> None
+        Test that crawling a site fetches each page once, and never more
+        pages at once than the engine allows.
+        """
+        engine = CrawlEngine(self.db, workers=3, host_workers=2,
+                             fetch=self.fetch)
+        engine.crawl_site('http://a.com/', depth=2)
+        self.assertEqual(self.titles(engine.run()),
+                         ["B1", "B2", "B3", "B4", "B5", "Five", "Four",
+                          "Nine", "One", "Three", "Two"])
+        self.assertEqual(sorted(self.fetched), sorted(set(self.fetched)))
+        self.assertTrue(self.most['a.com'] <= 2)
+        self.assertTrue(self.most['b.com'] <= 2)
+        self.assertEqual(self.most[None], 3)
+
+    def test_pages(self):
+        """(TestCrawlEngine) -> None
+        Test that a crawl keeping only the last page it fetched crawls the
+        same articles, and keeps no pages once it is done.
+        """
+        engine = CrawlEngine(self.db, fetch=self.fetch, pages=1)
+        engine.crawl_site('http://a.com/', depth=2)
+        self.assertEqual(self.titles(engine.run()),
+                         ["B1", "B2", "B3", "B4", "B5", "Five", "Four",
+                          "Nine", "One", "Three", "Two"])
+        self.assertEqual(len(engine.pages), 0)
+
+    def test_existing(self):
+        """(TestCrawlEngine) -> None
+        Test that links to articles in the database, however they are
+        written, aren't crawled again but referenced.
+        """
+        nine = Article(url='http://b.com/9.html', title="Nine")
+        self.db.add_article(nine)
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        self.assertEqual(self.titles(engine.run()), ["One", "Three", "Two"])
+        self.assertFalse('http://b.com/9.html' in self.fetched)
+
+        one = self.db.get_article_by_url('http://a.com/1.html')
+        reference = self.db.get_references(child_id=one.id).first()
+        self.assertEqual(reference.parent_id, nine.id)
+
+    def test_seen(self):
+        """(TestCrawlEngine) -> None
+        Test that links crawled before, articles or not, aren't fetched or
+        looked up again by the next crawl, but that the start of a crawl is.
+        """
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        engine.run()
+        self.assertTrue('http://b.com/10.html' in engine.seen)
+
+        self.fetched = []
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        self.assertEqual(self.titles(engine.run()), ["One"])
+        self.assertEqual(self.fetched, ['http://a.com/1.html'])
+
+    def test_seen_failed(self):
+        """(TestCrawlEngine) -> None
+        Test that links that failed for now aren't counted as crawled, but
+        that links that won't ever be fetched are.
+        """
+        self.statuses = {'http://a.com/2.html': 404,
+                         'http://a.com/3.html': 503,
+                         'http://b.com/9.html': 429,
+                         'http://b.com/10.html': None}
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        engine.run()
+        self.assertEqual(engine.failed, 3)
+        self.assertTrue('http://a.com/1.html' in engine.seen)
+        self.assertTrue('http://a.com/2.html' in engine.seen)
+        for url in ('http://a.com/3.html', 'http://b.com/9.html',
+                    'http://b.com/10.html'):
+            self.assertFalse(url in engine.seen)
+
+        # The page that couldn't be fetched is fetched by the next crawl.
+        self.fetched = []
+        self.statuses = {}
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        engine.run()
+        self.assertTrue('http://b.com/10.html' in self.fetched)
+        self.assertFalse('http://a.com/2.html' in self.fetched)
+
+    def test_resume(self):
+        """(TestCrawlEngine) -> None
+        Test that a crawl that stopped is resumed from where it stopped, and
+        that pages are given up on once they were attempted too many times.
+        """
+        engine = CrashingEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        self.assertRaises(Crash, engine.run)
+        self.assertEqual(self.db.get_frontier_crawls(), [engine.crawl])
+        self.assertEqual(self.db.get_article_by_url('http://a.com/3.html'),
+                         None)
+
+        # The pages that were crawled before it stopped aren't crawled
+        # again.
+        titles = self.titles(resume_crawls(self.db, fetch=self.fetch))
+        self.assertTrue("Three" in titles)
+        self.assertFalse("One" in titles)
+        for url in ('http://a.com/1.html', 'http://a.com/2.html',
+                    'http://a.com/3.html', 'http://b.com/9.html'):
+            self.assertNotEqual(self.db.get_article_by_url(url), None)
+        self.assertEqual(self.db.get_frontier_crawls(), [])
+
+        # A crawl that keeps stopping is eventually given up on.
+        engine = CrashingEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/3.html')
+        self.assertRaises(Crash, engine.run)
+        for i in range(2):
+            self.db.retry_frontier(engine.crawl, 2)
+            self.assertRaises(Crash, CrashingEngine(
+                self.db, fetch=self.fetch, crawl=engine.crawl).run)
+        self.assertEqual(resume_crawls(self.db, attempts=2), [])
+        self.assertEqual(self.db.get_frontier_crawls(), [])
+
+    def test_live(self):
+        """(TestCrawlEngine) -> None
+        Test that crawls that are still running aren't resumed.
+        """
+        engine = CrawlEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/1.html', depth=2)
+        self.assertEqual(self.db.get_frontier_crawls(), [engine.crawl])
+        self.assertEqual(stopped_crawls(self.db), [])
+        self.assertEqual(resume_crawls(self.db, fetch=self.fetch), [])
+        self.assertEqual(self.fetched, [])
+
+        # The crawl goes on as if resume_crawls hadn't been called.
+        self.assertEqual(self.titles(engine.run()),
+                         ["Nine", "One", "Three", "Two"])
+        self.assertEqual(self.db.get_frontier_crawls(), [])
+
+        # A crawl that stopped is no longer running.
+        engine = CrashingEngine(self.db, fetch=self.fetch)
+        engine.crawl_url('http://a.com/3.html')
+        self.assertRaises(Crash, engine.run)
+        self.assertEqual(stopped_crawls(self.db), [engine.crawl])
+
+    def test_resume_stopping_page(self):
+        """(TestCrawlEngine) -> None
+        Test that only the page that keeps stopping a crawl is given up on,
+        not the pages left to crawl after it.
+        """
+        engine = CrashingEngine(self.db, fetch=self.fetch)
+        engine.crawl_site('http://a.com/', 2)
+        self.assertRaises(Crash, engine.run)
+        for i in range(10):
+            self.db.retry_frontier(engine.crawl, 2)
+            try:
+                CrashingEngine(self.db, fetch=self.fetch,
+                               crawl=engine.crawl).run()
+                break
+            except Crash:
+                pass
+        self.assertEqual(self.db.get_frontier_crawls(), [])
+
+        self.assertEqual(self.db.get_article_by_url('http://a.com/3.html'),
+                         None)
+        for url in ('http://a.com/4.html', 'http://a.com/5.html',
+                    'http://b.com/5.html'):
+            self.assertNotEqual(self.db.get_article_by_url(url), None)
+
+
 if __name__ == "__main__":
     unittest.main(exit=False)
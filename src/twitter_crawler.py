@@ -9,7 +9,7 @@ from keywords import Keyword
 from reference import Reference
 from source import Source
 from bs4 import BeautifulSoup
-import requests
+import fetcher
 import os
 
 def twi_time_convert(timestr):
@@ -43,7 +43,7 @@ def article_to_db(database, url, parent='', date='', verify=True, depth=1):
     if not url:
         return []
     try:
-        page = requests.get(url)
+        page = fetcher.get(url)
         page = BeautifulSoup(page.text)
     except:
         # Couldn't fetch article.
@@ -52,7 +52,7 @@ def article_to_db(database, url, parent='', date='', verify=True, depth=1):
     if verify == None:
         return []
     else:
-        article = database.get_articles(url=url).first()
+        article = database.get_article_by_url(url)
         if article is None:        
             # Find the page's publish date and author.
             author = ''
@@ -79,12 +79,12 @@ def article_to_db(database, url, parent='', date='', verify=True, depth=1):
             title = page.title.string
             # Add the article to the database. The URL might be malformed, so handle
             # exceptions coming from the tld library.            
+            article = Article(url=url, title=title, date=date, author=author)
             try:
-                database.add_article(Article(url=url, title=title, date=date,
-                                             author=author))
+                if not database.add_article(article):
+                    article = None
             except (TldDomainNotFound, TldBadUrl):
                 return [] 
-            article = database.get_articles(url=url).first()
         if article is None:
             # The article wasn't found, and the crawl can't continue.
             return [] 
@@ -104,36 +104,37 @@ def search_references(database, tweet_html, tweet_id):
         # Couldn't fetch article.
         return []  
     
-    checked_words = []
     checked_urls = []
     articles = []
     if tweet.a != None:
-        # Check all words with mention tag, which indicate another twitter account
-        for at in tweet.find_all('a', {'class': 'twython-mention'}):
-            account = at.text
-            # Add the twitter account as a Source
-            source_url = "twitter.com/" + account[1:]
-            database.add_source(Source(source_url))
+        # Add the mentioned accounts in a single batch.
+        with database.batch():
+            # Check all words with mention tag, which indicate another twitter
+            # account
+            for at in tweet.find_all('a', {'class': 'twython-mention'}):
+                account = at.text
+                # Add the twitter account as a Source
+                source = Source("twitter.com/" + account[1:])
+                database.add_source(source)
 
-            database.get_by_id(Source, 1)
-
-            check = database.get_sources(url=source_url)
-            # Add corresponding keywords for the account for reference searching
-            if check.count() != 0:
-                s_id = check.first().id
-                database.add_keyword(Keyword(s_id, account))
-                # Should include the other case: #username
-                database.add_keyword(Keyword(s_id, "#"+account[1:]))
+                check = database.get_source_by_url(source.url)
+                # Add corresponding keywords for the account for reference
+                # searching
+                if check is not None:
+                    s_id = check.id
+                    database.add_keyword(Keyword(s_id, account))
+                    # Should include the other case: #username
+                    database.add_keyword(Keyword(s_id, "#"+account[1:]))
         # find all hyperlinks in tweet content
         for atag in tweet.find_all('a', {'class': 'twython-url'}):
             t_url = atag.get('href')
             # If the link hasn't been checked already, check if there's
             # an existing article in the database with that url.            
             if t_url not in checked_urls:
-                ref_article = database.get_articles(url=t_url).first()
+                ref_article = database.get_article_by_url(t_url)
                 if ref_article is None:
                     articles += article_to_db(database, t_url)
-                ref_article = database.get_articles(url=t_url).first()
+                ref_article = database.get_article_by_url(t_url)
                 if ref_article != None:
                     # Make sure the article exists in the database. Create a
                     # reference between this article and the referenced 
@@ -146,29 +147,16 @@ def search_references(database, tweet_html, tweet_id):
                 # again.
                 checked_urls.append(t_url)                    
     
-    # Look for references to Sources by checking keywords in the database.
-    words = unicode(tweet.getText()).split()
-    # Get all the keywors in database, those are the possible reference keywods
-    # i.e. all the TWITTER account need to be added to database as a source with
-    # corresponding keywords.
-    keywords = database.get_keywords().all()
-
-    for word in words:
-        #print word
-        # Only check the word if it hasn't been checked before.
-        if word not in checked_words:
-            check = database.get_keywords(name=word)
-            if check.count() != 0:
-                ref_source = check.first().source_id
-                # This word is one of the keyword existed in database, create a
-                #reference between the source of the keyword, and the article.
-                database.add_reference(
-                    Reference(child_id=tweet_id,
-                              source_id=ref_source))
+    # Look for references to Sources by finding the keywords in the database
+    # in the tweet, i.e. all the TWITTER account need to be added to database
+    # as a source with corresponding keywords.
+    sources = database.keyword_matcher().sources(unicode(tweet.getText()))
 
-            # Add the word to the checked words list, so it isn't
-            # checked again.
-            checked_words.append(word)    
+    # Create a reference between the tweet and the source of each keyword, in
+    # a single batch.
+    database.add_references([Reference(child_id=tweet_id,
+                                       source_id=source_id)
+                             for source_id in sources])
             
     # Return the list of articles added to the database.        
     return articles
@@ -225,18 +213,18 @@ class TweeStreamer(twython.TwythonStreamer):
                             date=t_date, author= t_author))
    
         
-        if add_t == True:
+        if add_t:
 
             # When make sure the tweet article is in database, call helper 
             # function to search references inside tweet content.
-            tweet_id = self.database.get_articles(title=content).first().id  
+            tweet_id = add_t
             # Convert to html type for link analyzing.
             tweet_html = twython.Twython.html_for_tweet(data)
             
             ref_articles += search_references(self.database, tweet_html, tweet_id)
             
             refs = self.database.get_references(tweet_id)
-            if refs.count() != 0:
+            if refs.exists():
                 print ">>>>>>>>>>>>>>>>>>>>>>>>>"
                 print refs.all()   
         return ref_articles
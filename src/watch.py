@@ -10,6 +10,9 @@ class Watch(Model):
     db_table = "watch"
     db_from = "watch"
     db_fields = "id, url, domain"
+    db_unique = "url"
+
+    __slots__ = ('id', 'url', 'domain')
     db_labels = "watch.id, watch.url, watch.domain"
 
     def __init__(self, url=''):
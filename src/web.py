@@ -4,52 +4,74 @@ from dateutil import parser
 from database import Database
 from article import Article
 from reference import Reference
-import requests
+from collections import deque, OrderedDict
+from urlparse import urlparse, urlsplit, urlunsplit
+from database import QUEUED, RUNNING, CRAWLED, FAILED
+from bloom import BloomFilter
+from cache import LRUCache
+import fetcher
+import os
+import threading
+import Queue
+import uuid
 
 # Set invalid page type, 
 NO_EXTS = ['mp3', 'jpg', 'gif', 'xml', 'jpeg', 'mp4',
                         'wma', 'pdf']
-def crawl_site(database, url, depth=1):
-    """(Database, str, int) -> [Article]
+# The number of pages a crawl fetches at once, in all and from any one host.
+CRAWL_WORKERS = 8
+CRAWL_HOST_WORKERS = 2
+
+# The number of fetched pages a crawl keeps for the other crawls of the same
+# page. Pages that were dropped are fetched again if they're crawled again.
+CRAWL_PAGES = 64
+
+# The number of times a crawl is resumed before giving up on a page that
+# was being crawled when it stopped.
+CRAWL_ATTEMPTS = 3
+
+# The HTTP statuses of failures that may not happen again, so the URLs that
+# failed with them aren't marked crawled (see CrawlEngine._crawl).
+RETRY_STATUSES = [408, 429]
+
+# The filters of the URLs crawled into each database, by the path of the
+# database (see seen_urls).
+seen_filters = {}
+seen_lock = threading.Lock()
+
+# The crawls running in this process, which have a frontier but mustn't be
+# resumed (see resume_crawls).
+live_crawls = set()
+live_lock = threading.Lock()
+
+
+def crawl_site(database, url, depth=1, changed=False):
+    """(Database, str, int, Bool) -> [Article]
     Crawls the given URL, and returns a list of articles that have been parsed
     and added to the database. Depth can be used to limit how far the
-    crawl will go.
+    crawl will go. If changed is True, the site is only crawled if it changed
+    since it was last crawled that way without failing pages.
     """
-    if not url or depth <= 0:
-        print "depth <= 0"
-        return []    
-    
-    # check the page time, and if it is an uncheckable page time, then stop parsing
-    for ext in NO_EXTS:
-        if url.endswith("." + ext):
-            return []          
-    # Get the web page from the given url.
-    try:
-        page = requests.get(url)
-        page = BeautifulSoup(page.text)
-    except:
-        return []
-    articles=[]
-    # Iterate over every URL in the page, looking for articles.
-    checked_urls = []
-    if page.a != None:
-        for article in page.find_all('a'):
-            # Don't check articles we've already checked.
-            link = article.get('href')
-            if link not in checked_urls:
-                cur_article = database.get_articles(url=link).first()
-                if depth > 1:
-                    if cur_article is None:                
-                # Try parsing the article, and then add the articles obtained to
-                # the full list.
-                        articles += crawl_url(database, url=link, depth=depth)
-                       
-                    articles += crawl_site(database, link, depth-1)
-                
-                # Add the article to the checked list.
-                checked_urls.append(link)
-
-    # Return all articles that have been added to the database.
+    request = None
+    if changed and url and depth > 1:
+        try:
+            request = fetcher.shared().get_changed(database, url, save=False)
+        except:
+            return []
+        if request is None:
+            print "Unchanged: %s" % url
+            return []
+
+    engine = CrawlEngine(database)
+    if request is not None:
+        engine.add_page(url, request)
+    engine.crawl_site(url, depth)
+    articles = engine.run()
+
+    # Only count the site as crawled if none of its pages failed, so that
+    # they're crawled again next time even if the site is unchanged.
+    if request is not None and not engine.failed:
+        fetcher.shared().save_validator(database, url, request)
     return articles
 
 
@@ -62,34 +84,474 @@ def crawl_url(database, url, parent='', date='', verify=True, depth=1):
 
     Returns the list of articles that have been added to the database during the crawl.
     """
-    # If the URL is empty, or the crawl has gone too deep, stop.
-    if not url or depth <= 0:
-        print "Couldn't fetch: %s" % url
-        return []
-
-    # check the page time, and if it is an uncheckable page time, then stop parsing
-    for ext in NO_EXTS:
-        if url.endswith("." + ext):
-            return []      
-    # Get the web page from the given url.
+    engine = CrawlEngine(database)
+    engine.crawl_url(url, parent, date, verify, depth)
+    return engine.run()
+
+
+def seen_urls(database):
+    """(Database) -> BloomFilter
+    Returns the filter of the URLs that were ever crawled into the database,
+    whether they were articles or not, or None for in-memory databases. The
+    filter is kept in a file next to the database, and is opened once.
+    """
+    if database.path == ':memory:':
+        return None
+
+    with seen_lock:
+        seen = seen_filters.get(database.path)
+        if seen is None or seen.map is not None and \
+                not os.path.exists(seen.path):
+            # Open the filter, or start over if its file was deleted.
+            if seen is not None:
+                seen.close()
+            seen = BloomFilter(database.path + '.seen')
+            seen_filters[database.path] = seen
+        return seen
+
+
+def fetch_page(url):
+    """(str) -> (Response, BeautifulSoup)
+    Fetches the web page at the given URL, and parses it. Returns None if the
+    page couldn't be fetched.
+    """
     try:
-        request = requests.get(url)
-        page = BeautifulSoup(request.text)
+        request = fetcher.get(url)
+        return request, BeautifulSoup(request.text)
     except:
-        # Couldn't fetch article.
-        return []
+        return None
+
+
+class CrawlEngine():
+    """Crawls pages concurrently. Sites and URLs to crawl are added to the
+    engine, then run crawls them along with the pages they lead to, the
+    same way crawl_site and crawl_url would one page at a time. Pages are
+    fetched by a pool of worker threads, no more than host_workers at once
+    from any one host, and the last pages fetched are kept so that a page
+    crawled again (from another page, or as a site) isn't fetched again.
+    The database is only used from the thread calling run.
+
+    URLs linked to that were crawled before (by any crawl, see seen_urls)
+    aren't crawled again, without looking them up in the database, since
+    they are either articles already or aren't articles. URLs that couldn't
+    be fetched, or whose server failed, aren't counted as crawled, so
+    they're crawled again when they are next linked to. The URLs the crawl
+    starts from are always crawled.
+
+    The pages found by the crawl are kept in its frontier in the database,
+    and crawled breadth first: pages closer to the start of the crawl are
+    crawled before the pages they lead to. A page is marked crawled along
+    with the changes crawling it made, so a crawl that stops can be resumed
+    from its frontier (see resume_crawls). The crawl is live from when the
+    engine is created until run returns, and its frontier is deleted once
+    the crawl finishes.
+    """
+
+    def __init__(self, database, workers=CRAWL_WORKERS,
+                 host_workers=CRAWL_HOST_WORKERS, fetch=fetch_page,
+                 crawl=None, seen=None, pages=CRAWL_PAGES):
+        """(CrawlEngine, Database, int, int, function, str, BloomFilter,
+            int) -> None
+        Creates an engine that adds the articles it crawls to the database,
+        fetching pages by calling fetch with their URL, and keeping the last
+        pages fetched for the next crawls of the same pages. A new crawl is
+        started unless the id of a crawl to resume is given, which must have
+        been claimed with claim_crawl. The crawled URLs
+        are kept in the seen filter, which is the database's filter by
+        default.
+        """
+        self.database = database
+        self.workers = workers
+        self.host_workers = host_workers
+        self.fetch = fetch
+        self.crawl = crawl or uuid.uuid4().hex
+        if crawl is None:
+            claim_crawl(self.crawl)
+        self.seen = seen_urls(database) if seen is None else seen
+
+        # The pages that were already added to the frontier, so none is
+        # crawled twice, and the priority of the pages being added.
+        self.crawls = set()
+        self.priority = 0
+
+        # The last fetched pages by URL, the crawls waiting on a page being
+        # fetched, and the crawls whose page is ready.
+        self.pages = LRUCache(pages)
+        self.waiting = {}
+        self.ready = deque()
+
+        # The URLs left to fetch by host, and the number of pages being
+        # fetched from each host.
+        self.hosts = OrderedDict()
+        self.fetching = {}
+
+        self.fetches = Queue.Queue()
+        self.results = Queue.Queue()
+        self.articles = []
+
+        # The number of pages that couldn't be fetched, or failed for now.
+        self.failed = 0
+
+        # Queue the pages left in the frontier of the crawl being resumed.
+        if crawl is not None:
+            for entry in database.get_frontier(crawl):
+                self.crawls.add(_frontier_key(entry))
+                if entry['state'] == QUEUED:
+                    self._queue(entry)
+
+    def crawl_site(self, url, depth=1):
+        """(CrawlEngine, str, int) -> None
+        Adds a site to the crawl. Every link on the site is crawled as a URL
+        with the same depth, and as a site one level shallower.
+        """
+        if not url or depth <= 0:
+            print "depth <= 0"
+            return
+
+        # A site at the last level has no links left to follow, so it
+        # doesn't need to be fetched.
+        if depth > 1:
+            self._add({'kind': 'site', 'url': url, 'parent': '', 'date': '',
+                       'verify': True, 'depth': depth})
+
+    def crawl_url(self, url, parent='', date='', verify=True, depth=1):
+        """(CrawlEngine, str, str, str, Bool, int) -> None
+        Adds a URL to the crawl. The article for the URL is added to the
+        database with a reference to the parent URL, and the links in it
+        that aren't in the database are crawled one level shallower.
+        """
+        if not url or depth <= 0:
+            print "Couldn't fetch: %s" % url
+            return
+        self._add({'kind': 'url', 'url': url, 'parent': parent or '',
+                   'date': date or '', 'verify': verify, 'depth': depth})
+
+    def add_page(self, url, request):
+        """(CrawlEngine, str, Response) -> None
+        Gives the engine a page that was already fetched, so that crawls of
+        its URL use it instead of fetching it again.
+        """
+        self.pages.put(normalize_url(url),
+                       (request, BeautifulSoup(request.text)))
+
+    def run(self):
+        """(CrawlEngine) -> [Article]
+        Crawls everything added to the engine, and returns the list of
+        articles that have been added to the database.
+        """
+        threads = []
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            threads.append(worker)
 
-    # If verification is requested, then try doing a verification of whether the page is actually an article, using the
-    # opengraph type
-    if verify:
         try:
-            if (page.find("meta", {"content": "article"}) is None):
-                print "Not an article: %s" % url
-                return []
+            try:
+                # Fetch pages and crawl them as they arrive, until no crawl
+                # is left.
+                self._dispatch()
+                while self.ready or self.fetching:
+                    while self.ready:
+                        entry, page = self.ready.popleft()
+                        self._crawl(entry, page)
+                    self._dispatch()
+                    if self.fetching:
+                        url, page = self.results.get()
+                        self._fetched(url, page)
+                        self._dispatch()
+            finally:
+                # Stop the workers.
+                for worker in threads:
+                    self.fetches.put(None)
+
+            # The crawl finished, so it won't need resuming, or its pages.
+            self.pages.clear()
+            self.database.delete_frontier(self.crawl)
+            if self.seen is not None:
+                self.seen.flush()
+            return self.articles
+        finally:
+            # Finished or stopped, the crawl can be resumed from now on.
+            release_crawl(self.crawl)
+
+    def _add(self, entry):
+        """(CrawlEngine, dict) -> None
+        Private function that adds a page to the frontier of the crawl,
+        unless it is already there, and queues it.
+        """
+        entry['url'] = normalize_url(entry['url'])
+        key = _frontier_key(entry)
+        if key in self.crawls:
+            return
+        self.crawls.add(key)
+
+        # Skip the links to URLs that were crawled before.
+        if self.priority and entry['kind'] == 'url' and \
+                self._seen(entry['url']):
+            return
+
+        # Check the page type, and if it is an uncheckable page type, then
+        # stop.
+        for ext in NO_EXTS:
+            if entry['url'].endswith("." + ext):
+                return
+
+        entry['priority'] = self.priority
+        entry['id'] = self.database.add_frontier(
+            self.crawl, entry['kind'], entry['url'], entry['parent'],
+            entry['date'], entry['verify'], entry['depth'], entry['priority'])
+        if entry['id'] is not None:
+            self._queue(entry)
+
+    def _queue(self, entry):
+        """(CrawlEngine, dict) -> None
+        Private function that queues a page of the frontier to be crawled,
+        fetching it if it hasn't been fetched yet.
+        """
+        url = entry['url']
+        page = self.pages.get(url, False)
+        if page is not False:
+            self.ready.append((entry, page))
+        elif url in self.waiting:
+            self.waiting[url].append(entry)
+        else:
+            self.waiting[url] = [entry]
+            self.hosts.setdefault(_host(url), deque()).append(url)
+
+    def _dispatch(self):
+        """(CrawlEngine) -> None
+        Private function that hands pages to the workers to fetch, as long
+        as there are workers free for them and for their hosts.
+        """
+        busy = sum(self.fetching.values())
+        for host, urls in self.hosts.items():
+            while urls and busy < self.workers and \
+                    self.fetching.get(host, 0) < self.host_workers:
+                self.fetches.put(urls.popleft())
+                self.fetching[host] = self.fetching.get(host, 0) + 1
+                busy += 1
+            if not urls:
+                del self.hosts[host]
+
+    def _fetched(self, url, page):
+        """(CrawlEngine, str, tuple) -> None
+        Private function that readies the crawls waiting on a fetched page.
+        """
+        host = _host(url)
+        self.fetching[host] -= 1
+        if not self.fetching[host]:
+            del self.fetching[host]
+
+        self.pages.put(url, page)
+        for entry in self.waiting.pop(url):
+            self.ready.append((entry, page))
+
+    def _work(self):
+        """(CrawlEngine) -> None
+        Private function that fetches pages until it is given None.
+        """
+        while True:
+            url = self.fetches.get()
+            if url is None:
+                return
+            self.results.put((url, self.fetch(url)))
+
+    def _crawl(self, entry, page):
+        """(CrawlEngine, dict, tuple) -> None
+        Private function that crawls a fetched page of the frontier. The
+        changes made by crawling it, the pages it leads to, and its new
+        state are written together.
+        """
+        if page is None or not _final(page[0]):
+            self.failed += 1
+        if page is None:
+            # Couldn't fetch the page.
+            self.database.set_frontier_state(entry['id'], FAILED)
+            return
+
+        # Mark the page running first, on its own, so that if crawling it
+        # stops the crawl, resuming the crawl knows which page stopped it.
+        self.database.set_frontier_state(entry['id'], RUNNING)
+        with self.database.batch():
+            # The pages found on this page are crawled after the pages
+            # found before it.
+            self.priority = entry['priority'] + 1
+            try:
+                if entry['kind'] == 'site':
+                    self._crawl_site(page[1], entry['depth'])
+                else:
+                    self._crawl_url(entry['url'], page[0], page[1],
+                                    entry['parent'], entry['date'],
+                                    entry['verify'], entry['depth'])
+            finally:
+                self.priority = 0
+            if entry['kind'] == 'url' and self.seen is not None and \
+                    _final(page[0]):
+                self.seen.add(entry['url'])
+            self.database.set_frontier_state(entry['id'], CRAWLED)
+
+    def _crawl_site(self, page, depth):
+        """(CrawlEngine, BeautifulSoup, int) -> None
+        Private function that crawls the links on a fetched site.
+        """
+        if page.a is None:
+            return
+
+        # Look up the articles for the links that weren't crawled before,
+        # all at once, by the URLs they're kept under.
+        links = [article.get('href') for article in page.find_all('a')]
+        links = [normalize_url(link) if link else link for link in links]
+        seen = set([link for link in links if link and self._seen(link)])
+        existing = self.database.get_articles_by_urls(
+            [link for link in links if link not in seen])
+        checked_urls = set()
+        for link in links:
+            # Don't check links we've already checked.
+            if link in checked_urls:
+                continue
+            checked_urls.add(link)
+
+            # Crawl the links that aren't articles yet, then crawl every link
+            # as a site.
+            cur_article = existing.get(link) if link else None
+            if cur_article is None and link not in seen:
+                self.crawl_url(link, depth=depth)
+            self.crawl_site(link, depth - 1)
+
+    def _crawl_url(self, url, request, page, parent, date, verify, depth):
+        """(CrawlEngine, str, Response, BeautifulSoup, str, str, Bool, int)
+        -> None
+        Private function that adds the article for a fetched URL.
+        """
+        # If verification is requested, then try doing a verification of
+        # whether the page is actually an article, using the opengraph type.
+        if verify:
+            try:
+                if page.find("meta", {"content": "article"}) is None:
+                    print "Not an article: %s" % url
+                    return
+            except:
+                return
+
+        articles, sub_urls = _add_page(self.database, url, page, request,
+                                       parent, date, depth)
+        self.articles += articles
+
+        # Crawl the linked pages that weren't in the database.
+        for sub_url in sub_urls:
+            self.crawl_url(sub_url, url, depth=depth - 1)
+
+    def _seen(self, url):
+        """(CrawlEngine, str) -> Bool
+        Private function that returns True if the URL was (likely) crawled
+        before.
+        """
+        return self.seen is not None and normalize_url(url) in self.seen
+
+
+def resume_crawls(database, attempts=CRAWL_ATTEMPTS, **kwargs):
+    """(Database, int, ...) -> [Article]
+    Resumes the crawls that stopped before they finished, from their
+    frontiers. Crawls that are still running, or are being resumed by
+    another thread, are left alone. Pages that were already attempted the
+    given number of times are given up on. Returns the list of articles
+    that have been added to the database. Other keyword arguments are given
+    to the CrawlEngine.
+    """
+    articles = []
+    for crawl in database.get_frontier_crawls():
+        if not claim_crawl(crawl):
+            continue
+        try:
+            database.retry_frontier(crawl, attempts)
+            engine = CrawlEngine(database, crawl=crawl, **kwargs)
         except:
-            return []
+            release_crawl(crawl)
+            raise
+        articles += engine.run()
+    return articles
+
+
+def stopped_crawls(database):
+    """(Database) -> [str]
+    Returns the crawls that have a frontier but aren't running, which are
+    the crawls resume_crawls resumes.
+    """
+    crawls = database.get_frontier_crawls()
+    with live_lock:
+        return [crawl for crawl in crawls if crawl not in live_crawls]
+
+
+def claim_crawl(crawl):
+    """(str) -> Bool
+    Marks the crawl as running in this process. Returns False if it already
+    was, in which case it mustn't be run.
+    """
+    with live_lock:
+        if crawl in live_crawls:
+            return False
+        live_crawls.add(crawl)
+        return True
+
 
-    article = database.get_articles(url=url).first()
+def release_crawl(crawl):
+    """(str) -> None
+    Marks the crawl as no longer running in this process.
+    """
+    with live_lock:
+        live_crawls.discard(crawl)
+
+
+def normalize_url(url):
+    """(str) -> str
+    Returns the URL without the spaces around it or its fragment, and with
+    its scheme and host in lower case, so that a page is crawled once
+    however it is linked to.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path, parts.query, ''))
+
+
+def _frontier_key(entry):
+    """(dict) -> tuple
+    Private function that returns what identifies a page in the frontier of
+    a crawl.
+    """
+    return entry['kind'], entry['url'], entry['parent'], entry['depth']
+
+
+def _final(request):
+    """(Response) -> Bool
+    Private function that returns True if the response to a request is
+    final: the page was fetched, or the server said it won't ever be.
+    """
+    status = request.status_code
+    return 200 <= status < 300 or \
+        400 <= status < 500 and status not in RETRY_STATUSES
+
+
+def _host(url):
+    """(str) -> str
+    Private function that returns the host of a URL.
+    """
+    return urlparse(url).netloc.lower()
+
+
+def _add_page(database, url, page, request, parent='', date='', depth=1):
+    """(Database, str, BeautifulSoup, Response, str, str, int)
+    -> ([Article], [str])
+    Private function that adds the article for a fetched page to the
+    database, along with its references to existing articles and sources.
+    Returns the list containing the article (or the empty list if the page
+    couldn't be added), and the list of linked URLs that aren't in the
+    database yet and should be crawled.
+    """
+    article = database.get_article_by_url(url)
     if article is None:
         # Find the page's publish date and author.
         author = ''
@@ -126,30 +588,29 @@ def crawl_url(database, url, parent='', date='', verify=True, depth=1):
         # If there was no title, this page is unlikely an article.
         if page.title is None:
             print "Not an article: %s" % url
-            return []
+            return [], []
 
         # Get the article title.
         title = page.title.string
 
         # Add the article to the database. The URL might be malformed, so handle
-        # exceptions coming from the tld library.
+        # exceptions coming from the tld library. Adding the article sets its
+        # id.
+        article = Article(url=url, title=title, date=date, author=author)
         try:
-            database.add_article(Article(url=url, title=title, date=date,
-                                         author=author))
+            if not database.add_article(article):
+                article = None
         except (TldDomainNotFound, TldBadUrl):
             print "Could not add article: %s" % url
-            return []
-
-        # Get the added article from the database.
-        article = database.get_articles(url=url).first()
+            return [], []
     if article is None:
         # The article wasn't found, and the crawl can't continue.
         print "Could get article from database: %s" % url
-        return []
+        return [], []
 
     # If given a parent article URL, then create a reference to it.
     if parent:
-        parent_article = database.get_articles(url=parent).first()
+        parent_article = database.get_article_by_url(parent)
         if parent_article is not None:
             database.add_reference(
                 Reference(child_id=article.id, parent_id=parent_article.id))
@@ -157,62 +618,58 @@ def crawl_url(database, url, parent='', date='', verify=True, depth=1):
     # The list of added articles is initially just the current article.
     articles = [article]
 
+    # The linked pages that still need to be crawled.
+    sub_urls = []
+
     # Look through the page content for URLs to crawl, and references.
-    checked_words = []
-    checked_urls = []
+    keywords = database.keyword_matcher()
+    sources = []
+    links = []
     for content in page.find_all('p'):
         # Find all the link tags in the given block, to look for references
         # and pages to crawl.
         tags = BeautifulSoup(str(content))
         if tags.a:
             for tag in tags.find_all('a'):
-                # Extract the URL from the tag.
+                # Extract the URL from the tag, unless it was already found.
+                # Articles are kept under their normalized URL.
                 sub_url = tag.get('href')
+                if sub_url:
+                    sub_url = normalize_url(sub_url)
+                if sub_url not in links:
+                    links.append(sub_url)
 
-                # If the link hasn't been checked already, check if there's
-                # an existing article in the database with that url.
-                if sub_url not in checked_urls:
-                    ref_article = database.get_articles(url=sub_url).first()
-                    if ref_article is None:
-                        # Crawl the page, it's not already in the database and
-                        # there is still remaining depth to crawl. Append the
-                        # results to the list of currently added articles.
-                        if depth > 1:
-                            articles += crawl_url(database, sub_url, url,
-                                                  depth=depth-1)
-                    else:
-                        # The article exists in the database. Create a
-                        # reference between this article and the referenced
-                        # one.
-                        database.add_reference(
-                            (Reference(child_id=article.id,
-                                       parent_id=ref_article.id)))
-
-                    # Add the URL to the checked list, so it isn't checked
-                    # again.
-                    checked_urls.append(sub_url)
-
-        # Look for references to Sources by checking keywords in the database.
-        words = unicode(content.getText()).split()
-        for word in words:
-            # Only check the word if it hasn't been checked before.
-            if word not in checked_words:
-                # Check the database for a keyword that matches the current
-                # word.
-                keyword = database.get_keywords(name=word).first()
-                if keyword is not None:
-                    # The keyword exists in the database, create a reference
-                    # between the source of the keyword, and the article.
-                    database.add_reference(
-                        Reference(child_id=article.id,
-                                  source_id=keyword.source_id))
-
-                # Add the word to the checked words list, so it isn't
-                # checked again.
-                checked_words.append(word)
-
-    # Return the list of articles that have been added to the database.
-    return articles
+        # Look for references to Sources by finding the keywords of the
+        # sources in the text.
+        for source_id in keywords.sources(unicode(content.getText())):
+            if source_id not in sources:
+                sources.append(source_id)
+
+    # Check which of the links have existing articles in the database, all at
+    # once.
+    existing = database.get_articles_by_urls(links)
+    references = []
+    for sub_url in links:
+        ref_article = existing.get(sub_url) if sub_url else None
+        if ref_article is None:
+            # Crawl the page later, it's not already in the database and there
+            # is still remaining depth to crawl.
+            if depth > 1:
+                sub_urls.append(sub_url)
+        else:
+            # The article exists in the database. Create a reference between
+            # this article and the referenced one.
+            references.append(Reference(child_id=article.id,
+                                        parent_id=ref_article.id))
+    database.add_references(references)
+
+    # Create a reference between the article and each source it mentioned.
+    database.add_references([Reference(child_id=article.id,
+                                       source_id=source_id)
+                             for source_id in sources])
+
+    # Return the added article, and the pages left to crawl.
+    return articles, sub_urls
 
 if __name__ == "__main__":
     db = Database(':memory:')